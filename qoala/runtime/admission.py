@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Admission control for the quantum blocks (QL and QC) of program instances.
+# Before the node scheduler releases the tasks of a quantum block to the processor
+# schedulers, it asks the admission controller whether the qubits that the block
+# needs can be allocated, taking into account the qubits that blocks that were
+# released earlier (and have not completed yet) still need. Blocks that do not fit
+# are held back (back-pressure), and are admitted in order of their deadline once
+# enough qubits have become available.
+
+
+@dataclass(frozen=True)
+class QubitDemand:
+    """Number of communication and memory qubits."""
+
+    comm: int = 0
+    mem: int = 0
+
+    def __add__(self, other: QubitDemand) -> QubitDemand:
+        return QubitDemand(self.comm + other.comm, self.mem + other.mem)
+
+    def __sub__(self, other: QubitDemand) -> QubitDemand:
+        # Never negative.
+        return QubitDemand(max(0, self.comm - other.comm), max(0, self.mem - other.mem))
+
+    def fits_in(self, available: QubitDemand) -> bool:
+        return self.comm <= available.comm and self.mem <= available.mem
+
+
+@dataclass
+class QueueingRecord:
+    """Admission of a single block."""
+
+    pid: int
+    block_name: str
+    arrival: float  # time at which the block was first considered for admission
+    admitted: float  # time at which the block was admitted
+    # absolute deadline of the block, if it has deadlines relative to blocks
+    # that have been released before
+    deadline: Optional[float] = None
+
+    @property
+    def delay(self) -> float:
+        return self.admitted - self.arrival
+
+    @property
+    def missed_deadline(self) -> bool:
+        return self.deadline is not None and self.admitted > self.deadline
+
+
+@dataclass
+class _Reservation:
+    demand: QubitDemand
+    # qubits that the program instance had allocated when the block was admitted
+    allocated_at_admission: QubitDemand
+
+
+@dataclass
+class _WaitingBlock:
+    block_name: str
+    demand: QubitDemand
+    arrival: float
+    deadline: Optional[float]
+
+
+class AdmissionController:
+    """Decides when the quantum blocks of program instances may be released.
+
+    A block is admitted if the qubits it needs fit in the qubits that are
+    currently free, minus the qubits that are still reserved: those that admitted
+    blocks have not allocated yet, and those needed by waiting blocks that come
+    first (earlier deadline, or waiting longer). A block is always admitted if no
+    other block is in progress or waiting before it, so that blocks that need more
+    qubits than the node has do not wait forever (their tasks then wait for
+    resources as usual).
+
+    :param free_qubits: returns the number of currently free qubits
+    :param allocated_qubits: returns the number of qubits currently allocated by
+        the program instance with the given ID
+    """
+
+    def __init__(
+        self,
+        free_qubits: Callable[[], QubitDemand],
+        allocated_qubits: Callable[[int], QubitDemand],
+    ) -> None:
+        self._free_qubits = free_qubits
+        self._allocated_qubits = allocated_qubits
+
+        # pid -> reservation of the admitted block that is in progress
+        self._reservations: Dict[int, _Reservation] = {}
+        # pid -> block that is held back
+        self._waiting: Dict[int, _WaitingBlock] = {}
+        # pid -> (block name -> time at which the block was released)
+        self._release_times: Dict[int, Dict[str, float]] = {}
+
+        self._records: List[QueueingRecord] = []
+
+    @property
+    def waiting_pids(self) -> List[int]:
+        """IDs of program instances of which the next block is held back."""
+        return list(self._waiting.keys())
+
+    @property
+    def records(self) -> List[QueueingRecord]:
+        """Records of all admitted quantum blocks, in order of admission."""
+        return self._records
+
+    @property
+    def mean_queueing_delay(self) -> float:
+        if len(self._records) == 0:
+            return 0
+        return sum(r.delay for r in self._records) / len(self._records)
+
+    @property
+    def max_queueing_delay(self) -> float:
+        return max((r.delay for r in self._records), default=0)
+
+    @property
+    def num_deadline_misses(self) -> int:
+        return len([r for r in self._records if r.missed_deadline])
+
+    def block_released(self, pid: int, block_name: str, now: float) -> None:
+        """Register that a (classical or quantum) block has been released, so that
+        deadlines of later blocks relative to this one can be computed."""
+        self._release_times.setdefault(pid, {})[block_name] = now
+
+    def deadline_of(
+        self, pid: int, rel_deadlines: Optional[Dict[str, int]]
+    ) -> Optional[float]:
+        """Absolute deadline of a block with the given deadlines relative to
+        earlier blocks, or None if none of these blocks has been released."""
+        if rel_deadlines is None:
+            return None
+        release_times = self._release_times.get(pid, {})
+        deadlines = [
+            release_times[name] + d
+            for name, d in rel_deadlines.items()
+            if name in release_times
+        ]
+        return min(deadlines, default=None)
+
+    def _priority(
+        self, pid: int, arrival: float, deadline: Optional[float]
+    ) -> Tuple[bool, float, float, int]:
+        return (deadline is None, deadline if deadline is not None else 0, arrival, pid)
+
+    def _waiting_priority(self, pid: int) -> Tuple[bool, float, float, int]:
+        waiting = self._waiting[pid]
+        return self._priority(pid, waiting.arrival, waiting.deadline)
+
+    def order(self, pids: List[int]) -> List[int]:
+        """Order program instances for scheduling: those with a waiting block come
+        first, by priority, followed by the others in the given order."""
+        waiting = sorted(
+            [pid for pid in pids if pid in self._waiting], key=self._waiting_priority
+        )
+        return waiting + [pid for pid in pids if pid not in self._waiting]
+
+    def outstanding(self, pid: int) -> QubitDemand:
+        """Qubits that the admitted block of the given program instance still
+        needs to allocate."""
+        if pid not in self._reservations:
+            return QubitDemand()
+        reservation = self._reservations[pid]
+        allocated = self._allocated_qubits(pid) - reservation.allocated_at_admission
+        return reservation.demand - allocated
+
+    def try_admit(
+        self,
+        pid: int,
+        block_name: str,
+        demand: QubitDemand,
+        now: float,
+        rel_deadlines: Optional[Dict[str, int]] = None,
+    ) -> bool:
+        """Admit the next block of a program instance if its qubits are available.
+        If it is not admitted, it is held back until `try_admit` is called again.
+        The reservation of the previous block of the program instance must have
+        been released (see `release`).
+
+        :param pid: ID of the program instance
+        :param block_name: name of the block
+        :param demand: qubits that the block still needs to allocate
+        :param now: current time
+        :param rel_deadlines: deadlines of the block relative to earlier blocks
+        :return: whether the block is admitted
+        """
+        if pid in self._waiting and self._waiting[pid].block_name == block_name:
+            waiting = self._waiting[pid]
+            waiting.demand = demand
+        else:
+            deadline = self.deadline_of(pid, rel_deadlines)
+            waiting = _WaitingBlock(block_name, demand, now, deadline)
+        priority = self._priority(pid, waiting.arrival, waiting.deadline)
+
+        ahead = [
+            other
+            for other in self._waiting
+            if other != pid and self._waiting_priority(other) < priority
+        ]
+        available = self._free_qubits()
+        for other in self._reservations:
+            available = available - self.outstanding(other)
+        for other in ahead:
+            available = available - self._waiting[other].demand
+
+        # If nothing is in progress or ahead, waiting would not free any qubits.
+        is_blocked = len(self._reservations) > 0 or len(ahead) > 0
+        if is_blocked and not demand.fits_in(available):
+            self._waiting[pid] = waiting
+            return False
+
+        self._waiting.pop(pid, None)
+        self._reservations[pid] = _Reservation(demand, self._allocated_qubits(pid))
+        self.block_released(pid, block_name, now)
+        self._records.append(
+            QueueingRecord(pid, block_name, waiting.arrival, now, waiting.deadline)
+        )
+        return True
+
+    def release(self, pid: int) -> None:
+        """Release the reservation of the admitted block of a program instance,
+        when that block has completed."""
+        self._reservations.pop(pid, None)
+
+    def remove(self, pid: int) -> None:
+        """Drop all bookkeeping of a (retired) program instance."""
+        self.release(pid)
+        self._waiting.pop(pid, None)
+        self._release_times.pop(pid, None)
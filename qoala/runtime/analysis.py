@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from qoala.runtime.task import ProcessorType, QoalaTask, TaskGraph
+
+# Static analysis of task graphs, based on the estimated task durations (see
+# `TaskDurationEstimator`): earliest and latest start times, slack, critical paths,
+# and lower bounds on the makespan. E.g. to check whether node latencies allow a
+# program to meet its deadlines, or to derive deadlines for the schedulers from
+# the latest finish times of tasks. All analyses take time linear in the size of
+# the graph.
+
+
+@dataclass
+class CriticalPathAnalysis:
+    """Earliest and latest start times of all tasks of a graph, if every task can
+    start as soon as its predecessors have finished (i.e. with an unlimited number
+    of processors). Times are relative to the start of the graph.
+
+    Tasks without duration take no time. External predecessors (tasks that are
+    not in the graph) are assumed to have finished.
+    """
+
+    durations: Dict[int, float]  # task ID -> duration
+    earliest_start: Dict[int, float]  # task ID -> earliest start time
+    # task ID -> latest start time such that the graph still finishes at `length`
+    latest_start: Dict[int, float]
+    length: float  # length (in total duration) of the critical path
+    critical_path: List[int]  # IDs of the tasks on a critical path, in order
+
+    def earliest_finish(self, tid: int) -> float:
+        return self.earliest_start[tid] + self.durations[tid]
+
+    def latest_finish(self, tid: int) -> float:
+        return self.latest_start[tid] + self.durations[tid]
+
+    def slack(self, tid: int) -> float:
+        """Time by which a task can be delayed without delaying the graph."""
+        return self.latest_start[tid] - self.earliest_start[tid]
+
+    def critical_tasks(self) -> List[int]:
+        """IDs of all tasks without slack."""
+        return [tid for tid in self.earliest_start if self.slack(tid) == 0]
+
+
+@dataclass
+class GraphAnalysis:
+    """Critical path and processor load of a task graph, typically the graph of
+    a single program instance (see `TaskGraphBuilder.from_program`)."""
+
+    critical_path: CriticalPathAnalysis
+    # Processor type -> length of the longest chain of tasks of that processor,
+    # i.e. the critical path length of the partial graph of that processor.
+    processor_path_lengths: Dict[ProcessorType, float]
+    work: Dict[ProcessorType, float]  # processor type -> total task duration
+    # block name -> (processor type -> total duration of the tasks of the block)
+    block_work: Dict[str, Dict[ProcessorType, float]]
+    # names of the blocks of the tasks on the critical path, in order
+    critical_blocks: List[str]
+
+    @property
+    def makespan_lower_bound(self) -> float:
+        """No schedule (with one CPU and one QPU) finishes the graph earlier."""
+        return max([self.critical_path.length] + list(self.work.values()))
+
+    @property
+    def bottleneck(self) -> Optional[ProcessorType]:
+        """Processor that has the most work, if its work is the makespan lower
+        bound. None if the critical path is the bound."""
+        if len(self.work) == 0:
+            return None
+        proc_type = max(self.work, key=lambda p: self.work[p])
+        if self.work[proc_type] < self.critical_path.length:
+            return None
+        return proc_type
+
+    @property
+    def min_period(self) -> float:
+        """Minimum time between the starts of consecutive instances of the graph
+        if many instances are executed concurrently, i.e. the inverse of the
+        maximum throughput. Bounded by the processor with the most work."""
+        return max(self.work.values(), default=0)
+
+    def bottleneck_blocks(self) -> List[str]:
+        """Names of the blocks that bound the throughput: the blocks that have
+        tasks on the processor with the most work, ordered by their work on that
+        processor (most work first)."""
+        if len(self.work) == 0:
+            return []
+        proc_type = max(self.work, key=lambda p: self.work[p])
+        blocks = [
+            name for name, work in self.block_work.items() if work.get(proc_type, 0) > 0
+        ]
+        return sorted(blocks, key=lambda b: -self.block_work[b][proc_type])
+
+    def __str__(self) -> str:
+        s = f"critical path length: {self.critical_path.length}"
+        for proc_type, work in self.work.items():
+            s += f", {proc_type.name} work: {work}"
+        s += f"\n  makespan lower bound: {self.makespan_lower_bound}"
+        s += f"\n  critical blocks: {', '.join(self.critical_blocks)}"
+        s += f"\n  bottleneck blocks: {', '.join(self.bottleneck_blocks())}"
+        return s
+
+
+class TaskGraphAnalyzer:
+    """Computes critical paths, slack and processor load of a task graph.
+
+    :param graph: task graph to analyze. The graph is not modified.
+    """
+
+    def __init__(self, graph: TaskGraph) -> None:
+        self._graph = graph
+        self._order = self._topological_order()
+
+    def _topological_order(self) -> List[int]:
+        tasks = self._graph.get_tasks()
+        num_preds = {
+            tid: len([p for p in tinfo.predecessors if p in tasks])
+            for tid, tinfo in tasks.items()
+        }
+        successors: Dict[int, List[int]] = {tid: [] for tid in tasks}
+        for tid, tinfo in tasks.items():
+            for pred in tinfo.predecessors:
+                if pred in tasks:
+                    successors[pred].append(tid)
+        order = [tid for tid, n in num_preds.items() if n == 0]
+        for tid in order:  # `order` grows while iterating
+            for succ in successors[tid]:
+                num_preds[succ] -= 1
+                if num_preds[succ] == 0:
+                    order.append(succ)
+        if len(order) != len(tasks):
+            raise RuntimeError("task graph contains a cycle")
+        return order
+
+    def _durations(self, proc_type: Optional[ProcessorType]) -> Dict[int, float]:
+        durations: Dict[int, float] = {}
+        for tid, tinfo in self._graph.get_tasks().items():
+            task = tinfo.task
+            if proc_type is not None and task.processor_type != proc_type:
+                durations[tid] = 0
+            else:
+                durations[tid] = task.duration if task.duration is not None else 0
+        return durations
+
+    def critical_path(
+        self, proc_type: Optional[ProcessorType] = None
+    ) -> CriticalPathAnalysis:
+        """Compute earliest and latest start times and a critical path.
+
+        Tasks that have a `start_time` do not start before it.
+
+        :param proc_type: if given, only tasks of this processor take time (and
+            only their start times are used). The result is then the same as for
+            the partial graph of that processor (see `TaskGraph.partial_graph`),
+            but includes all tasks.
+        :return: the analysis
+        """
+        tasks = self._graph.get_tasks()
+        durations = self._durations(proc_type)
+
+        earliest: Dict[int, float] = {}
+        for tid in self._order:
+            tinfo = tasks[tid]
+            start: float = 0
+            if tinfo.start_time is not None and (
+                proc_type is None or tinfo.task.processor_type == proc_type
+            ):
+                start = tinfo.start_time
+            for pred in tinfo.predecessors:
+                if pred in tasks:
+                    start = max(start, earliest[pred] + durations[pred])
+            earliest[tid] = start
+        length = max((earliest[t] + durations[t] for t in self._order), default=0)
+
+        latest: Dict[int, float] = {}
+        for tid in reversed(self._order):
+            latest.setdefault(tid, length - durations[tid])
+            for pred in tasks[tid].predecessors:
+                if pred in tasks:
+                    pred_latest = latest[tid] - durations[pred]
+                    latest[pred] = min(latest.get(pred, pred_latest), pred_latest)
+
+        return CriticalPathAnalysis(
+            durations=durations,
+            earliest_start=earliest,
+            latest_start=latest,
+            length=length,
+            critical_path=self._trace_path(earliest, durations, length),
+        )
+
+    def _trace_path(
+        self, earliest: Dict[int, float], durations: Dict[int, float], length: float
+    ) -> List[int]:
+        # Follow, backwards from a task that finishes last, the predecessors that
+        # determine the earliest start time of each task.
+        tasks = self._graph.get_tasks()
+        last = [t for t in self._order if earliest[t] + durations[t] == length]
+        if len(last) == 0:
+            return []
+        path = [last[0]]
+        while True:
+            tid = path[-1]
+            preds = sorted(
+                pred
+                for pred in tasks[tid].predecessors
+                if pred in tasks and earliest[pred] + durations[pred] == earliest[tid]
+            )
+            if len(preds) == 0:
+                break
+            path.append(preds[0])
+        return list(reversed(path))
+
+    def _block_names(self) -> Dict[int, str]:
+        # Task ID -> name of the block that the task belongs to. Pair and callback
+        # tasks have no block name, but share their shared pointer with the pre-
+        # and postcall tasks of their block.
+        tasks = self._graph.get_tasks()
+        by_ptr: Dict[int, str] = {}
+        for tinfo in tasks.values():
+            if hasattr(tinfo.task, "block_name") and hasattr(tinfo.task, "shared_ptr"):
+                by_ptr[tinfo.task.shared_ptr] = tinfo.task.block_name  # type: ignore
+        names: Dict[int, str] = {}
+        for tid, tinfo in tasks.items():
+            name = self._block_name_of(tinfo.task, by_ptr)
+            if name is not None:
+                names[tid] = name
+        return names
+
+    def _block_name_of(self, task: QoalaTask, by_ptr: Dict[int, str]) -> Optional[str]:
+        if hasattr(task, "block_name"):
+            return task.block_name  # type: ignore
+        if hasattr(task, "shared_ptr"):
+            return by_ptr.get(task.shared_ptr)  # type: ignore
+        return None
+
+    def analyze(self) -> GraphAnalysis:
+        """Compute the critical path of the graph, the critical path of each
+        processor, and the work of each processor and each block.
+
+        :return: the analysis
+        """
+        tasks = self._graph.get_tasks()
+        critical_path = self.critical_path()
+        proc_types = [ProcessorType.CPU, ProcessorType.QPU]
+        proc_lengths = {p: self.critical_path(p).length for p in proc_types}
+
+        work: Dict[ProcessorType, float] = {p: 0 for p in proc_types}
+        block_work: Dict[str, Dict[ProcessorType, float]] = {}
+        names = self._block_names()
+        for tid, tinfo in tasks.items():
+            proc_type = tinfo.task.processor_type
+            duration = critical_path.durations[tid]
+            work[proc_type] += duration
+            if tid in names:
+                per_proc = block_work.setdefault(names[tid], {})
+                per_proc[proc_type] = per_proc.get(proc_type, 0) + duration
+
+        critical_blocks: List[str] = []
+        for tid in critical_path.critical_path:
+            name = names.get(tid)
+            if name is not None and name not in critical_blocks[-1:]:
+                critical_blocks.append(name)
+
+        return GraphAnalysis(
+            critical_path=critical_path,
+            processor_path_lengths=proc_lengths,
+            work=work,
+            block_work=block_work,
+            critical_blocks=critical_blocks,
+        )
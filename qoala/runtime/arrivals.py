@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import itertools
+import random
+from typing import Iterable, Iterator, Optional, Tuple
+
+from qoala.runtime.program import ProgramInput
+
+# Arrival processes for streams of program instances (see `StreamInfo`).
+# Each arrival is a tuple (time since previous arrival, program inputs).
+
+
+def periodic_arrivals(
+    period: float,
+    inputs: Iterable[ProgramInput],
+    num_arrivals: Optional[int] = None,
+) -> Iterator[Tuple[float, ProgramInput]]:
+    """Arrivals at fixed intervals. The first arrival is at time `period`.
+
+    :param period: time between two consecutive arrivals
+    :param inputs: program inputs for the consecutive arrivals
+    :param num_arrivals: maximum number of arrivals, or None for no maximum
+    """
+    for prog_input in itertools.islice(inputs, num_arrivals):
+        yield period, prog_input
+
+
+def poisson_arrivals(
+    rate: float,
+    inputs: Iterable[ProgramInput],
+    num_arrivals: Optional[int] = None,
+    rng: Optional[random.Random] = None,
+) -> Iterator[Tuple[float, ProgramInput]]:
+    """Arrivals according to a Poisson process, i.e. with exponentially
+    distributed times between consecutive arrivals.
+
+    :param rate: average number of arrivals per unit of (simulated) time
+    :param inputs: program inputs for the consecutive arrivals
+    :param num_arrivals: maximum number of arrivals, or None for no maximum
+    :param rng: random number generator to use; if None, the global one of the
+        `random` module is used
+    """
+    assert rate > 0
+    expovariate = random.expovariate if rng is None else rng.expovariate
+    for prog_input in itertools.islice(inputs, num_arrivals):
+        yield expovariate(rate), prog_input
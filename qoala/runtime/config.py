@@ -1264,6 +1264,31 @@ class ProcNodeConfig(BaseModel):
     determ_sched: bool = True
     use_deadlines: bool = True
     is_predictable: bool = False
+    retire_finished: bool = False
+    # scheduling policy of the processor schedulers; see `build_scheduling_policy`
+    sched_policy: str = "edf"
+    # number of CPU cores that execute classical tasks concurrently
+    num_cpu_cores: int = 1
+    # number of QPU lanes: QPU tasks on disjoint qubits that execute concurrently.
+    # Limitation: the quantum processor executes one quantum program at a time, so
+    # with multiple lanes only classical instructions and entanglement generation
+    # overlap; gates on disjoint qubits are still executed one after the other.
+    num_qpu_lanes: int = 1
+    # whether quantum blocks are held back until the qubits they need are available
+    admission_control: bool = False
+    # whether the QPU only executes tasks that finish before the next time bin in
+    # which an EPR task can be executed
+    timebin_lookahead: bool = False
+    # whether the pairs of a request routine with a SEQUENTIAL callback are
+    # generated by a single task, instead of by one task (and callback) per pair
+    pair_range_tasks: bool = False
+    # whether durations of local routines are estimated again when they become
+    # ready, from the gates on the physical qubits they act on, instead of the worst
+    # case over all qubits
+    per_qubit_durations: bool = False
+    # weights of the "wfq" scheduling policy: flow kind ("batch" or "stream") ->
+    # (batch or stream ID -> weight). Batches and streams without weight have 1.
+    wfq_weights: Dict[str, Dict[int, float]] = {}
 
     @classmethod
     def from_file(cls, path: str) -> ProcNodeConfig:
@@ -4,7 +4,7 @@ from __future__ import annotations
 import itertools
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Dict, FrozenSet, List, Optional, Type
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Type
 
 from netsquid.components.instructions import (
     INSTR_CNOT,
@@ -136,6 +136,31 @@ class LhiTopology:
                 return info
         return None
 
+    def get_mediating_qubits(self, qubit_id: int) -> Set[int]:
+        """
+        Returns the other qubits that every multi-qubit gate on the given qubit
+        acts on. Such a qubit can only interact with other qubits through these
+        qubits, which are therefore assumed to be used by any operation on it.
+        For example, every gate on a carbon qubit of an NV center goes through
+        the electron.
+
+        :param qubit_id: ID of the qubit
+        :return: IDs of the mediating qubits (empty if the qubit is not part of
+            any multi-qubit gate)
+        """
+        mediating: Optional[Set[int]] = None
+        for multi in self.multi_gate_infos:
+            if qubit_id not in multi.qubit_ids:
+                continue
+            if mediating is None:
+                mediating = set(multi.qubit_ids)
+            else:
+                mediating &= set(multi.qubit_ids)
+        if mediating is None:
+            return set()
+        mediating.discard(qubit_id)
+        return mediating
+
 
 # Convenience methods.
 
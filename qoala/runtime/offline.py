@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import heapq
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from netqasm.lang.operand import Template
+
+from qoala.lang.ehi import (
+    EhiNetworkInfo,
+    EhiNetworkSchedule,
+    EhiNetworkTimebin,
+    EhiNodeInfo,
+)
+from qoala.lang.hostlang import RunRequestOp
+from qoala.runtime.program import ProgramInstance
+from qoala.runtime.task import (
+    MultiPairTask,
+    PairRangeTask,
+    PreCallTask,
+    ProcessorType,
+    SinglePairTask,
+    TaskGraph,
+    TaskGraphBuilder,
+)
+
+# Offline (static) scheduling of all tasks of a node, for use with a node scheduler
+# in predictable mode (`is_predictable`). The full task graph of all program
+# instances is scheduled before the simulation is run; the resulting graph is then
+# uploaded to the node scheduler with `NodeScheduler.upload_task_graph`.
+
+
+@dataclass
+class OfflineSchedule:
+    """Result of offline scheduling.
+
+    Deadlines are interpreted as the latest time at which a task should have
+    finished, with time 0 being the start of the schedule.
+    """
+
+    # Scheduled graph: the tasks of each processor form a chain in execution order,
+    # and each task has its scheduled start time as `start_time`.
+    graph: TaskGraph
+    start_times: Dict[int, float]  # task ID -> start time
+    end_times: Dict[int, float]  # task ID -> end time
+    # task ID -> (deadline, end time) for tasks that finish after their deadline
+    deadline_misses: Dict[int, Tuple[float, float]]
+
+    @property
+    def makespan(self) -> float:
+        return max(self.end_times.values(), default=0)
+
+    @property
+    def num_deadline_misses(self) -> int:
+        return len(self.deadline_misses)
+
+    def execution_order(self, proc_type: ProcessorType) -> List[int]:
+        """IDs of the tasks of the given processor, in order of execution."""
+        # `start_times` is filled in the order in which tasks were scheduled.
+        return [
+            tid
+            for tid in self.start_times
+            if self.graph.get_tinfo(tid).task.processor_type == proc_type
+        ]
+
+    def __str__(self) -> str:
+        s = f"makespan: {self.makespan}, deadline misses: {self.num_deadline_misses}"
+        for tid, (deadline, end) in sorted(self.deadline_misses.items()):
+            s += f"\n  task {tid}: deadline {deadline}, finishes at {end}"
+        return s
+
+
+class OfflineScheduler:
+    """List scheduler that computes a static schedule for a task graph containing
+    all tasks of a node, with one CPU and one QPU.
+
+    Repeatedly, the task that can start the earliest is scheduled. A task can
+    start when its processor is free, all its predecessors have finished, its
+    `start_time` (if any) has been reached, and, for EPR tasks with a time bin,
+    when its time bin starts. If several tasks can start at the same time, the one
+    with the earliest deadline is chosen, and then the one with the longest path
+    (in total duration) to the end of the graph.
+
+    Tasks without duration take no time. External predecessors (tasks that are
+    not in the graph) are assumed to have finished.
+
+    :param graph: task graph with all tasks of the node, e.g. created with
+        `graph_for_instances`. The graph is not modified.
+    :param network_schedule: network schedule of the network, if any
+    :param timebins: time bin of each EPR task (task ID -> bin), e.g. created with
+        `timebins_for_instances`. EPR tasks without bin, or all EPR tasks if there
+        is no network schedule, can start any time.
+    """
+
+    def __init__(
+        self,
+        graph: TaskGraph,
+        network_schedule: Optional[EhiNetworkSchedule] = None,
+        timebins: Optional[Dict[int, EhiNetworkTimebin]] = None,
+    ) -> None:
+        self._graph = graph
+        self._network_schedule = network_schedule
+        self._timebins = timebins if timebins is not None else {}
+
+    @classmethod
+    def graph_for_instances(
+        cls,
+        instances: List[ProgramInstance],
+        ehi: Optional[EhiNodeInfo] = None,
+        network_ehi: Optional[EhiNetworkInfo] = None,
+    ) -> TaskGraph:
+        """Build the task graph of all given program instances, with unique task
+        IDs across instances.
+
+        :param instances: program instances on the node
+        :param ehi: node info, used for task durations
+        :param network_ehi: network info
+        :return: merged task graph
+        """
+        graphs: List[TaskGraph] = []
+        first_task_id = 0
+        for instance in instances:
+            graph = TaskGraphBuilder.from_program(
+                instance.program,
+                instance.pid,
+                ehi,
+                network_ehi,
+                first_task_id,
+                instance.inputs.values,
+            )
+            graphs.append(graph)
+            first_task_id = max(graph.get_tasks(), default=first_task_id - 1) + 1
+        return TaskGraphBuilder.merge(graphs)
+
+    @classmethod
+    def timebins_for_instances(
+        cls,
+        instances: List[ProgramInstance],
+        graph: TaskGraph,
+        node_id: int,
+        network_ehi: EhiNetworkInfo,
+        remote_pids: Optional[Dict[int, int]] = None,
+    ) -> Dict[int, EhiNetworkTimebin]:
+        """Time bin of each EPR task of a graph created with `graph_for_instances`,
+        derived from the request routines in the same way as the QPU scheduler
+        does at runtime (see `QpuEdfScheduler.timebin_for_task`).
+
+        :param instances: program instances on the node
+        :param graph: task graph of the instances
+        :param node_id: ID of the node
+        :param network_ehi: network info, used to find the IDs of remote nodes
+        :param remote_pids: PID of the program instance on the remote node, for
+            each PID. By default, remote PIDs are the same as local PIDs.
+        :return: task ID -> time bin, for all EPR tasks of the graph
+        """
+        by_pid = {instance.pid: instance for instance in instances}
+        tasks = graph.get_tasks()
+        # EPR tasks share their shared pointer with the precall task of their block.
+        block_names = {
+            tinfo.task.shared_ptr: tinfo.task.block_name
+            for tinfo in tasks.values()
+            if isinstance(tinfo.task, PreCallTask)
+        }
+
+        timebins: Dict[int, EhiNetworkTimebin] = {}
+        for tid, tinfo in tasks.items():
+            task = tinfo.task
+            if not isinstance(task, (SinglePairTask, MultiPairTask, PairRangeTask)):
+                continue
+            instance = by_pid[task.pid]
+            program = instance.program
+            instr = program.get_block(block_names[task.shared_ptr]).instructions[0]
+            assert isinstance(instr, RunRequestOp)
+            request = program.request_routines[instr.req_routine].request
+            socket_id = request.epr_socket_id
+            if isinstance(socket_id, Template):
+                socket_id = instance.inputs.values[socket_id.name]
+            remote_name = program.meta.epr_sockets[socket_id]  # type: ignore
+            remote_id = network_ehi.get_node_id(remote_name)
+            remote_pid = task.pid if remote_pids is None else remote_pids[task.pid]
+            timebins[tid] = EhiNetworkTimebin(
+                nodes=frozenset({node_id, remote_id}),
+                pids={node_id: task.pid, remote_id: remote_pid},
+            )
+        return timebins
+
+    def _duration(self, tid: int) -> float:
+        duration = self._graph.get_tinfo(tid).task.duration
+        return duration if duration is not None else 0
+
+    def _topological_order(self) -> List[int]:
+        tasks = self._graph.get_tasks()
+        num_preds = {
+            tid: len([p for p in tinfo.predecessors if p in tasks])
+            for tid, tinfo in tasks.items()
+        }
+        order = [tid for tid, n in num_preds.items() if n == 0]
+        for tid in order:  # `order` grows while iterating
+            for succ in tasks[tid].successors:
+                num_preds[succ] -= 1
+                if num_preds[succ] == 0:
+                    order.append(succ)
+        if len(order) != len(tasks):
+            raise RuntimeError("task graph contains a cycle")
+        return order
+
+    def _path_lengths(self, order: List[int]) -> Dict[int, float]:
+        # Longest path (in total duration) from each task to the end of the graph.
+        lengths: Dict[int, float] = {}
+        for tid in reversed(order):
+            succs = self._graph.get_tinfo(tid).successors
+            rest = max((lengths[s] for s in succs), default=0)
+            lengths[tid] = self._duration(tid) + rest
+        return lengths
+
+    def _deadline(self, tid: int, ends: Dict[int, float]) -> Optional[float]:
+        # Absolute deadline of a task whose predecessors have all been scheduled.
+        tinfo = self._graph.get_tinfo(tid)
+        deadlines: List[float] = [] if tinfo.deadline is None else [tinfo.deadline]
+        for pred, rel_deadline in tinfo.rel_deadlines.items():
+            if pred in ends:
+                deadlines.append(ends[pred] + rel_deadline)
+        return min(deadlines, default=None)
+
+    def _bin_start(self, tid: int, start: float) -> float:
+        # Earliest time at or after `start` at which the task can start. The result
+        # is non-decreasing in `start`.
+        if self._network_schedule is None or tid not in self._timebins:
+            return start
+        return start + self._network_schedule.next_specific_bin(
+            start, self._timebins[tid]  # type: ignore
+        )
+
+    def schedule(self) -> OfflineSchedule:
+        """Compute the schedule. Takes O((V + E) log V) time for a graph with V
+        tasks and E precedences (plus re-evaluations of time bins of EPR tasks).
+
+        :return: the schedule, including its makespan and deadline misses
+        """
+        tasks = self._graph.get_tasks()
+        order = self._topological_order()
+        position = {tid: i for i, tid in enumerate(tasks)}
+        path_lengths = self._path_lengths(order)
+        proc_types = [ProcessorType.CPU, ProcessorType.QPU]
+
+        proc_free: Dict[ProcessorType, float] = {p: 0 for p in proc_types}
+        starts: Dict[int, float] = {}
+        ends: Dict[int, float] = {}
+        deadlines: Dict[int, Optional[float]] = {}
+        ready_times: Dict[int, float] = {}  # max of predecessor ends and start time
+        num_preds = {
+            tid: len([p for p in tinfo.predecessors if p in tasks])
+            for tid, tinfo in tasks.items()
+        }
+
+        # Tasks whose predecessors have all been scheduled, per processor. Entries
+        # are (start time, deadline is None, deadline, -path length, position,
+        # task ID), so that the smallest entry is the task that is scheduled next.
+        # `waiting`: tasks that are ready after their processor is free, keyed by
+        # their ready time. `available`: tasks that are ready when their processor
+        # is free; these all start at that time, so their first item is 0.
+        # `binned`: EPR tasks with a time bin, keyed by their start time when it
+        # was last computed. Since processors only become free later, start times
+        # only increase, so an entry whose start time is still correct is the
+        # smallest one.
+        Entry = Tuple[float, bool, float, float, int, int]
+        waiting: Dict[ProcessorType, List[Entry]] = {p: [] for p in proc_types}
+        available: Dict[ProcessorType, List[Entry]] = {p: [] for p in proc_types}
+        binned: Dict[ProcessorType, List[Entry]] = {p: [] for p in proc_types}
+
+        def make_ready(tid: int) -> None:
+            tinfo = tasks[tid]
+            deadline = self._deadline(tid, ends)
+            deadlines[tid] = deadline
+            ready = 0 if tinfo.start_time is None else tinfo.start_time
+            for pred in tinfo.predecessors:
+                if pred in ends:
+                    ready = max(ready, ends[pred])
+            ready_times[tid] = ready
+
+            proc_type = tinfo.task.processor_type
+            start = max(ready, proc_free[proc_type])
+            heap = waiting[proc_type]
+            if self._network_schedule is not None and tid in self._timebins:
+                start = self._bin_start(tid, start)
+                heap = binned[proc_type]
+            entry = (
+                start,
+                deadline is None,
+                deadline if deadline is not None else 0,
+                -path_lengths[tid],
+                position[tid],
+                tid,
+            )
+            heapq.heappush(heap, entry)
+
+        def candidates(proc_type: ProcessorType) -> List[Tuple[Entry, List[Entry]]]:
+            # Entries of the tasks of this processor that may be scheduled next,
+            # with the heap that each is the smallest entry of.
+            free = proc_free[proc_type]
+            wait, avail, bins = (
+                waiting[proc_type],
+                available[proc_type],
+                binned[proc_type],
+            )
+            while len(wait) > 0 and wait[0][0] <= free:
+                entry = heapq.heappop(wait)
+                heapq.heappush(avail, (0.0,) + entry[1:])  # type: ignore
+            while len(bins) > 0:
+                entry = bins[0]
+                start = self._bin_start(entry[-1], max(ready_times[entry[-1]], free))
+                if start == entry[0]:
+                    break
+                heapq.heapreplace(bins, (start,) + entry[1:])  # type: ignore
+
+            result: List[Tuple[Entry, List[Entry]]] = []
+            if len(avail) > 0:
+                result.append(((free,) + avail[0][1:], avail))  # type: ignore
+            for heap in [wait, bins]:
+                if len(heap) > 0:
+                    result.append((heap[0], heap))
+            return result
+
+        for tid, n in num_preds.items():
+            if n == 0:
+                make_ready(tid)
+
+        while True:
+            choices = [c for p in proc_types for c in candidates(p)]
+            if len(choices) == 0:
+                break
+            entry, heap = min(choices, key=lambda c: c[0])
+            heapq.heappop(heap)
+            tid = entry[-1]
+            starts[tid] = entry[0]
+            ends[tid] = starts[tid] + self._duration(tid)
+            proc_free[tasks[tid].task.processor_type] = ends[tid]
+
+            for succ in tasks[tid].successors:
+                num_preds[succ] -= 1
+                if num_preds[succ] == 0:
+                    make_ready(succ)
+
+        misses: Dict[int, Tuple[float, float]] = {}
+        for tid, deadline in deadlines.items():
+            if deadline is not None and ends[tid] > deadline:
+                misses[tid] = (deadline, ends[tid])
+
+        return OfflineSchedule(self._scheduled_graph(starts), starts, ends, misses)
+
+    def _scheduled_graph(self, starts: Dict[int, float]) -> TaskGraph:
+        # Copy of the graph with start times, in which the tasks of each processor
+        # are chained in order of execution.
+        tinfos = {
+            tid: deepcopy(tinfo) for tid, tinfo in self._graph.get_tasks().items()
+        }
+        for tid, tinfo in tinfos.items():
+            tinfo.start_time = starts[tid]
+
+        for proc_type in [ProcessorType.CPU, ProcessorType.QPU]:
+            # `starts` is filled in the order in which tasks were scheduled.
+            chain = [
+                tid for tid in starts if tinfos[tid].task.processor_type == proc_type
+            ]
+            for pred, succ in zip(chain, chain[1:]):
+                tinfos[succ].predecessors.add(pred)
+
+        graph = TaskGraph(tinfos)
+        graph.update_successors()
+        return graph
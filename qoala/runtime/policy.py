@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import random
+from abc import ABC, abstractmethod
+from typing import Container, Dict, Hashable, List, Optional, Tuple
+
+from qoala.runtime.task import QoalaTask, TaskGraph
+
+# Scheduling policies decide which task a processor scheduler executes next.
+# The processor scheduler determines which tasks are ready (i.e. have no
+# predecessors and are not blocked on messages, resources, start times or time
+# bins); the policy only chooses between them. Schedulers call `select_root`,
+# which policies that only need the first ready task in some order (EDF, FIFO)
+# implement using the priority queues of the task graph, without inspecting all
+# roots.
+
+
+class SchedulingPolicy(ABC):
+    """Policy of a processor scheduler for choosing the next task to execute."""
+
+    @abstractmethod
+    def select_task(
+        self,
+        graph: TaskGraph,
+        roots: List[int],
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        """Choose the next (non-EPR) task to execute.
+
+        :param graph: task graph of the processor scheduler
+        :param roots: IDs of all tasks without predecessors, in task order
+        :param not_ready: IDs of roots that cannot be executed now
+        :param epr_wait: (task ID, time until its bin) of the EPR task that waits
+            for the nearest time bin, if any
+        :return: ID of the task to execute, or None to execute nothing now
+        """
+        raise NotImplementedError
+
+    def select_root(
+        self,
+        graph: TaskGraph,
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        """Choose the next (non-EPR) task to execute among all roots of the graph.
+        Same as `select_task` with the roots of the graph, which is what this
+        default implementation does.
+
+        :param graph: task graph of the processor scheduler
+        :param not_ready: IDs of roots that cannot be executed now; only membership
+            is tested
+        :param epr_wait: see `select_task`
+        :return: ID of the task to execute, or None to execute nothing now
+        """
+        return self.select_task(graph, graph.get_roots(), not_ready, epr_wait)
+
+    def select_epr_task(self, graph: TaskGraph, epr_ready: List[int]) -> int:
+        """Choose the next EPR task to execute.
+
+        :param graph: task graph of the processor scheduler
+        :param epr_ready: IDs of EPR tasks that can be executed now, ordered by
+            the start of their time bin and then by task order
+        :return: ID of the EPR task to execute
+        """
+        return epr_ready[0]
+
+    def register_program_instance(self, pid: int, flow: Hashable) -> None:
+        """Register to which flow (e.g. batch) a program instance belongs."""
+        pass
+
+    def release_program_instance(self, pid: int) -> None:
+        """Drop all bookkeeping of a (completed) program instance."""
+        pass
+
+    def task_finished(self, task: QoalaTask, duration: float) -> None:
+        """Notify the policy that a task has been executed."""
+        pass
+
+
+def _duration(task: QoalaTask) -> float:
+    return task.duration if task.duration is not None else 0
+
+
+class EdfPolicy(SchedulingPolicy):
+    """Earliest deadline first. Tasks without deadline come after tasks with a
+    deadline, in task order (or in random order if not deterministic)."""
+
+    def __init__(self, deterministic: bool = True, use_deadlines: bool = True) -> None:
+        self._deterministic = deterministic
+        self._use_deadlines = use_deadlines
+
+    def select_task(
+        self,
+        graph: TaskGraph,
+        roots: List[int],
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        if self._use_deadlines:
+            tid = graph.get_earliest_deadline_root(skip=not_ready)
+            if tid is not None:
+                return tid
+
+        ready = [tid for tid in roots if tid not in not_ready]
+        if len(ready) == 0:
+            return None
+        if self._deterministic:
+            return ready[0]
+        return ready[random.randint(0, len(ready) - 1)]
+
+    def select_root(
+        self,
+        graph: TaskGraph,
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        if not self._deterministic:
+            # A random choice needs all ready roots.
+            return self.select_task(graph, graph.get_roots(), not_ready, epr_wait)
+        if self._use_deadlines:
+            tid = graph.get_earliest_deadline_root(skip=not_ready)
+            if tid is not None:
+                return tid
+        return graph.get_first_root(skip=not_ready)
+
+
+class FifoPolicy(SchedulingPolicy):
+    """First in, first out: the ready task that was added first, regardless of
+    deadlines."""
+
+    def select_task(
+        self,
+        graph: TaskGraph,
+        roots: List[int],
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        for tid in roots:
+            if tid not in not_ready:
+                return tid
+        return None
+
+    def select_root(
+        self,
+        graph: TaskGraph,
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        return graph.get_first_root(skip=not_ready)
+
+
+class LlfPolicy(SchedulingPolicy):
+    """Least laxity first. The laxity of a task is its (relative) deadline minus
+    its duration. Tasks without deadline come last, in task order."""
+
+    def select_task(
+        self,
+        graph: TaskGraph,
+        roots: List[int],
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        best: Optional[int] = None
+        best_laxity: Optional[float] = None
+        first_without_deadline: Optional[int] = None
+        for tid in roots:
+            if tid in not_ready:
+                continue
+            tinfo = graph.get_tinfo(tid)
+            if tinfo.deadline is None:
+                if first_without_deadline is None:
+                    first_without_deadline = tid
+                continue
+            laxity = tinfo.deadline - _duration(tinfo.task)
+            if best_laxity is None or laxity < best_laxity:
+                best = tid
+                best_laxity = laxity
+        return best if best is not None else first_without_deadline
+
+
+class WfqPolicy(SchedulingPolicy):
+    """Weighted fair queueing across flows (e.g. batches). Each flow receives
+    processor time in proportion to its weight: the ready task of the flow with
+    the least weighted service so far is executed next.
+
+    Program instances that have not been registered form a flow on their own.
+
+    :param weights: weight per flow; flows without weight have weight 1
+    """
+
+    def __init__(self, weights: Optional[Dict[Hashable, float]] = None) -> None:
+        self._weights: Dict[Hashable, float] = weights if weights is not None else {}
+        self._flows: Dict[int, Hashable] = {}  # pid -> flow
+        self._service: Dict[Hashable, float] = {}  # flow -> weighted service
+        # Weighted service of the most recently selected flow. Flows that become
+        # active start from here, so they cannot starve flows that were active
+        # before.
+        self._virtual_time: float = 0
+
+    def set_weight(self, flow: Hashable, weight: float) -> None:
+        assert weight > 0
+        self._weights[flow] = weight
+
+    def weight_of(self, flow: Hashable) -> float:
+        return self._weights.get(flow, 1)
+
+    def flow_of(self, pid: int) -> Hashable:
+        return self._flows.get(pid, ("pid", pid))
+
+    def register_program_instance(self, pid: int, flow: Hashable) -> None:
+        self._flows[pid] = flow
+
+    def release_program_instance(self, pid: int) -> None:
+        self._flows.pop(pid, None)
+
+    def _service_of(self, flow: Hashable) -> float:
+        return max(self._service.get(flow, 0), self._virtual_time)
+
+    def select_task(
+        self,
+        graph: TaskGraph,
+        roots: List[int],
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        best: Optional[int] = None
+        best_service: Optional[float] = None
+        for tid in roots:
+            if tid in not_ready:
+                continue
+            service = self._service_of(self.flow_of(graph.get_tinfo(tid).task.pid))
+            if best_service is None or service < best_service:
+                best = tid
+                best_service = service
+        if best_service is not None:
+            self._virtual_time = best_service
+        return best
+
+    def task_finished(self, task: QoalaTask, duration: float) -> None:
+        flow = self.flow_of(task.pid)
+        weight = self.weight_of(flow)
+        self._service[flow] = self._service_of(flow) + duration / weight
+
+
+class ThroughputPolicy(SchedulingPolicy):
+    """Maximizes the number of executed tasks. Ready tasks are executed shortest
+    first. If an EPR task waits for a time bin, only tasks that finish before
+    that bin starts are executed, so that the bin is not missed."""
+
+    def select_task(
+        self,
+        graph: TaskGraph,
+        roots: List[int],
+        not_ready: Container[int],
+        epr_wait: Optional[Tuple[int, float]] = None,
+    ) -> Optional[int]:
+        max_duration = epr_wait[1] if epr_wait is not None else None
+        best: Optional[int] = None
+        best_duration: Optional[float] = None
+        for tid in roots:
+            if tid in not_ready:
+                continue
+            duration = _duration(graph.get_tinfo(tid).task)
+            if max_duration is not None and duration > max_duration:
+                continue
+            if best_duration is None or duration < best_duration:
+                best = tid
+                best_duration = duration
+        return best
+
+
+def build_scheduling_policy(
+    name: str,
+    deterministic: bool = True,
+    use_deadlines: bool = True,
+    wfq_weights: Optional[Dict[Hashable, float]] = None,
+) -> SchedulingPolicy:
+    """Create a scheduling policy by name.
+
+    :param name: one of "edf", "fifo", "llf", "wfq" or "throughput"
+    :param deterministic: whether the EDF policy chooses deterministically
+        between tasks without deadline
+    :param use_deadlines: whether the EDF policy takes deadlines into account
+    :param wfq_weights: weight per flow for the WFQ policy (copied)
+    :return: new policy object
+    """
+    if name == "edf":
+        return EdfPolicy(deterministic, use_deadlines)
+    elif name == "fifo":
+        return FifoPolicy()
+    elif name == "llf":
+        return LlfPolicy()
+    elif name == "wfq":
+        return WfqPolicy(dict(wfq_weights) if wfq_weights is not None else None)
+    elif name == "throughput":
+        return ThroughputPolicy()
+    raise ValueError(f"unknown scheduling policy: {name}")
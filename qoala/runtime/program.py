@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from qoala.lang.ehi import UnitModule
 from qoala.lang.program import QoalaProgram
@@ -49,6 +49,77 @@ class ProgramBatch:
     instances: List[ProgramInstance]
 
 
+@dataclass
+class StreamInfo:
+    """Description of a stream of program instances that arrive over time.
+
+    In contrast to a batch, program instances are only created when they arrive."""
+
+    program: QoalaProgram
+    unit_module: UnitModule
+    # (time since previous arrival, inputs) for each arriving program instance
+    arrivals: Iterator[Tuple[float, ProgramInput]]
+    # maximum number of live program instances of this stream at the same time;
+    # instances arriving when the maximum is reached wait until one has finished
+    max_live: Optional[int] = None
+    # maximum number of records of finished instances that are kept (the most
+    # recent ones); None keeps all. `StreamStatistics` cover all instances.
+    max_records: Optional[int] = None
+
+
+@dataclass
+class ProgramInstanceRecord:
+    """Compact record of a finished program instance.
+
+    Kept by the node scheduler after the process itself has been released."""
+
+    pid: int
+    result: ProgramResult
+    timestamps: Optional[Tuple[float, float]]  # start, end
+    arrival_time: Optional[float] = None  # only for instances of a stream
+    # number of tasks that the CPU and the QPU executed for the program instance
+    num_cpu_tasks: int = 0
+    num_qpu_tasks: int = 0
+
+
+@dataclass
+class StreamStatistics:
+    """Aggregated results of all finished program instances of a stream,
+    including those of which the record is no longer kept."""
+
+    num_finished: int = 0
+    # time from arrival to end of the last task, summed over finished instances
+    total_latency: float = 0
+    max_latency: float = 0
+    # time from arrival of the first instance to the end of the last one
+    first_arrival: Optional[float] = None
+    last_end: Optional[float] = None
+
+    def add(self, record: ProgramInstanceRecord) -> None:
+        self.num_finished += 1
+        if record.arrival_time is None or record.timestamps is None:
+            return
+        latency = record.timestamps[1] - record.arrival_time
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if self.first_arrival is None or record.arrival_time < self.first_arrival:
+            self.first_arrival = record.arrival_time
+        if self.last_end is None or record.timestamps[1] > self.last_end:
+            self.last_end = record.timestamps[1]
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.num_finished if self.num_finished else 0
+
+    @property
+    def throughput(self) -> float:
+        """Finished instances per unit of (simulated) time."""
+        if self.first_arrival is None or self.last_end is None:
+            return 0
+        duration = self.last_end - self.first_arrival
+        return self.num_finished / duration if duration > 0 else 0
+
+
 @dataclass
 class BatchResult:
     batch_id: int
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from qoala.runtime.task import QoalaTask
 
@@ -12,6 +12,8 @@ class SchedulerStatistics:
         qpu_task_starts: Dict[int, float],
         cpu_task_ends: Dict[int, float],
         qpu_task_ends: Dict[int, float],
+        cpu_task_cores: Optional[Dict[int, int]] = None,
+        qpu_task_lanes: Optional[Dict[int, int]] = None,
     ) -> None:
         # task ID -> task
         self._cpu_tasks_executed = cpu_tasks_executed
@@ -25,6 +27,16 @@ class SchedulerStatistics:
         self._cpu_task_ends: Dict[int, float] = cpu_task_ends
         self._qpu_task_ends: Dict[int, float] = qpu_task_ends
 
+        # task ID -> CPU core that executed it; tasks that are not included were
+        # executed by core 0 (e.g. if the CPU has a single core)
+        self._cpu_task_cores: Dict[int, int] = (
+            cpu_task_cores if cpu_task_cores is not None else {}
+        )
+        # task ID -> QPU lane that executed it; same convention as for CPU cores
+        self._qpu_task_lanes: Dict[int, int] = (
+            qpu_task_lanes if qpu_task_lanes is not None else {}
+        )
+
         cpu_pids = set([t.pid for t in self._cpu_tasks_executed.values()])
         qpu_pids = set([t.pid for t in self._qpu_tasks_executed.values()])
         pids = cpu_pids.union(qpu_pids)
@@ -48,6 +60,34 @@ class SchedulerStatistics:
     def num_qpu_tasks_executed(self) -> int:
         return len(self._qpu_tasks_executed)
 
+    def cpu_core_of(self, task_id: int) -> int:
+        return self._cpu_task_cores.get(task_id, 0)
+
+    def qpu_lane_of(self, task_id: int) -> int:
+        return self._qpu_task_lanes.get(task_id, 0)
+
+    @property
+    def cpu_task_starts_per_core(self) -> Dict[int, Dict[int, float]]:
+        # core -> (task ID -> start time)
+        per_core: Dict[int, Dict[int, float]] = {}
+        for task_id, start in self._cpu_task_starts.items():
+            per_core.setdefault(self.cpu_core_of(task_id), {})[task_id] = start
+        return per_core
+
+    @property
+    def cpu_task_ends_per_core(self) -> Dict[int, Dict[int, float]]:
+        # core -> (task ID -> end time)
+        per_core: Dict[int, Dict[int, float]] = {}
+        for task_id, end in self._cpu_task_ends.items():
+            per_core.setdefault(self.cpu_core_of(task_id), {})[task_id] = end
+        return per_core
+
+    def cpu_core_busy_time(self, core: int) -> float:
+        # Total time that the given CPU core spent executing tasks.
+        starts = self.cpu_task_starts_per_core.get(core, {})
+        ends = self.cpu_task_ends_per_core.get(core, {})
+        return sum(ends[tid] - start for tid, start in starts.items() if tid in ends)
+
     def __str__(self) -> str:
         return (
             f"# tasks executed: {self.num_tasks_executed} "
@@ -1,14 +1,30 @@
 from __future__ import annotations
 
-from copy import deepcopy
+import heapq
+import itertools
+import weakref
+from array import array
+from copy import copy, deepcopy
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Dict, List, Optional, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Container,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
 from netqasm.lang.instr import core
-from netqasm.lang.operand import Template
+from netqasm.lang.instr.base import NetQASMInstruction
+from netqasm.lang.operand import Register, RegisterName, Template
 
-from qoala.lang.ehi import EhiNetworkInfo, EhiNodeInfo
+from qoala.lang.ehi import EhiGateInfo, EhiNetworkInfo, EhiNodeInfo
 from qoala.lang.hostlang import (
     BasicBlock,
     BasicBlockType,
@@ -28,6 +44,10 @@ class ProcessorType(Enum):
 
 
 class QoalaTask:
+    # Tasks are created in large numbers (e.g. two per EPR pair), so they do not
+    # have a __dict__.
+    __slots__ = ("_task_id", "_processor_type", "_pid", "_duration")
+
     def __init__(
         self,
         task_id: int,
@@ -59,12 +79,27 @@ class QoalaTask:
     def duration(self) -> Optional[float]:
         return self._duration
 
+    @duration.setter
+    def duration(self, duration: Optional[float]) -> None:
+        self._duration = duration
+
     def is_epr_task(self) -> bool:
-        return isinstance(self, SinglePairTask) or isinstance(self, MultiPairTask)
+        return isinstance(self, (SinglePairTask, MultiPairTask, PairRangeTask))
 
     def is_event_task(self) -> bool:
         return isinstance(self, HostEventTask)
 
+    def relabeled(self, id_offset: int, pid: int) -> QoalaTask:
+        """Copy of this task with its task ID shifted by `id_offset` and with the
+        given pid. A shared pointer is shifted as well, since shared pointers
+        are task IDs of related tasks (see `TaskGraphFromBlockBuilder`)."""
+        task = copy(self)
+        task._task_id = self._task_id + id_offset
+        task._pid = pid
+        if hasattr(task, "_shared_ptr"):
+            task._shared_ptr += id_offset  # type: ignore
+        return task
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, QoalaTask):
             return NotImplemented
@@ -77,6 +112,8 @@ class QoalaTask:
 
 
 class HostLocalTask(QoalaTask):
+    __slots__ = ("_block_name",)
+
     def __init__(
         self,
         task_id: int,
@@ -103,6 +140,8 @@ class HostLocalTask(QoalaTask):
 
 
 class HostEventTask(QoalaTask):
+    __slots__ = ("_block_name",)
+
     def __init__(
         self, task_id: int, pid: int, block_name: str, duration: Optional[float] = None
     ) -> None:
@@ -125,6 +164,8 @@ class HostEventTask(QoalaTask):
 
 
 class LocalRoutineTask(QoalaTask):
+    __slots__ = ("_block_name", "_shared_ptr")
+
     def __init__(
         self,
         task_id: int,
@@ -161,6 +202,8 @@ class LocalRoutineTask(QoalaTask):
 
 
 class PreCallTask(QoalaTask):
+    __slots__ = ("_block_name", "_shared_ptr")
+
     def __init__(
         self,
         task_id: int,
@@ -197,6 +240,8 @@ class PreCallTask(QoalaTask):
 
 
 class PostCallTask(QoalaTask):
+    __slots__ = ("_block_name", "_shared_ptr")
+
     def __init__(
         self,
         task_id: int,
@@ -233,6 +278,8 @@ class PostCallTask(QoalaTask):
 
 
 class SinglePairTask(QoalaTask):
+    __slots__ = ("_pair_index", "_shared_ptr")
+
     def __init__(
         self,
         task_id: int,
@@ -269,6 +316,8 @@ class SinglePairTask(QoalaTask):
 
 
 class MultiPairTask(QoalaTask):
+    __slots__ = ("_shared_ptr",)
+
     def __init__(
         self,
         task_id: int,
@@ -295,6 +344,8 @@ class MultiPairTask(QoalaTask):
 
 
 class SinglePairCallbackTask(QoalaTask):
+    __slots__ = ("_callback_name", "_pair_index", "_shared_ptr")
+
     def __init__(
         self,
         task_id: int,
@@ -338,6 +389,8 @@ class SinglePairCallbackTask(QoalaTask):
 
 
 class MultiPairCallbackTask(QoalaTask):
+    __slots__ = ("_callback_name", "_shared_ptr")
+
     def __init__(
         self,
         task_id: int,
@@ -373,8 +426,72 @@ class MultiPairCallbackTask(QoalaTask):
         )
 
 
+class PairRangeTask(QoalaTask):
+    """Generation of all pairs of a request routine with a SEQUENTIAL callback,
+    each pair directly followed by its callback (if any).
+
+    This single task replaces the `SinglePairTask` and `SinglePairCallbackTask` of
+    each pair. The QPU scheduler executes it one pair at a time, so that resources
+    and time bins are still checked per pair.
+    """
+
+    __slots__ = ("_num_pairs", "_callback_name", "_shared_ptr")
+
+    def __init__(
+        self,
+        task_id: int,
+        pid: int,
+        num_pairs: int,
+        callback_name: Optional[str],
+        shared_ptr: int,  # used to identify shared (with other tasks) lrcall/rrcall objects
+        duration: Optional[float] = None,  # total duration of all pairs
+    ) -> None:
+        super().__init__(
+            task_id=task_id,
+            processor_type=ProcessorType.QPU,
+            pid=pid,
+            duration=duration,
+        )
+        self._num_pairs = num_pairs
+        self._callback_name = callback_name
+        self._shared_ptr = shared_ptr
+
+    @property
+    def num_pairs(self) -> int:
+        return self._num_pairs
+
+    @property
+    def callback_name(self) -> Optional[str]:
+        return self._callback_name
+
+    @property
+    def shared_ptr(self) -> int:
+        return self._shared_ptr
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PairRangeTask):
+            return NotImplemented
+        return (
+            super().__eq__(other)
+            and self.num_pairs == other.num_pairs
+            and self.callback_name == other.callback_name
+            and self.shared_ptr == other.shared_ptr
+        )
+
+
 @dataclass
 class TaskInfo:
+    __slots__ = (
+        "task",
+        "predecessors",
+        "ext_predecessors",
+        "successors",
+        "deadline",
+        "rel_deadlines",
+        "ext_rel_deadlines",
+        "start_time",
+    )
+
     task: QoalaTask
     predecessors: Set[int]
     ext_predecessors: Set[int]
@@ -394,6 +511,20 @@ class TaskInfo:
     def is_qpu_task(self) -> bool:
         return self.task.processor_type == ProcessorType.QPU
 
+    def relabeled(self, id_offset: int, pid: int) -> TaskInfo:
+        return TaskInfo(
+            task=self.task.relabeled(id_offset, pid),
+            predecessors={p + id_offset for p in self.predecessors},
+            ext_predecessors={p + id_offset for p in self.ext_predecessors},
+            successors={s + id_offset for s in self.successors},
+            deadline=self.deadline,
+            rel_deadlines={p + id_offset: d for p, d in self.rel_deadlines.items()},
+            ext_rel_deadlines={
+                p + id_offset: d for p, d in self.ext_rel_deadlines.items()
+            },
+            start_time=self.start_time,
+        )
+
 
 @dataclass
 class TaskGraph:
@@ -405,17 +536,220 @@ class TaskGraph:
         else:
             self._tasks = tasks
 
+        # Indexes over the tasks in this graph, so that schedulers can query roots
+        # without scanning all tasks. They are built lazily on the first query
+        # (builders fill in TaskInfo objects directly) and afterwards kept up to
+        # date by the methods of this class that modify the graph.
+        # Code that modifies TaskInfo objects directly after the graph has been
+        # queried must call `invalidate_index()`.
+        self._index_valid: bool = False
+        # Task ID -> insertion order, used to return roots in the order of `_tasks`.
+        self._order: Dict[int, int] = {}
+        self._next_order: int = 0
+        # Tasks without any predecessors (internal nor external).
+        self._roots: Set[int] = set()
+        # Tasks without internal predecessors but with external predecessors.
+        self._blocked_on_ext: Set[int] = set()
+        # Subsets of `_roots` containing the EPR tasks and event tasks.
+        self._epr_roots: Set[int] = set()
+        self._event_roots: Set[int] = set()
+        # PID -> number of tasks in this graph for that PID
+        self._pid_task_count: Dict[int, int] = {}
+        # Task ID -> IDs of tasks that have a relative deadline w.r.t. this task
+        self._rel_deadline_dependents: Dict[int, Set[int]] = {}
+        # External task ID -> IDs of tasks in this graph that have it as
+        # external predecessor
+        self._ext_dependents: Dict[int, Set[int]] = {}
+        # External task ID -> IDs of tasks in this graph that have a relative
+        # deadline w.r.t. it
+        self._ext_rel_deadline_dependents: Dict[int, Set[int]] = {}
+        # Tasks that became roots since the last call to `take_new_roots()`.
+        # None as long as `take_new_roots()` has never been called.
+        self._new_roots: Optional[List[int]] = None
+
+        # Priority queues over roots, used by the EDF schedulers to select tasks
+        # without sorting. Entries are (key, insertion order, task ID) so that ties
+        # are broken in task order. Entries are removed lazily: an entry is only
+        # valid if the task is still a root and its key is still the current one.
+        # Deadline keys are absolute, i.e. relative to the deadline epoch 0.
+        self._deadline_keys: Dict[int, float] = {}  # task ID -> current key
+        self._deadline_heap: List[Tuple[float, int, int]] = []
+        self._start_time_heap: List[Tuple[float, int, int]] = []
+        # Non-EPR roots and EPR roots, as (insertion order, task ID).
+        self._root_heap: List[Tuple[int, int]] = []
+        self._epr_root_heap: List[Tuple[int, int]] = []
+
+        # Deadlines are decreased lazily. `_deadline_epoch` is the total amount by
+        # which all deadlines have been decreased. The `deadline` of a TaskInfo is
+        # only up to date for the epoch stored in `_deadline_epochs` (default 0) and
+        # is brought up to date when the TaskInfo is accessed.
+        self._deadline_epoch: float = 0
+        self._deadline_epochs: Dict[int, float] = {}  # task ID -> epoch
+        self._all_synced_epoch: float = 0
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, TaskGraph):
             raise NotImplementedError
+        self._sync_all_deadlines()
+        other._sync_all_deadlines()
         return self._tasks == other._tasks
 
     def __str__(self) -> str:
+        self._sync_all_deadlines()
         return "\n".join(f"{i}: {t}" for i, t in self._tasks.items())
 
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, tid: object) -> bool:
+        return tid in self._tasks
+
+    def _sync_deadline(self, tid: int) -> None:
+        epoch = self._deadline_epochs.get(tid, 0)
+        if epoch != self._deadline_epoch:
+            tinfo = self._tasks[tid]
+            if tinfo.deadline is not None:
+                tinfo.deadline -= self._deadline_epoch - epoch  # type: ignore
+            self._deadline_epochs[tid] = self._deadline_epoch
+
+    def _sync_all_deadlines(self) -> None:
+        if self._all_synced_epoch != self._deadline_epoch:
+            for tid in self._tasks:
+                self._sync_deadline(tid)
+            self._all_synced_epoch = self._deadline_epoch
+
+    def invalidate_index(self) -> None:
+        self._index_valid = False
+
+    def _build_index(self) -> None:
+        self._order = {}
+        self._next_order = 0
+        self._roots = set()
+        self._blocked_on_ext = set()
+        self._epr_roots = set()
+        self._event_roots = set()
+        self._pid_task_count = {}
+        self._rel_deadline_dependents = {}
+        self._ext_dependents = {}
+        self._ext_rel_deadline_dependents = {}
+        self._deadline_keys = {}
+        self._deadline_heap = []
+        self._start_time_heap = []
+        self._root_heap = []
+        self._epr_root_heap = []
+        if self._new_roots is not None:
+            self._new_roots = []
+        self._index_valid = True
+        for tid in self._tasks:
+            self._index_add(tid)
+
+    def _ensure_index(self) -> None:
+        if not self._index_valid:
+            self._build_index()
+
+    def _index_add(self, tid: int) -> None:
+        # Register a task that has just been inserted in `_tasks`.
+        if tid not in self._order:
+            self._order[tid] = self._next_order
+            self._next_order += 1
+        tinfo = self._tasks[tid]
+        pid = tinfo.task.pid
+        self._pid_task_count[pid] = self._pid_task_count.get(pid, 0) + 1
+        for pred in tinfo.rel_deadlines:
+            self._rel_deadline_dependents.setdefault(pred, set()).add(tid)
+        for ext in tinfo.ext_predecessors:
+            self._ext_dependents.setdefault(ext, set()).add(tid)
+        for ext in tinfo.ext_rel_deadlines:
+            self._ext_rel_deadline_dependents.setdefault(ext, set()).add(tid)
+        self._index_update(tid)
+
+    def _index_remove(self, tid: int, tinfo: TaskInfo) -> None:
+        # Unregister a task that has just been removed from `_tasks`.
+        self._order.pop(tid, None)
+        self._roots.discard(tid)
+        self._blocked_on_ext.discard(tid)
+        self._epr_roots.discard(tid)
+        self._event_roots.discard(tid)
+        self._deadline_keys.pop(tid, None)
+        for pred in tinfo.rel_deadlines:
+            if pred in self._rel_deadline_dependents:
+                self._rel_deadline_dependents[pred].discard(tid)
+        for ext in tinfo.ext_predecessors:
+            self._discard_ext_dependent(ext, tid)
+        for ext in tinfo.ext_rel_deadlines:
+            if ext in self._ext_rel_deadline_dependents:
+                self._ext_rel_deadline_dependents[ext].discard(tid)
+        pid = tinfo.task.pid
+        self._pid_task_count[pid] -= 1
+        if self._pid_task_count[pid] == 0:
+            del self._pid_task_count[pid]
+
+    def _index_update(self, tid: int) -> None:
+        # Re-classify a task after its (external) predecessors changed.
+        tinfo = self._tasks[tid]
+        if len(tinfo.predecessors) > 0:
+            self._roots.discard(tid)
+            self._blocked_on_ext.discard(tid)
+            self._epr_roots.discard(tid)
+            self._event_roots.discard(tid)
+        elif len(tinfo.ext_predecessors) > 0:
+            self._roots.discard(tid)
+            self._blocked_on_ext.add(tid)
+            self._epr_roots.discard(tid)
+            self._event_roots.discard(tid)
+        elif tid not in self._roots:
+            self._roots.add(tid)
+            self._blocked_on_ext.discard(tid)
+            if tinfo.task.is_epr_task():
+                self._epr_roots.add(tid)
+                heapq.heappush(self._epr_root_heap, (self._order[tid], tid))
+            else:
+                if tinfo.task.is_event_task():
+                    self._event_roots.add(tid)
+                heapq.heappush(self._root_heap, (self._order[tid], tid))
+            self._push_deadline(tid)
+            if self._new_roots is not None:
+                self._new_roots.append(tid)
+            if tinfo.start_time is not None:
+                entry = (tinfo.start_time, self._order[tid], tid)
+                heapq.heappush(self._start_time_heap, entry)
+
+    def _push_deadline(self, tid: int) -> None:
+        self._sync_deadline(tid)
+        deadline = self._tasks[tid].deadline
+        if deadline is None:
+            self._deadline_keys.pop(tid, None)
+            return
+        key = deadline + self._deadline_epoch
+        self._deadline_keys[tid] = key
+        heapq.heappush(self._deadline_heap, (key, self._order[tid], tid))
+
+    def _discard_ext_dependent(self, ext: int, tid: int) -> None:
+        dependents = self._ext_dependents.get(ext)
+        if dependents is not None:
+            dependents.discard(tid)
+            if len(dependents) == 0:
+                del self._ext_dependents[ext]
+
+    def _in_order(self, ids: Set[int]) -> List[int]:
+        return sorted(ids, key=self._order.__getitem__)
+
     def add_tasks(self, tasks: List[QoalaTask]) -> None:
         for task in tasks:
-            self._tasks[task.task_id] = TaskInfo.only_task(task)
+            self.add_tinfos({task.task_id: TaskInfo.only_task(task)})
+
+    def add_tinfos(self, tinfos: Dict[int, TaskInfo]) -> None:
+        for tid, tinfo in tinfos.items():
+            if self._index_valid and tid in self._tasks:
+                # Replacing an existing task keeps its position (like `_tasks`).
+                order = self._order[tid]
+                self._index_remove(tid, self._tasks[tid])
+                self._order[tid] = order
+            self._tasks[tid] = tinfo
+            # The deadline of the new TaskInfo is relative to the current time.
+            self._deadline_epochs[tid] = self._deadline_epoch
+            if self._index_valid:
+                self._index_add(tid)
 
     def add_precedences(self, precedences: List[Tuple[int, int]]) -> None:
         # an entry (x, y) means that x precedes y (y should execute after x)
@@ -423,6 +757,8 @@ class TaskGraph:
             assert x in self._tasks and y in self._tasks
             self._tasks[y].predecessors.add(x)
             self._tasks[x].successors.add(y)
+            if self._index_valid:
+                self._index_update(y)
 
     def update_successors(self) -> None:
         # Make sure all `successors` of all tinfos match all predecessors
@@ -438,11 +774,47 @@ class TaskGraph:
         for (x, y) in precedences:
             assert x not in self._tasks and y in self._tasks
             self._tasks[y].ext_predecessors.add(x)
+            if self._index_valid:
+                self._ext_dependents.setdefault(x, set()).add(y)
+                self._index_update(y)
+
+    def remove_ext_predecessors(self, task_id: int, ext_ids: Set[int]) -> None:
+        # Remove external predecessors, e.g. because they finished on the
+        # other processor.
+        tinfo = self.get_tinfo(task_id)
+        if self._index_valid:
+            for ext in ext_ids & tinfo.ext_predecessors:
+                self._discard_ext_dependent(ext, task_id)
+        tinfo.ext_predecessors.difference_update(ext_ids)
+        if self._index_valid:
+            self._index_update(task_id)
+
+    def get_ext_dependents(self, ext_id: int) -> List[int]:
+        # Return all (IDs of) tasks that have `ext_id` as external predecessor.
+        self._ensure_index()
+        return self._in_order(self._ext_dependents.get(ext_id, set()))
+
+    def resolve_ext_predecessor(self, ext_id: int) -> List[int]:
+        # Remove external task `ext_id` (e.g. because it finished on the other
+        # processor) from the external predecessors of all tasks in this graph.
+        # Only the tasks depending on it are touched.
+        # Returns the IDs of the tasks that became roots because of this.
+        self._ensure_index()
+        new_roots: List[int] = []
+        for tid in self._in_order(self._ext_dependents.pop(ext_id, set())):
+            self._tasks[tid].ext_predecessors.discard(ext_id)
+            self._index_update(tid)
+            if tid in self._roots:
+                new_roots.append(tid)
+        return new_roots
 
     def add_deadlines(self, deadlines: List[Tuple[int, int]]) -> None:
         for (x, d) in deadlines:
             assert x in self._tasks
             self._tasks[x].deadline = d
+            self._deadline_epochs[x] = self._deadline_epoch
+            if self._index_valid and x in self._roots:
+                self._push_deadline(x)
 
     def add_rel_deadlines(self, deadlines: List[Tuple[Tuple[int, int], int]]) -> None:
         # entry ((x, y), d) means
@@ -450,6 +822,8 @@ class TaskGraph:
         for ((x, y), d) in deadlines:
             assert x in self._tasks and y in self._tasks
             self._tasks[y].rel_deadlines[x] = d
+            if self._index_valid:
+                self._rel_deadline_dependents.setdefault(x, set()).add(y)
 
     def add_ext_rel_deadlines(
         self, deadlines: List[Tuple[Tuple[int, int], int]]
@@ -459,52 +833,92 @@ class TaskGraph:
         for ((x, y), d) in deadlines:
             assert x not in self._tasks and y in self._tasks  # x is external
             self._tasks[y].ext_rel_deadlines[x] = d
+            if self._index_valid:
+                self._ext_rel_deadline_dependents.setdefault(x, set()).add(y)
+
+    def get_ext_rel_deadline_dependents(self, ext_id: int) -> List[int]:
+        # Return all (IDs of) tasks that have a relative deadline w.r.t. external
+        # task `ext_id`.
+        self._ensure_index()
+        return self._in_order(self._ext_rel_deadline_dependents.get(ext_id, set()))
+
+    def resolve_ext_rel_deadline(self, ext_id: int, elapsed: float = 0) -> None:
+        # External task `ext_id` finished (on the other processor) `elapsed` time
+        # units ago. Relative deadlines w.r.t. it become absolute deadlines, like
+        # in `remove_task`. A task keeps an earlier deadline it already has.
+        self._ensure_index()
+        for tid in self._ext_rel_deadline_dependents.pop(ext_id, set()):
+            tinfo = self.get_tinfo(tid)
+            if ext_id not in tinfo.ext_rel_deadlines:
+                continue
+            deadline = tinfo.ext_rel_deadlines.pop(ext_id) - elapsed
+            if tinfo.deadline is None or deadline < tinfo.deadline:
+                tinfo.deadline = deadline  # type: ignore
+                if tid in self._roots:
+                    self._push_deadline(tid)
 
     def get_tasks(self) -> Dict[int, TaskInfo]:
+        self._sync_all_deadlines()
         return self._tasks
 
     def get_tinfo(self, id: int) -> TaskInfo:
         assert id in self._tasks
+        self._sync_deadline(id)
         return self._tasks[id]
 
     def task_exists_for_pid(self, pid: int) -> bool:
-        for tid, tinfo in self._tasks.items():
-            if tinfo.task.pid == pid:
-                return True
-        return False
+        self._ensure_index()
+        return pid in self._pid_task_count
 
     def get_roots(self, ignore_external: bool = False) -> List[int]:
         # Return all (IDs of) tasks that have no predecessors
-
+        self._ensure_index()
         if ignore_external:
-            return [
-                i for i, tinfo in self._tasks.items() if len(tinfo.predecessors) == 0
-            ]
+            return self._in_order(self._roots | self._blocked_on_ext)
         else:
-            return [
-                i
-                for i, tinfo in self._tasks.items()
-                if len(tinfo.predecessors) == 0 and len(tinfo.ext_predecessors) == 0
-            ]
+            return self._in_order(self._roots)
+
+    def take_new_roots(self) -> List[int]:
+        # Return all (IDs of) tasks that became roots since the previous call,
+        # and that are still roots. The first call returns all roots.
+        # This allows users to only inspect roots they have not seen before.
+        self._ensure_index()
+        if self._new_roots is None:
+            self._new_roots = []
+            return self._in_order(self._roots)
+        new_roots = set(self._new_roots) & self._roots
+        self._new_roots = []
+        return self._in_order(new_roots)
 
     def get_tasks_blocked_only_on_external(self) -> List[int]:
-        return [
-            i
-            for i, tinfo in self._tasks.items()
-            if len(tinfo.predecessors) == 0 and len(tinfo.ext_predecessors) > 0
-        ]
+        self._ensure_index()
+        return self._in_order(self._blocked_on_ext)
+
+    def has_tasks_blocked_only_on_external(self) -> bool:
+        self._ensure_index()
+        return len(self._blocked_on_ext) > 0
+
+    def is_epr_root(self, task_id: int) -> bool:
+        self._ensure_index()
+        return task_id in self._epr_roots
 
     def get_epr_roots(self, ignore_external: bool = False) -> List[int]:
-        roots = self.get_roots(ignore_external)
-        return [r for r in roots if self.get_tinfo(r).task.is_epr_task()]
+        self._ensure_index()
+        if ignore_external:
+            roots = self.get_roots(ignore_external)
+            return [r for r in roots if self.get_tinfo(r).task.is_epr_task()]
+        return self._in_order(self._epr_roots)
 
     def get_event_roots(self, ignore_external: bool = False) -> List[int]:
-        roots = self.get_roots(ignore_external)
-        return [r for r in roots if self.get_tinfo(r).task.is_event_task()]
+        self._ensure_index()
+        if ignore_external:
+            roots = self.get_roots(ignore_external)
+            return [r for r in roots if self.get_tinfo(r).task.is_event_task()]
+        return self._in_order(self._event_roots)
 
     def linearize(self) -> List[int]:
         # Returns None if not linear
-        if len(self.get_tasks()) == 0:
+        if len(self._tasks) == 0:
             return []  # empty graph is linear
 
         roots = self.get_roots()
@@ -522,24 +936,134 @@ class TaskGraph:
         return chain
 
     def remove_task(self, id: int) -> None:
-        assert id in self.get_roots(ignore_external=True)
+        self._ensure_index()
+        assert id in self._roots or id in self._blocked_on_ext
         tinfo = self._tasks.pop(id)
+        self._index_remove(id, tinfo)
+        self._deadline_epochs.pop(id, None)
 
         # Remove precedences of successor tasks
         for succ in tinfo.successors:
             succ_info = self.get_tinfo(succ)
             assert id in succ_info.predecessors
             succ_info.predecessors.remove(id)
+            self._index_update(succ)
 
         # Change relative deadlines to absolute ones
-        for t in self._tasks.values():
+        for tid in self._rel_deadline_dependents.pop(id, set()):
+            if tid not in self._tasks:
+                continue
+            t = self._tasks[tid]
             if id in t.rel_deadlines:
                 t.deadline = t.rel_deadlines.pop(id)
+                self._deadline_epochs[tid] = self._deadline_epoch
+                if tid in self._roots:
+                    self._push_deadline(tid)
 
     def decrease_deadlines(self, amount: int) -> None:
-        for tinfo in self._tasks.values():
-            if tinfo.deadline is not None:
-                tinfo.deadline -= amount
+        # Deadlines of individual tasks are updated lazily (see `_sync_deadline`).
+        self._deadline_epoch += amount
+
+    def _first_in_heap(
+        self,
+        heap: List[Any],
+        is_valid: Callable[[Any], bool],
+        skip: Optional[Container[int]],
+    ) -> Optional[int]:
+        # Return the task ID (last item) of the smallest valid entry of the heap
+        # whose task is not in `skip`. Invalid entries are dropped; skipped entries
+        # are put back, so the cost is logarithmic in the size of the heap per
+        # inspected entry.
+        skipped: List[Any] = []
+        result: Optional[int] = None
+        while len(heap) > 0:
+            entry = heap[0]
+            if not is_valid(entry):
+                heapq.heappop(heap)  # outdated entry
+            elif skip is not None and entry[-1] in skip:
+                skipped.append(heapq.heappop(heap))
+            else:
+                result = entry[-1]
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return result
+
+    def get_earliest_deadline_root(
+        self, skip: Optional[Container[int]] = None
+    ) -> Optional[int]:
+        # Return the root (without internal or external predecessors) with the
+        # earliest deadline, ignoring roots in `skip` and roots without deadline.
+        # Returns None if there is no such root.
+        self._ensure_index()
+        return self._first_in_heap(
+            self._deadline_heap,
+            lambda e: e[2] in self._roots and self._deadline_keys.get(e[2]) == e[0],
+            skip,
+        )
+
+    def get_first_root(
+        self, skip: Optional[Container[int]] = None, epr: bool = False
+    ) -> Optional[int]:
+        # Return the first non-EPR root (or EPR root if `epr` is True) in task
+        # order, i.e. the first one that `get_roots()` would return, ignoring roots
+        # in `skip`. Returns None if there is no such root.
+        self._ensure_index()
+        if epr:
+            heap = self._epr_root_heap
+        else:
+            heap = self._root_heap
+        return self._first_in_heap(
+            heap,
+            lambda e: e[1] in self._roots
+            and (e[1] in self._epr_roots) == epr
+            and self._order.get(e[1]) == e[0],
+            skip,
+        )
+
+    def _clean_start_time_heap(self, now: float) -> None:
+        # Drop entries of tasks that are no longer roots or whose start time has
+        # passed. `now` must not decrease between calls.
+        heap = self._start_time_heap
+        while len(heap) > 0:
+            start, _, tid = heap[0]
+            if self._is_valid_start_entry(tid, start) and start > now:
+                break
+            heapq.heappop(heap)
+
+    def _is_valid_start_entry(self, tid: int, start: float) -> bool:
+        return tid in self._roots and self._tasks[tid].start_time == start
+
+    def get_roots_with_future_start(self, now: float) -> Set[int]:
+        # Return all roots that have a start time later than `now`.
+        self._ensure_index()
+        self._clean_start_time_heap(now)
+        return {
+            tid
+            for start, _, tid in self._start_time_heap
+            if self._is_valid_start_entry(tid, start) and start > now
+        }
+
+    def starts_after(self, task_id: int, now: float) -> bool:
+        # Whether the task has a start time later than `now`.
+        start = self._tasks[task_id].start_time
+        return start is not None and start > now
+
+    def get_next_start_time(self, now: float) -> Optional[Tuple[int, float]]:
+        # Return (task ID, start time) of the root with the earliest start time
+        # later than `now`, or None if there is no such root.
+        self._ensure_index()
+        self._clean_start_time_heap(now)
+        if len(self._start_time_heap) == 0:
+            return None
+        start, _, tid = self._start_time_heap[0]
+        return tid, start
+
+    def order_of(self, task_id: int) -> int:
+        # Position of the task in insertion order. Used to break ties in the same
+        # way as `get_roots()`.
+        self._ensure_index()
+        return self._order[task_id]
 
     def get_cpu_graph(self) -> TaskGraph:
         return self.partial_graph(ProcessorType.CPU)
@@ -554,40 +1078,151 @@ class TaskGraph:
         # no immediate parents.
         # If immediate = True, return only immediate parents with a different processor
         # type.
-        # TODO: remove items from result set when they are ancestors of other items
-        # in the set (in which case they are redundant)
-        proc_type = self.get_tinfo(task_id).task.processor_type
-        cross_preds = set()
-
-        for pred in self.get_tinfo(task_id).predecessors:
-            pred_type = self.get_tinfo(pred).task.processor_type
-            if pred_type != proc_type:
-                cross_preds.add(pred)  # immediate parent of different type
-            elif not immediate:
-                cross_preds = cross_preds.union(
-                    self.cross_predecessors(pred, immediate)
-                )
-        return cross_preds
+        if immediate:
+            proc_type = self.get_tinfo(task_id).task.processor_type
+            return {
+                pred
+                for pred in self.get_tinfo(task_id).predecessors
+                if self._tasks[pred].task.processor_type != proc_type
+            }
+        return set(self._closest_cross_predecessors([task_id])[task_id])
+
+    def _topological_order(self, task_ids: Optional[List[int]] = None) -> List[int]:
+        # Topological order of the given tasks and all their ancestors (of all tasks
+        # if None).
+        if task_ids is None:
+            task_ids = list(self._tasks.keys())
+        order: List[int] = []
+        visited: Set[int] = set()
+        for tid in task_ids:
+            if tid in visited:
+                continue
+            # Iterative depth-first search, appending tasks after their predecessors.
+            visited.add(tid)
+            stack = [(tid, iter(self._tasks[tid].predecessors))]
+            while len(stack) > 0:
+                current, preds = stack[-1]
+                for pred in preds:
+                    if pred in self._tasks and pred not in visited:
+                        visited.add(pred)
+                        stack.append((pred, iter(self._tasks[pred].predecessors)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(current)
+        return order
+
+    def _cross_boundary_bits(self, topological: List[int]) -> Dict[int, int]:
+        # Tasks among the given ones (in topological order) that have a successor of
+        # the other processor type, which are the only tasks that can be closest
+        # cross predecessors. Each gets its own bit, in topological order.
+        boundary: Set[int] = set()
+        for tid in topological:
+            proc_type = self._tasks[tid].task.processor_type
+            for pred in self._tasks[tid].predecessors:
+                if pred in self._tasks:
+                    if self._tasks[pred].task.processor_type != proc_type:
+                        boundary.add(pred)
+        boundary_order = [tid for tid in topological if tid in boundary]
+        return {tid: 1 << i for i, tid in enumerate(boundary_order)}
+
+    def _closest_cross_predecessors(
+        self,
+        task_ids: Optional[List[int]] = None,
+        bits: Optional[Dict[int, int]] = None,
+        ancestors: Optional[Dict[int, int]] = None,
+    ) -> Dict[int, FrozenSet[int]]:
+        # Closest other-processor ancestors (`cross_predecessors` with
+        # immediate = False) of the given tasks and all their ancestors. Computed in
+        # topological order, so that the result for each task is computed only once
+        # and is shared with its descendants.
+        # If `bits` (see `_cross_boundary_bits`) and `ancestors` are given, the same
+        # sweep fills `ancestors` with, per task, the bitwise OR of the bits of its
+        # ancestors. Each OR takes time proportional to the number of bits, so this
+        # is not linear in the size of the graph, but no task is searched for more
+        # than once.
+        result: Dict[int, FrozenSet[int]] = {}
+        for tid in self._topological_order(task_ids):
+            tinfo = self._tasks[tid]
+            proc_type = tinfo.task.processor_type
+            cross: Set[int] = set()
+            reachable = 0
+            for pred in tinfo.predecessors:
+                if pred not in self._tasks:
+                    continue
+                if self._tasks[pred].task.processor_type != proc_type:
+                    cross.add(pred)
+                else:
+                    cross |= result[pred]
+                if bits is not None and ancestors is not None:
+                    reachable |= ancestors[pred] | bits.get(pred, 0)
+            result[tid] = frozenset(cross)
+            if ancestors is not None:
+                ancestors[tid] = reachable
+        return result
+
+    def _double_cross_predecessors(
+        self, task_ids: Optional[List[int]] = None
+    ) -> Dict[int, Set[int]]:
+        # `double_cross_predecessors` for the given tasks (all tasks if None),
+        # without those that are implied by other same-processor predecessors.
+        if task_ids is None:
+            task_ids = list(self._tasks.keys())
+        topological = self._topological_order(task_ids)
+        bits = self._cross_boundary_bits(topological)
+        ancestors: Dict[int, int] = {}
+        closest = self._closest_cross_predecessors(topological, bits, ancestors)
+        result: Dict[int, Set[int]] = {}
+        for tid in task_ids:
+            tinfo = self._tasks[tid]
+            proc_type = tinfo.task.processor_type
+            same_type: Set[int] = set()
+            double_cross: Set[int] = set()
+            for pred in tinfo.predecessors:
+                if pred not in self._tasks:
+                    continue
+                if self._tasks[pred].task.processor_type == proc_type:
+                    same_type.add(pred)
+                else:
+                    # For each different-type parent, the nearest ancestors of the
+                    # original type.
+                    double_cross |= closest[pred]
+            # Parents with same type already induce a normal precedence constraint
+            # in the partial graph.
+            double_cross -= same_type
+            if len(double_cross) + len(same_type) < 2:
+                result[tid] = double_cross
+                continue
+            # Drop the candidates that are an ancestor of another candidate or of
+            # a same-type parent: a precedence constraint with such a candidate is
+            # implied by the constraint with the other task (transitive reduction).
+            implied = 0
+            for other in double_cross | same_type:
+                implied |= ancestors[other]
+            result[tid] = {c for c in double_cross if not implied & bits[c]}
+        return result
 
     def double_cross_predecessors(self, task_id: int) -> Set[int]:
         # Return all (IDs of) tasks that are the closest predecessors that run on
         # the same processor (CPU/QPU) but where there are tasks of the other processor
         # type inbetween (in the precedence chain).
-
-        # For the first step: only check immediate parents that have different type.
-        # Parents with same type already induce a normal precedence constraint in the
-        # partial graph.
-        cross_preds = self.cross_predecessors(task_id, immediate=True)
-        double_cross_preds: Set[int] = set()
-        for cp in cross_preds:
-            # For each different-type parent, find the nearest ancestor of the original
-            # type.
-            double_cross_preds = double_cross_preds.union(
-                self.cross_predecessors(cp, immediate=False)
-            )
-        return double_cross_preds
+        # Predecessors that are implied by other predecessors of the same type are
+        # not included.
+        return self._double_cross_predecessors([task_id])[task_id]
+
+    def relabeled(self, id_offset: int, pid: int) -> TaskGraph:
+        """Copy of this graph with all task IDs shifted by `id_offset`, and with
+        all tasks belonging to the given pid."""
+        self._sync_all_deadlines()
+        return TaskGraph(
+            {
+                tid + id_offset: tinfo.relabeled(id_offset, pid)
+                for tid, tinfo in self._tasks.items()
+            }
+        )
 
     def partial_graph(self, proc_type: ProcessorType) -> TaskGraph:
+        self._sync_all_deadlines()
         # Filter tasks with the correct type.
         partial_tasks: Dict[int, TaskInfo] = {
             i: deepcopy(tinfo)
@@ -613,24 +1248,26 @@ class TaskGraph:
 
         # Precedence constraints for same-processor tasks that used to have a
         # precedence chain of other-processor tasks in between them.
+        double_cross = self._double_cross_predecessors(list(partial_tasks.keys()))
         for tid, tinfo in partial_tasks.items():
-            for pred in self.double_cross_predecessors(tid):
-                if pred not in tinfo.predecessors:
-                    tinfo.predecessors.add(pred)
+            tinfo.predecessors |= double_cross[tid]
 
             # Relative deadlines.
+            # Move rel_deadlines to preds that are not in the graph to
+            # ext_rel_deadlines (before filtering rel_deadlines).
+            tinfo.ext_rel_deadlines.update(
+                {
+                    pred: dl
+                    for pred, dl in tinfo.rel_deadlines.items()
+                    if pred not in partial_tasks
+                }
+            )
             # Keep rel_deadline to pred if pred is still in the graph.
             tinfo.rel_deadlines = {
                 pred: dl
                 for pred, dl in tinfo.rel_deadlines.items()
                 if pred in partial_tasks
             }
-            # Move others to ext_predecessors.
-            tinfo.ext_rel_deadlines = {
-                pred: dl
-                for pred, dl in tinfo.rel_deadlines.items()
-                if pred not in partial_tasks
-            }
 
         partial_graph = TaskGraph(partial_tasks)
         # Fill in successors by taking opposite of predecessors.
@@ -638,6 +1275,115 @@ class TaskGraph:
         return partial_graph
 
 
+class CompactTaskGraph:
+    """Compact, read-only representation of a task graph, for graphs that are kept
+    for a long time (such as the block templates of `TaskGraphFromBlockBuilder`).
+
+    Task IDs are remapped to dense indices (in the order of the original graph).
+    Instead of a TaskInfo with its own sets and dicts per task, the predecessors,
+    external predecessors and (external) relative deadlines of all tasks are
+    stored in flat `array` buffers in CSR form: the entries of the task with
+    index i are at positions `offsets[i]` up to `offsets[i + 1]`. Successors are
+    not stored, since they follow from the predecessors.
+
+    A TaskGraph (with TaskInfo objects) is only created when the graph is needed,
+    with `to_graph` or `relabeled`. This is not a storage backend of TaskGraph:
+    the graphs that schedulers work on are always expanded, so only the graphs that
+    are kept in this form take less memory.
+    """
+
+    def __init__(self, graph: TaskGraph) -> None:
+        tasks = graph.get_tasks()
+        self._ids: array[int] = array("q", tasks.keys())  # index -> task ID
+        self._tasks: List[QoalaTask] = [tinfo.task for tinfo in tasks.values()]
+        index = {tid: i for i, tid in enumerate(tasks)}
+
+        # Predecessors are stored as indices, the others as task IDs, since they
+        # may refer to tasks that are not in the graph.
+        self._preds = self._csr(
+            [[index[p] for p in t.predecessors] for t in tasks.values()]
+        )
+        self._ext_preds = self._csr([list(t.ext_predecessors) for t in tasks.values()])
+        self._rel_deadlines = self._csr_dict([t.rel_deadlines for t in tasks.values()])
+        self._ext_rel_deadlines = self._csr_dict(
+            [t.ext_rel_deadlines for t in tasks.values()]
+        )
+
+        # Few tasks have an absolute deadline or start time.
+        self._deadlines: Dict[int, int] = {
+            i: t.deadline
+            for i, t in enumerate(tasks.values())
+            if t.deadline is not None
+        }
+        self._start_times: Dict[int, float] = {
+            i: t.start_time
+            for i, t in enumerate(tasks.values())
+            if t.start_time is not None
+        }
+
+    @staticmethod
+    def _csr(rows: List[List[int]]) -> Tuple[array[int], array[int]]:
+        offsets = array("q", [0])
+        values = array("q")
+        for row in rows:
+            values.extend(sorted(row))
+            offsets.append(len(values))
+        return offsets, values
+
+    @staticmethod
+    def _csr_dict(
+        rows: List[Dict[int, int]]
+    ) -> Tuple[array[int], array[int], array[int]]:
+        offsets, keys = CompactTaskGraph._csr([list(row.keys()) for row in rows])
+        values = array("q", [row[k] for row in rows for k in sorted(row)])
+        return offsets, keys, values
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def task_ids(self) -> List[int]:
+        return self._ids.tolist()
+
+    def _row(self, csr: Tuple[array[int], ...], i: int) -> Tuple[array[int], ...]:
+        start, end = csr[0][i], csr[0][i + 1]
+        return tuple(values[start:end] for values in csr[1:])
+
+    def _graph(self, id_offset: int, pid: Optional[int]) -> TaskGraph:
+        ids = self._ids
+        tinfos: Dict[int, TaskInfo] = {}
+        for i, task in enumerate(self._tasks):
+            if pid is not None:
+                task = task.relabeled(id_offset, pid)
+            (preds,) = self._row(self._preds, i)
+            (ext_preds,) = self._row(self._ext_preds, i)
+            rel_keys, rel_values = self._row(self._rel_deadlines, i)
+            ext_rel_keys, ext_rel_values = self._row(self._ext_rel_deadlines, i)
+            tinfos[ids[i] + id_offset] = TaskInfo(
+                task=task,
+                predecessors={ids[p] + id_offset for p in preds},
+                ext_predecessors={p + id_offset for p in ext_preds},
+                successors=set(),
+                deadline=self._deadlines.get(i),
+                rel_deadlines={p + id_offset: d for p, d in zip(rel_keys, rel_values)},
+                ext_rel_deadlines={
+                    p + id_offset: d for p, d in zip(ext_rel_keys, ext_rel_values)
+                },
+                start_time=self._start_times.get(i),
+            )
+        for tid, tinfo in tinfos.items():
+            for pred in tinfo.predecessors:
+                tinfos[pred].successors.add(tid)
+        return TaskGraph(tinfos)
+
+    def to_graph(self) -> TaskGraph:
+        """TaskGraph with the same tasks (the task objects are shared)."""
+        return self._graph(0, None)
+
+    def relabeled(self, id_offset: int, pid: int) -> TaskGraph:
+        """Same as `TaskGraph.relabeled`."""
+        return self._graph(id_offset, pid)
+
+
 class TaskGraphBuilder:
     @classmethod
     def linear_tasks(cls, tasks: List[QoalaTask]) -> TaskGraph:
@@ -710,68 +1456,375 @@ class TaskGraphBuilder:
         network_ehi: Optional[EhiNetworkInfo] = None,
         first_task_id: int = 0,
         prog_input: Optional[Dict[str, int]] = None,
+        pair_ranges: bool = False,
     ) -> TaskGraph:
-        return QoalaGraphFromProgramBuilder(first_task_id).build(
+        return QoalaGraphFromProgramBuilder(first_task_id, pair_ranges).build(
             program, pid, ehi, network_ehi, prog_input
         )
 
 
+@dataclass
+class _EhiDurations:
+    """Durations memoized for a single EHI (see `TaskDurationEstimator`)."""
+
+    # Worst-case duration of each quantum instruction type.
+    gate_durations: Dict[Type[NetQASMInstruction], float]
+    # Routine durations, stored as the number of classical instructions and the
+    # total duration of the quantum instructions, so that the classical instruction
+    # latency may still change. References to the routines are kept so that their
+    # IDs are not reused.
+    # id(routine) -> (routine, num classical instrs, gate duration)
+    routine_durations: Dict[int, Tuple[LocalRoutine, int, float]]
+
+
+# id(ehi) -> memoized durations. Entries are removed when their EHI is garbage
+# collected.
+_ehi_durations: Dict[int, _EhiDurations] = {}
+
+
+def _drop_ehi_durations(ehi_id: int) -> None:
+    _ehi_durations.pop(ehi_id, None)
+
+
 class TaskDurationEstimator:
+    """Estimates the durations of local routines, based on the durations of the
+    gates in an EHI.
+
+    Worst-case gate durations and routine durations are memoized per EHI, for as
+    long as the EHI exists.
+    """
+
+    @classmethod
+    def is_classical(cls, instr: NetQASMInstruction) -> bool:
+        return (
+            type(instr)
+            in [
+                core.SetInstruction,
+                core.StoreInstruction,
+                core.LoadInstruction,
+                core.LeaInstruction,
+            ]
+            or isinstance(instr, core.BranchBinaryInstruction)
+            or isinstance(instr, core.BranchUnaryInstruction)
+            or isinstance(instr, core.JmpInstruction)
+            or isinstance(instr, core.ClassicalOpInstruction)
+            or isinstance(instr, core.ClassicalOpModInstruction)
+        )
+
+    @classmethod
+    def _durations_for(cls, ehi: EhiNodeInfo) -> _EhiDurations:
+        durations = _ehi_durations.get(id(ehi))
+        if durations is None:
+            durations = _EhiDurations(cls._compute_gate_durations(ehi), {})
+            _ehi_durations[id(ehi)] = durations
+            weakref.finalize(ehi, _drop_ehi_durations, id(ehi))
+        return durations
+
+    @classmethod
+    def _compute_gate_durations(
+        cls, ehi: EhiNodeInfo
+    ) -> Dict[Type[NetQASMInstruction], float]:
+        durations: Dict[Type[NetQASMInstruction], float] = {}
+        gate_lists = itertools.chain(
+            ehi.single_gate_infos.values(), ehi.multi_gate_infos.values()
+        )
+        for gates in gate_lists:
+            # Only the first entry for each instruction counts
+            # (as in `EhiNodeInfo.find_single_gate` and `find_multi_gate`).
+            seen: Set[Type[NetQASMInstruction]] = set()
+            for info in gates:
+                if info.instruction in seen:
+                    continue
+                seen.add(info.instruction)
+                current = durations.get(info.instruction, -1.0)
+                durations[info.instruction] = max(current, info.duration)
+        return durations
+
+    @classmethod
+    def gate_durations(cls, ehi: EhiNodeInfo) -> Dict[Type[NetQASMInstruction], float]:
+        """Worst-case duration of each quantum instruction in the EHI, over all
+        (combinations of) qubits that support it."""
+        return cls._durations_for(ehi).gate_durations
+
+    @classmethod
+    def _gate_not_found(cls, instr: NetQASMInstruction) -> RuntimeError:
+        return RuntimeError(
+            f"Gate {type(instr)} not found in EHI. Cannot calculate duration of containing block."
+        )
+
     @classmethod
     def lr_duration(cls, ehi: EhiNodeInfo, routine: LocalRoutine) -> float:
-        duration = 0.0
-        # TODO: refactor this
+        """Estimate the duration of a local routine, using the worst-case duration
+        of each gate (see `gate_durations`).
+
+        :param ehi: EHI of the node that executes the routine
+        :param routine: the local routine
+        :return: estimated duration
+        """
+        routine_durations = cls._durations_for(ehi).routine_durations
+        cached = routine_durations.get(id(routine))
+        if cached is not None and cached[0] is routine:
+            _, num_classical, gate_duration = cached
+        else:
+            num_classical, gate_duration = cls._gate_duration_worst_case(ehi, routine)
+            routine_durations[id(routine)] = (routine, num_classical, gate_duration)
+        return num_classical * ehi.latencies.qnos_instr_time + gate_duration
+
+    @classmethod
+    def _gate_duration_worst_case(
+        cls, ehi: EhiNodeInfo, routine: LocalRoutine
+    ) -> Tuple[int, float]:
+        # Number of classical instructions and total gate duration of a routine.
+        gate_durations = cls.gate_durations(ehi)
+        num_classical = 0
+        gate_duration = 0.0
         for instr in routine.subroutine.instructions:
-            if (
-                type(instr)
-                in [
-                    core.SetInstruction,
-                    core.StoreInstruction,
-                    core.LoadInstruction,
-                    core.LeaInstruction,
-                ]
-                or isinstance(instr, core.BranchBinaryInstruction)
-                or isinstance(instr, core.BranchUnaryInstruction)
-                or isinstance(instr, core.JmpInstruction)
-                or isinstance(instr, core.ClassicalOpInstruction)
-                or isinstance(instr, core.ClassicalOpModInstruction)
-            ):
-                duration += ehi.latencies.qnos_instr_time
+            if cls.is_classical(instr):
+                num_classical += 1
             else:
-                max_duration = -1.0
-                # TODO: gate duration depends on which qubit!!
-                # currently we always take the worst case scenario but this is not ideal
-                for i in ehi.single_gate_infos.keys():
-                    if info := ehi.find_single_gate(i, type(instr)):
-                        max_duration = max(max_duration, info.duration)
-
-                for multi in ehi.multi_gate_infos.keys():
-                    if info := ehi.find_multi_gate(multi.qubit_ids, type(instr)):
-                        max_duration = max(max_duration, info.duration)
-
-                if max_duration != -1:
-                    duration += max_duration
+                # Gate duration may depend on which qubit it acts on.
+                # Here we always take the worst case scenario.
+                # (See `lr_duration_per_qubit` for a more accurate estimate.)
+                if type(instr) not in gate_durations:
+                    raise cls._gate_not_found(instr)
+                gate_duration += gate_durations[type(instr)]
+        return num_classical, gate_duration
+
+    @classmethod
+    def _qubit_registers(cls, instr: NetQASMInstruction) -> List[Register]:
+        if isinstance(instr, (core.MeasInstruction, core.MeasBasisInstruction)):
+            return [instr.reg0]
+        elif isinstance(
+            instr, (core.TwoQubitInstruction, core.ControlledRotationInstruction)
+        ):
+            return [instr.reg0, instr.reg1]
+        elif isinstance(
+            instr,
+            (
+                core.SingleQubitInstruction,
+                core.RotationInstruction,
+                core.QAllocInstruction,
+                core.QFreeInstruction,
+                core.InitInstruction,
+            ),
+        ):
+            return [instr.reg]
+        return []
+
+    @classmethod
+    def lr_duration_per_qubit(
+        cls,
+        ehi: EhiNodeInfo,
+        routine: LocalRoutine,
+        virt_to_phys: Optional[Dict[int, Optional[int]]] = None,
+    ) -> float:
+        """Estimate the duration of a local routine using the durations of gates on
+        the qubits they actually act on, rather than the worst case over all qubits.
+
+        Qubit IDs are found by following the values that are set to qubit registers
+        (in order of the instructions). If the qubits of an instruction cannot be
+        determined, its worst-case duration is used.
+
+        :param ehi: EHI of the qubits the routine acts on. If `virt_to_phys` is given,
+            this should be the EHI of the full node (with physical qubit IDs)
+        :param routine: the local routine
+        :param virt_to_phys: mapping from virtual qubit IDs (as used in the routine)
+            to physical qubit IDs. If None, qubit IDs are used as they are.
+        :return: estimated duration
+        """
+        num_classical, gate_duration = cls._gate_duration_per_qubit(
+            ehi, routine, virt_to_phys
+        )
+        return num_classical * ehi.latencies.qnos_instr_time + gate_duration
+
+    @classmethod
+    def _gate_duration_per_qubit(
+        cls,
+        ehi: EhiNodeInfo,
+        routine: LocalRoutine,
+        virt_to_phys: Optional[Dict[int, Optional[int]]] = None,
+    ) -> Tuple[int, float]:
+        gate_durations = cls.gate_durations(ehi)
+        qubit_regs: Dict[Tuple[RegisterName, int], int] = {}  # register -> qubit ID
+        num_classical = 0
+        gate_duration = 0.0
+        for instr in routine.subroutine.instructions:
+            if cls.is_classical(instr):
+                num_classical += 1
+                if isinstance(instr, core.SetInstruction):
+                    key = (instr.reg.name, instr.reg.index)
+                    value = instr.imm.value
+                    if instr.reg.name == RegisterName.Q and isinstance(value, int):
+                        qubit_regs[key] = value
+                    else:
+                        qubit_regs.pop(key, None)
+                continue
+
+            qubit_ids: Optional[List[int]] = []
+            for reg in cls._qubit_registers(instr):
+                qubit_id = qubit_regs.get((reg.name, reg.index))
+                if qubit_id is not None and virt_to_phys is not None:
+                    qubit_id = virt_to_phys.get(qubit_id)
+                if qubit_id is None or qubit_ids is None:
+                    qubit_ids = None
                 else:
-                    raise RuntimeError(
-                        f"Gate {type(instr)} not found in EHI. Cannot calculate duration of containing block."
-                    )
-        return duration
+                    qubit_ids.append(qubit_id)
+
+            info: Optional[EhiGateInfo] = None
+            if qubit_ids is not None and len(qubit_ids) == 1:
+                info = ehi.find_single_gate(qubit_ids[0], type(instr))
+            elif qubit_ids is not None and len(qubit_ids) > 1:
+                info = ehi.find_multi_gate(qubit_ids, type(instr))
+
+            if info is not None:
+                gate_duration += info.duration
+            elif type(instr) in gate_durations:
+                gate_duration += gate_durations[type(instr)]
+            else:
+                raise cls._gate_not_found(instr)
+        return num_classical, gate_duration
+
+
+def _pair_range_duration(
+    num_pairs: int,
+    pair_duration: Optional[float],
+    callback: Optional[str],
+    cb_duration: Optional[float],
+) -> Optional[float]:
+    # Duration of a PairRangeTask: that of all its pairs and their callbacks.
+    if pair_duration is None:
+        return None
+    if callback is not None and cb_duration is not None:
+        return (pair_duration + cb_duration) * num_pairs
+    return pair_duration * num_pairs
+
+
+@dataclass
+class _BlockTemplate:
+    """Task graph of a block, with task IDs starting at 0."""
+
+    # Objects the template was built for. References are kept so that their IDs
+    # (used in the cache key) are not reused.
+    program: QoalaProgram
+    ehi: Optional[EhiNodeInfo]
+    network_ehi: Optional[EhiNetworkInfo]
+
+    # Templates are kept for the whole simulation, so they are stored compactly.
+    graph: CompactTaskGraph
+    num_ids: int  # number of task IDs used by the graph
+    # CPU and QPU partial graphs, computed when first needed.
+    partial_graphs: Optional[Tuple[CompactTaskGraph, CompactTaskGraph]] = None
 
 
 class TaskGraphFromBlockBuilder:
-    def __init__(self):
+    def __init__(self, pair_ranges: bool = False):
         self._task_id_counter: int = 0
+        # Whether to create a single PairRangeTask for request routines with a
+        # SEQUENTIAL callback, instead of two tasks per pair.
+        self._pair_ranges = pair_ranges
+        # The task graph of a block only depends on the program, the block, the unit
+        # module, the network and possibly on some program inputs. Therefore graphs
+        # are built only once per such combination and then copied (with new task
+        # IDs and pid) for each program instance.
+        self._templates: Dict[Tuple[Any, ...], _BlockTemplate] = {}
 
     def unique_id(self) -> int:
         task_id = self._task_id_counter
         self._task_id_counter += 1
         return task_id
 
+    def _reserve_ids(self, num_ids: int) -> int:
+        first_id = self._task_id_counter
+        self._task_id_counter += num_ids
+        return first_id
+
+    def _template_key(
+        self,
+        program_instance: ProgramInstance,
+        block_index: int,
+        network_ehi: Optional[EhiNetworkInfo],
+    ) -> Tuple[Any, ...]:
+        program = program_instance.program
+        block = program.blocks[block_index]
+
+        # Program inputs that are used when building the graph.
+        input_values: Tuple[Any, ...] = ()
+        if block.typ == BasicBlockType.QC:
+            instr = block.instructions[0]
+            assert isinstance(instr, RunRequestOp)
+            num_pairs = program.request_routines[instr.req_routine].request.num_pairs
+            if isinstance(num_pairs, Template):
+                input_values = (program_instance.inputs.values[num_pairs.name],)
+
+        return (
+            id(program),
+            block_index,
+            id(program_instance.unit_module.info),
+            id(network_ehi),
+            input_values,
+        )
+
+    def _get_template(
+        self,
+        program_instance: ProgramInstance,
+        block_index: int,
+        network_ehi: Optional[EhiNetworkInfo],
+    ) -> _BlockTemplate:
+        key = self._template_key(program_instance, block_index, network_ehi)
+        template = self._templates.get(key)
+        if template is None:
+            ids = itertools.count()
+            graph = self._build_graph(
+                program_instance, block_index, network_ehi, lambda: next(ids)
+            )
+            template = _BlockTemplate(
+                program=program_instance.program,
+                ehi=program_instance.unit_module.info,
+                network_ehi=network_ehi,
+                graph=CompactTaskGraph(graph),
+                num_ids=next(ids),
+            )
+            self._templates[key] = template
+        return template
+
     def build(
         self,
         program_instance: ProgramInstance,
         block_index: int,
         network_ehi: Optional[EhiNetworkInfo] = None,
+    ) -> TaskGraph:
+        template = self._get_template(program_instance, block_index, network_ehi)
+        first_id = self._reserve_ids(template.num_ids)
+        return template.graph.relabeled(first_id, program_instance.pid)
+
+    def build_partial_graphs(
+        self,
+        program_instance: ProgramInstance,
+        block_index: int,
+        network_ehi: Optional[EhiNetworkInfo] = None,
+    ) -> Tuple[TaskGraph, TaskGraph]:
+        """Same as `build` followed by `partial_graph` for the CPU and the QPU.
+
+        :return: the CPU and the QPU partial graphs
+        """
+        template = self._get_template(program_instance, block_index, network_ehi)
+        if template.partial_graphs is None:
+            graph = template.graph.to_graph()
+            template.partial_graphs = (
+                CompactTaskGraph(graph.partial_graph(ProcessorType.CPU)),
+                CompactTaskGraph(graph.partial_graph(ProcessorType.QPU)),
+            )
+        cpu_graph, qpu_graph = template.partial_graphs
+        first_id = self._reserve_ids(template.num_ids)
+        pid = program_instance.pid
+        return cpu_graph.relabeled(first_id, pid), qpu_graph.relabeled(first_id, pid)
+
+    def _build_graph(
+        self,
+        program_instance: ProgramInstance,
+        block_index: int,
+        network_ehi: Optional[EhiNetworkInfo],
+        unique_id: Callable[[], int],
     ) -> TaskGraph:
         graph = TaskGraph()
         block = program_instance.program.blocks[block_index]
@@ -786,7 +1839,7 @@ class TaskGraphFromBlockBuilder:
                 duration = ehi.latencies.host_instr_time * len(block.instructions)
             else:
                 duration = None
-            task_id = self.unique_id()
+            task_id = unique_id()
             graph.add_tasks([HostLocalTask(task_id, pid, block.name, duration)])
         elif block.typ == BasicBlockType.CC:
             assert len(block.instructions) == 1
@@ -797,7 +1850,7 @@ class TaskGraphFromBlockBuilder:
                 duration = ehi.latencies.host_peer_latency
             else:
                 duration = None
-            task_id = self.unique_id()
+            task_id = unique_id()
             graph.add_tasks([HostEventTask(task_id, pid, block.name, duration)])
         elif block.typ == BasicBlockType.QL:
             assert len(block.instructions) == 1
@@ -813,7 +1866,7 @@ class TaskGraphFromBlockBuilder:
                 pre_duration = None
                 post_duration = None
 
-            precall_id = self.unique_id()
+            precall_id = unique_id()
             # Use a unique "pointer" or identifier which is used at runtime to point
             # to shared data. The PreCallTask will store the lrcall object
             # to this location, such that the LR- and postcall task can
@@ -824,11 +1877,11 @@ class TaskGraphFromBlockBuilder:
             )
             graph.add_tasks([precall_task])
 
-            lr_id = self.unique_id()
+            lr_id = unique_id()
             qputask = LocalRoutineTask(lr_id, pid, block.name, shared_ptr, lr_duration)
             graph.add_tasks([qputask])
 
-            postcall_id = self.unique_id()
+            postcall_id = unique_id()
             postcall_task = PostCallTask(
                 postcall_id, pid, block.name, shared_ptr, post_duration
             )
@@ -866,7 +1919,7 @@ class TaskGraphFromBlockBuilder:
                 pair_duration = None
                 multi_duration = None
 
-            precall_id = self.unique_id()
+            precall_id = unique_id()
             # Use a unique "pointer" or identifier which is used at runtime to point
             # to shared data. The PreCallTask will store the lrcall or rrcall object
             # to this location, such that the pair- callback- and postcall tasks can
@@ -877,21 +1930,21 @@ class TaskGraphFromBlockBuilder:
             )
             graph.add_tasks([precall_task])
 
-            postcall_id = self.unique_id()
+            postcall_id = unique_id()
             postcall_task = PostCallTask(
                 postcall_id, pid, block.name, shared_ptr, post_duration
             )
             graph.add_tasks([postcall_task])
 
             if req_routine.callback_type == CallbackType.WAIT_ALL:
-                rr_id = self.unique_id()
+                rr_id = unique_id()
                 rr_task = MultiPairTask(rr_id, pid, shared_ptr, multi_duration)
                 graph.add_tasks([rr_task])
                 # RR task should come after precall task
                 graph.get_tinfo(rr_id).predecessors.add(precall_id)
 
                 if callback is not None:
-                    cb_id = self.unique_id()
+                    cb_id = unique_id()
                     cb_task = MultiPairCallbackTask(
                         cb_id, pid, callback, shared_ptr, cb_duration
                     )
@@ -912,8 +1965,23 @@ class TaskGraphFromBlockBuilder:
                     assert prog_input is not None
                     num_pairs = prog_input[num_pairs.name]
 
+                if self._pair_ranges:
+                    range_id = unique_id()
+                    range_duration = _pair_range_duration(
+                        num_pairs, pair_duration, callback, cb_duration
+                    )
+                    range_task = PairRangeTask(
+                        range_id, pid, num_pairs, callback, shared_ptr, range_duration
+                    )
+                    graph.add_tasks([range_task])
+                    # Pair range task should come after precall task, and postcall
+                    # task should come after pair range task.
+                    graph.get_tinfo(range_id).predecessors.add(precall_id)
+                    graph.get_tinfo(postcall_id).predecessors.add(range_id)
+                    return graph
+
                 for i in range(num_pairs):
-                    rr_pair_id = self.unique_id()
+                    rr_pair_id = unique_id()
                     rr_pair_task = SinglePairTask(
                         rr_pair_id, pid, i, shared_ptr, pair_duration
                     )
@@ -923,7 +1991,7 @@ class TaskGraphFromBlockBuilder:
                     # constraints among each other.
                     graph.get_tinfo(rr_pair_id).predecessors.add(precall_id)
                     if callback is not None:
-                        pair_cb_id = self.unique_id()
+                        pair_cb_id = unique_id()
                         pair_cb_task = SinglePairCallbackTask(
                             pair_cb_id, pid, callback, i, shared_ptr, cb_duration
                         )
@@ -941,8 +2009,10 @@ class TaskGraphFromBlockBuilder:
 
 
 class QoalaGraphFromProgramBuilder:
-    def __init__(self, first_task_id: int = 0) -> None:
+    def __init__(self, first_task_id: int = 0, pair_ranges: bool = False) -> None:
         self._first_task_id = first_task_id
+        # See `TaskGraphFromBlockBuilder`.
+        self._pair_ranges = pair_ranges
         self._task_id_counter = first_task_id
         self._graph = TaskGraph()
         self._block_to_task_map: Dict[str, int] = {}  # blk name -> task ID
@@ -1160,6 +2230,21 @@ class QoalaGraphFromProgramBuilder:
                 assert prog_input is not None
                 num_pairs = prog_input[num_pairs.name]
 
+            if self._pair_ranges:
+                range_id = self.unique_id()
+                range_duration = _pair_range_duration(
+                    num_pairs, pair_duration, callback, cb_duration
+                )
+                range_task = PairRangeTask(
+                    range_id, pid, num_pairs, callback, shared_ptr, range_duration
+                )
+                self._graph.add_tasks([range_task])
+                # Pair range task should come after precall task, and postcall
+                # task should come after pair range task.
+                self._graph.get_tinfo(range_id).predecessors.add(precall_id)
+                self._graph.get_tinfo(postcall_id).predecessors.add(range_id)
+                return precall_id, postcall_id
+
             for i in range(num_pairs):
                 rr_pair_id = self.unique_id()
                 rr_pair_task = SinglePairTask(
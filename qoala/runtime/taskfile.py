@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from qoala.runtime.task import (
+    HostEventTask,
+    HostLocalTask,
+    LocalRoutineTask,
+    MultiPairCallbackTask,
+    MultiPairTask,
+    PairRangeTask,
+    PostCallTask,
+    PreCallTask,
+    QoalaTask,
+    SinglePairCallbackTask,
+    SinglePairTask,
+    TaskGraph,
+    TaskInfo,
+)
+
+# Binary format for task graphs, so that graphs that are expensive to build (e.g.
+# offline schedules for `NodeScheduler.upload_task_graph`) can be cached on disk.
+#
+# A file consists of a header followed by a number of sections. The header is the
+# magic string, followed by the length of each section (in number of 8-byte
+# items). Each section is a flat array of little-endian 64-bit integers ('q') or
+# doubles ('d'); the string section is padded to a multiple of 8 bytes. Since all
+# sections are 8-byte aligned, they can be read directly from a memory-mapped
+# file (see `read_task_graph`).
+#
+# Per task (in the order of the graph) there is one entry in each of the task
+# sections. Absent values (no duration, deadline or start time) are NaN. Task
+# fields that are strings (block and callback names) are indices into the string
+# table, or -1 if absent. Predecessors, external predecessors and (external)
+# relative deadlines are stored in CSR form, as in `CompactTaskGraph`: the
+# entries of task i are at positions offsets[i] up to offsets[i + 1].
+
+MAGIC = b"QOALATG1"
+
+# Task classes that can be serialized, by type code.
+_TASK_TYPES = [
+    HostLocalTask,
+    HostEventTask,
+    LocalRoutineTask,
+    PreCallTask,
+    PostCallTask,
+    SinglePairTask,
+    MultiPairTask,
+    SinglePairCallbackTask,
+    MultiPairCallbackTask,
+    PairRangeTask,
+]
+
+# Sections, in file order: (name, array type code).
+_SECTIONS: List[Tuple[str, str]] = [
+    ("ids", "q"),
+    ("types", "q"),
+    ("pids", "q"),
+    ("durations", "d"),
+    ("names", "q"),  # block or callback name
+    ("indices", "q"),  # pair index or number of pairs
+    ("shared_ptrs", "q"),
+    ("deadlines", "d"),
+    ("start_times", "d"),
+    ("pred_offsets", "q"),
+    ("preds", "q"),
+    ("ext_pred_offsets", "q"),
+    ("ext_preds", "q"),
+    ("rel_offsets", "q"),
+    ("rel_keys", "q"),
+    ("rel_values", "d"),
+    ("ext_rel_offsets", "q"),
+    ("ext_rel_keys", "q"),
+    ("ext_rel_values", "d"),
+    ("string_offsets", "q"),
+    ("strings", "B"),
+]
+
+_HEADER = struct.Struct(f"<8s{len(_SECTIONS)}q")
+
+# Sections with one entry per task.
+_TASK_SECTIONS = [
+    "ids",
+    "types",
+    "pids",
+    "durations",
+    "names",
+    "indices",
+    "shared_ptrs",
+    "deadlines",
+    "start_times",
+]
+
+
+class TaskFileError(Exception):
+    """Data is not a valid serialized task graph."""
+
+    pass
+
+
+def _optional(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _number(value: float) -> Optional[Union[int, float]]:
+    # Inverse of `_optional`. Integral values are restored as int.
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.sections: Dict[str, array[Any]] = {
+            name: array(code) for name, code in _SECTIONS
+        }
+        self._string_index: Dict[str, int] = {}
+        for name, _ in _SECTIONS:
+            if name.endswith("offsets"):
+                self.sections[name].append(0)
+
+    def string(self, s: Optional[str]) -> int:
+        if s is None:
+            return -1
+        if s not in self._string_index:
+            self._string_index[s] = len(self._string_index)
+            self.sections["strings"].frombytes(s.encode("utf-8"))
+            self.sections["string_offsets"].append(len(self.sections["strings"]))
+        return self._string_index[s]
+
+    def add_task(self, task: QoalaTask) -> None:
+        if type(task) not in _TASK_TYPES:
+            raise TaskFileError(f"cannot serialize task of type {type(task)}")
+        name: Optional[str] = None
+        index = 0
+        if isinstance(
+            task,
+            (HostLocalTask, HostEventTask, LocalRoutineTask, PreCallTask, PostCallTask),
+        ):
+            name = task.block_name
+        elif isinstance(task, (SinglePairCallbackTask, MultiPairCallbackTask)):
+            name = task.callback_name
+        elif isinstance(task, PairRangeTask):
+            name = task.callback_name
+            index = task.num_pairs
+        if isinstance(task, (SinglePairTask, SinglePairCallbackTask)):
+            index = task.pair_index
+
+        s = self.sections
+        s["ids"].append(task.task_id)
+        s["types"].append(_TASK_TYPES.index(type(task)))
+        s["pids"].append(task.pid)
+        s["durations"].append(_optional(task.duration))
+        s["names"].append(self.string(name))
+        s["indices"].append(index)
+        s["shared_ptrs"].append(getattr(task, "shared_ptr", 0))
+
+    def add_tinfo(self, tinfo: TaskInfo) -> None:
+        s = self.sections
+        self.add_task(tinfo.task)
+        s["deadlines"].append(_optional(tinfo.deadline))
+        s["start_times"].append(_optional(tinfo.start_time))
+        s["preds"].extend(sorted(tinfo.predecessors))
+        s["pred_offsets"].append(len(s["preds"]))
+        s["ext_preds"].extend(sorted(tinfo.ext_predecessors))
+        s["ext_pred_offsets"].append(len(s["ext_preds"]))
+        for key in sorted(tinfo.rel_deadlines):
+            s["rel_keys"].append(key)
+            s["rel_values"].append(tinfo.rel_deadlines[key])
+        s["rel_offsets"].append(len(s["rel_keys"]))
+        for key in sorted(tinfo.ext_rel_deadlines):
+            s["ext_rel_keys"].append(key)
+            s["ext_rel_values"].append(tinfo.ext_rel_deadlines[key])
+        s["ext_rel_offsets"].append(len(s["ext_rel_keys"]))
+
+
+def serialize_task_graph(graph: TaskGraph) -> bytes:
+    """Serialize a task graph (tasks, predecessors, external predecessors,
+    deadlines, relative deadlines and start times). Successors are not stored,
+    since they follow from the predecessors.
+
+    :param graph: task graph; may only contain the task types of this module
+    :return: the serialized graph
+    """
+    writer = _Writer()
+    for tinfo in graph.get_tasks().values():
+        writer.add_tinfo(tinfo)
+
+    lengths: List[int] = []
+    chunks: List[bytes] = []
+    for name, _ in _SECTIONS:
+        section = writer.sections[name]
+        if sys.byteorder == "big" and section.itemsize > 1:
+            section.byteswap()
+        data = section.tobytes()
+        padding = -len(data) % 8
+        lengths.append((len(data) + padding) // 8)
+        chunks.append(data + bytes(padding))
+    return _HEADER.pack(MAGIC, *lengths) + b"".join(chunks)
+
+
+def _read_sections(buffer: memoryview) -> Dict[str, memoryview]:
+    if len(buffer) < _HEADER.size:
+        raise TaskFileError("data too short")
+    magic, *lengths = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise TaskFileError("not a serialized task graph")
+    if _HEADER.size + 8 * sum(lengths) != len(buffer):
+        raise TaskFileError("data has the wrong length")
+
+    sections: Dict[str, memoryview] = {}
+    pos = _HEADER.size
+    for (name, code), length in zip(_SECTIONS, lengths):
+        view = buffer[pos : pos + 8 * length]
+        if code != "B" and sys.byteorder == "big":
+            swapped = array(code, view.tobytes())
+            swapped.byteswap()
+            view = memoryview(swapped)
+        sections[name] = view.cast(code) if code != "B" else view
+        pos += 8 * length
+    return sections
+
+
+def _check_offsets(offsets: List[int], num_items: int, length: int, name: str) -> None:
+    # Offsets of CSR data: one more than the number of items, starting at 0,
+    # non-decreasing, and ending at the length of the data.
+    if len(offsets) != num_items + 1 or offsets[0] != 0 or offsets[-1] != length:
+        raise TaskFileError(f"invalid {name}")
+    if any(offsets[j] > offsets[j + 1] for j in range(num_items)):
+        raise TaskFileError(f"invalid {name}")
+
+
+def _check_sections(s: Dict[str, List[Any]], num_bytes: int) -> None:
+    # Check that the sections are consistent, such that tasks can be created
+    # without indexing out of range.
+    n = len(s["ids"])
+    for name in _TASK_SECTIONS:
+        if len(s[name]) != n:
+            raise TaskFileError(f"section {name} has the wrong length")
+    _check_offsets(s["pred_offsets"], n, len(s["preds"]), "predecessors")
+    _check_offsets(s["ext_pred_offsets"], n, len(s["ext_preds"]), "predecessors")
+    for prefix in ["rel", "ext_rel"]:
+        num_keys = len(s[f"{prefix}_keys"])
+        if len(s[f"{prefix}_values"]) != num_keys:
+            raise TaskFileError("invalid relative deadlines")
+        _check_offsets(s[f"{prefix}_offsets"], n, num_keys, "relative deadlines")
+    string_offsets = s["string_offsets"]
+    num_strings = len(string_offsets) - 1
+    # The string section is padded to a multiple of 8 bytes.
+    if num_strings < 0 or not 0 <= num_bytes - string_offsets[-1] < 8:
+        raise TaskFileError("invalid string table")
+    _check_offsets(string_offsets, num_strings, string_offsets[-1], "string table")
+
+    ids = set(s["ids"])
+    if len(ids) != n:
+        raise TaskFileError("duplicate task IDs")
+    if not ids.issuperset(s["preds"]):
+        raise TaskFileError("predecessor is not in the graph")
+    callback_types = [SinglePairCallbackTask, MultiPairCallbackTask]
+    for typ, name_index in zip(s["types"], s["names"]):
+        if not 0 <= typ < len(_TASK_TYPES):
+            raise TaskFileError(f"invalid task type {typ}")
+        if not -1 <= name_index < num_strings:
+            raise TaskFileError(f"invalid string index {name_index}")
+        if name_index == -1 and _TASK_TYPES[typ] in callback_types:
+            raise TaskFileError("callback task without callback name")
+
+
+def _create_task(s: Dict[str, List[Any]], strings: List[str], i: int) -> QoalaTask:
+    typ = _TASK_TYPES[s["types"][i]]
+    task_id = s["ids"][i]
+    pid = s["pids"][i]
+    duration = _number(s["durations"][i])
+    name_index = s["names"][i]
+    name = strings[name_index] if name_index >= 0 else None
+    index = s["indices"][i]
+    ptr = s["shared_ptrs"][i]
+
+    if typ in (HostLocalTask, HostEventTask):
+        return typ(task_id, pid, name, duration)  # type: ignore
+    elif typ in (LocalRoutineTask, PreCallTask, PostCallTask):
+        return typ(task_id, pid, name, ptr, duration)  # type: ignore
+    elif typ == SinglePairTask:
+        return SinglePairTask(task_id, pid, index, ptr, duration)
+    elif typ == MultiPairTask:
+        return MultiPairTask(task_id, pid, ptr, duration)
+    elif typ == SinglePairCallbackTask:
+        assert name is not None
+        return SinglePairCallbackTask(task_id, pid, name, index, ptr, duration)
+    elif typ == MultiPairCallbackTask:
+        assert name is not None
+        return MultiPairCallbackTask(task_id, pid, name, ptr, duration)
+    else:
+        assert typ == PairRangeTask
+        return PairRangeTask(task_id, pid, index, name, ptr, duration)
+
+
+def _rel_deadlines(
+    offsets: List[int], keys: List[int], values: Sequence[float], i: int
+) -> Dict[int, int]:
+    start, end = offsets[i], offsets[i + 1]
+    if start == end:
+        return {}
+    return {
+        k: _number(v) for k, v in zip(keys[start:end], values[start:end])  # type: ignore
+    }
+
+
+def deserialize_task_graph(
+    data: Union[bytes, bytearray, memoryview, mmap.mmap]
+) -> TaskGraph:
+    """Create a task graph from data created with `serialize_task_graph`.
+
+    :param data: the serialized graph. The data is read in place, without first
+        copying it.
+    :return: the task graph
+    :raises TaskFileError: if the data is not a valid serialized task graph
+    """
+    views = _read_sections(memoryview(data))
+    raw = bytes(views.pop("strings"))
+    # Converting whole sections at once is much faster than reading single items.
+    s = {name: view.tolist() for name, view in views.items()}
+    del views
+    _check_sections(s, len(raw))
+    string_offsets = s["string_offsets"]
+    try:
+        strings = [
+            raw[string_offsets[j] : string_offsets[j + 1]].decode("utf-8")
+            for j in range(len(string_offsets) - 1)
+        ]
+    except UnicodeDecodeError:
+        raise TaskFileError("invalid string table")
+
+    pred_offsets, preds = s["pred_offsets"], s["preds"]
+    ext_pred_offsets, ext_preds = s["ext_pred_offsets"], s["ext_preds"]
+    deadlines, start_times = s["deadlines"], s["start_times"]
+    tinfos: Dict[int, TaskInfo] = {}
+    for i in range(len(s["ids"])):
+        task = _create_task(s, strings, i)
+        tinfos[task.task_id] = TaskInfo(
+            task=task,
+            predecessors=set(preds[pred_offsets[i] : pred_offsets[i + 1]]),
+            ext_predecessors=set(
+                ext_preds[ext_pred_offsets[i] : ext_pred_offsets[i + 1]]
+            ),
+            successors=set(),
+            deadline=_number(deadlines[i]),  # type: ignore
+            rel_deadlines=_rel_deadlines(
+                s["rel_offsets"], s["rel_keys"], s["rel_values"], i
+            ),
+            ext_rel_deadlines=_rel_deadlines(
+                s["ext_rel_offsets"], s["ext_rel_keys"], s["ext_rel_values"], i
+            ),
+            start_time=_number(start_times[i]),
+        )
+
+    graph = TaskGraph(tinfos)
+    graph.update_successors()
+    return graph
+
+
+def write_task_graph(graph: TaskGraph, path: str) -> None:
+    """Serialize a task graph to a file (see `serialize_task_graph`)."""
+    with open(path, "wb") as f:
+        f.write(serialize_task_graph(graph))
+
+
+def read_task_graph(path: str) -> TaskGraph:
+    """Read a task graph from a file created with `write_task_graph`. The file is
+    memory-mapped, so only the parts that are needed are read.
+
+    :raises TaskFileError: if the file does not contain a valid task graph
+    """
+    with open(path, "rb") as f:
+        # Empty files cannot be memory-mapped.
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            raise TaskFileError("data too short")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                return deserialize_task_graph(view)
+            except TaskFileError as e:
+                # The traceback refers to views of the map, which cannot be closed
+                # while they exist, so the error is raised again after closing it.
+                message = str(e)
+            finally:
+                view.release()
+    raise TaskFileError(message)
@@ -115,6 +115,15 @@ def build_procnode_from_config(
         deterministic_scheduler=cfg.determ_sched,
         use_deadlines=cfg.use_deadlines,
         is_predictable=cfg.is_predictable,
+        retire_finished=cfg.retire_finished,
+        scheduling_policy=cfg.sched_policy,
+        num_cpu_cores=cfg.num_cpu_cores,
+        num_qpu_lanes=cfg.num_qpu_lanes,
+        admission_control=cfg.admission_control,
+        timebin_lookahead=cfg.timebin_lookahead,
+        pair_range_tasks=cfg.pair_range_tasks,
+        per_qubit_durations=cfg.per_qubit_durations,
+        wfq_weights=cfg.wfq_weights,
     )
 
     # TODO: refactor this hack
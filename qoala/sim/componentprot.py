@@ -15,7 +15,21 @@ class MessageBuffer:
             Tuple[int, int], List[Message]
         ] = {}  # (src PID, dst PID) -> message list
 
+        # Total number of messages that have been added to and popped from this
+        # buffer, so that users can detect changes without inspecting the buffer.
+        self._num_added: int = 0
+        self._num_popped: int = 0
+
+    @property
+    def num_added(self) -> int:
+        return self._num_added
+
+    @property
+    def num_popped(self) -> int:
+        return self._num_popped
+
     def add_msg(self, msg: Message) -> None:
+        self._num_added += 1
         if (msg.src_pid, msg.dst_pid) not in self._messages:
             self._messages[(msg.src_pid, msg.dst_pid)] = [msg]
         else:
@@ -41,11 +55,14 @@ class MessageBuffer:
         return sum(len(buf) for buf in self._messages.values())
 
     def pop_msg(self, src_pid: int, dst_pid: int) -> Message:
-        return self._messages[(src_pid, dst_pid)].pop(0)
+        msg = self._messages[(src_pid, dst_pid)].pop(0)
+        self._num_popped += 1
+        return msg
 
     def pop_any(self) -> Message:
         for buf in self._messages.values():
             if len(buf) > 0:
+                self._num_popped += 1
                 return buf.pop(0)
         raise RuntimeError
 
@@ -54,6 +71,7 @@ class MessageBuffer:
         for buf in self._messages.values():
             messages.extend(buf)
             buf.clear()
+        self._num_popped += len(messages)
         return messages
 
 
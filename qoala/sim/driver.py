@@ -6,7 +6,7 @@ from typing import Dict, Generator
 
 from netsquid.protocols import Protocol
 
-from pydynaa import EventExpression
+from pydynaa import EventExpression, EventType
 from qoala.lang.hostlang import BasicBlockType, RunRequestOp, RunSubroutineOp
 from qoala.runtime.message import LrCallTuple, RrCallTuple
 from qoala.runtime.task import (
@@ -15,6 +15,7 @@ from qoala.runtime.task import (
     LocalRoutineTask,
     MultiPairCallbackTask,
     MultiPairTask,
+    PairRangeTask,
     PostCallTask,
     PreCallTask,
     QoalaTask,
@@ -50,6 +51,23 @@ class SharedSchedulerMemory:
     def read_shared_rrcall(self, ptr: int) -> RrCallTuple:
         return self._shared_rrcalls[ptr]
 
+    def release(self, ptr: int) -> None:
+        self._shared_lrcalls.pop(ptr, None)
+        self._shared_rrcalls.pop(ptr, None)
+
+
+# Tasks that share an lrcall/rrcall object with the other tasks of their block.
+_SHARED_PTR_TASKS = (
+    LocalRoutineTask,
+    PreCallTask,
+    PostCallTask,
+    SinglePairTask,
+    MultiPairTask,
+    SinglePairCallbackTask,
+    MultiPairCallbackTask,
+    PairRangeTask,
+)
+
 
 class Driver(Protocol):
     def __init__(self, name: str, memory: SharedSchedulerMemory) -> None:
@@ -65,6 +83,12 @@ class Driver(Protocol):
     def handle_task(self, task: QoalaTask) -> Generator[EventExpression, None, bool]:
         raise NotImplementedError
 
+    def release_task_memory(self, task: QoalaTask) -> None:
+        """Release the lrcall/rrcall object that the given (finished) task shares
+        with the other tasks of its block, if any."""
+        if isinstance(task, _SHARED_PTR_TASKS):
+            self._memory.release(task.shared_ptr)
+
 
 class CpuDriver(Driver):
     def __init__(
@@ -76,9 +100,22 @@ class CpuDriver(Driver):
     ) -> None:
         super().__init__(name=f"{node_name}_cpu_driver", memory=memory)
 
+        self._node_name = node_name
         self._hostprocessor = hostprocessor
         self._memmgr = memmgr
 
+    def for_core(self, core: int) -> CpuDriver:
+        """Create a driver for another core of the same CPU. It acts on the same
+        processes and shared memory, but can execute tasks concurrently with this
+        driver."""
+        wait_event = EventType(f"HOST_WAIT_{core}", f"host wait on CPU core {core}")
+        return CpuDriver(
+            self._node_name,
+            self._memory,
+            self._hostprocessor.copy_with_wait_event(wait_event),
+            self._memmgr,
+        )
+
     def _handle_precall_lr(self, task: PreCallTask) -> None:
         process = self._memmgr.get_process(task.pid)
         block = process.program.get_block(task.block_name)
@@ -142,7 +179,7 @@ class CpuDriver(Driver):
             # Simulate processing time of PreCallTask
             # TODO refactor
             latency = self._hostprocessor._latencies.host_instr_time
-            yield from self._hostprocessor._interface.wait(latency)
+            yield from self._hostprocessor.wait(latency)
         elif isinstance(task, PostCallTask):
             process = self._memmgr.get_process(task.pid)
             block = process.program.get_block(task.block_name)
@@ -154,7 +191,7 @@ class CpuDriver(Driver):
             # Simulate processing time of PostCallTask
             # TODO refactor
             latency = self._hostprocessor._latencies.host_instr_time
-            yield from self._hostprocessor._interface.wait(latency)
+            yield from self._hostprocessor.wait(latency)
         else:
             raise NotImplementedError
 
@@ -173,11 +210,26 @@ class QpuDriver(Driver):
     ) -> None:
         super().__init__(name=f"{node_name}_qpu_driver", memory=memory)
 
+        self._node_name = node_name
         self._hostprocessor = hostprocessor
         self._qnosprocessor = qnosprocessor
         self._netstackprocessor = netstackprocessor
         self._memmgr = memmgr
 
+    def for_lane(self, lane: int) -> QpuDriver:
+        """Create a driver for another lane of the same QPU. It acts on the same
+        processes, qubits and shared memory, but can execute tasks concurrently with
+        this driver."""
+        wait_event = EventType(f"QNOS_WAIT_{lane}", f"qnos wait on QPU lane {lane}")
+        return QpuDriver(
+            self._node_name,
+            self._memory,
+            self._hostprocessor,
+            self._qnosprocessor.copy_with_wait_event(wait_event),
+            self._netstackprocessor.copy(),
+            self._memmgr,
+        )
+
     def allocate_qubits_for_routine(
         self, process: QoalaProcess, routine_name: str
     ) -> None:
@@ -278,6 +330,46 @@ class QpuDriver(Driver):
             process, rrcall.routine_name, self._qnosprocessor, task.pair_index
         )
 
+    def handle_pair(
+        self, task: PairRangeTask, pair_index: int
+    ) -> Generator[EventExpression, None, bool]:
+        """Generate a single pair of a pair range task, followed by its callback
+        (if any). The pair is not generated if it failed.
+
+        :param task: pair range task
+        :param pair_index: index of the pair within the request routine
+        :return: whether generating the pair succeeded
+        """
+        process = self._memmgr.get_process(task.pid)
+
+        # The corresponding PreCallTask must have executed, and it must have written
+        # to the sharded scheduler memory.
+        rrcall: RrCallTuple = self._memory.read_shared_rrcall(task.shared_ptr)
+
+        global_args = process.prog_instance.inputs.values
+        self._netstackprocessor.instantiate_routine(process, rrcall, global_args)
+
+        result = yield from self._netstackprocessor.handle_single_pair(
+            process, rrcall.routine_name, pair_index
+        )
+        self._logger.info(f"Driver result: {result}")
+        if result and task.callback_name is not None:
+            yield from self._netstackprocessor.handle_single_pair_callback(
+                process, rrcall.routine_name, self._qnosprocessor, pair_index
+            )
+        return result
+
+    def _handle_pair_range(
+        self, task: PairRangeTask
+    ) -> Generator[EventExpression, None, bool]:
+        # All pairs at once. The QPU scheduler instead uses `handle_pair` to
+        # execute the pairs one by one.
+        for i in range(task.num_pairs):
+            result = yield from self.handle_pair(task, i)
+            if not result:
+                return False
+        return True
+
     def handle_task(self, task: QoalaTask) -> Generator[EventExpression, None, bool]:
         if isinstance(task, LocalRoutineTask):
             yield from self._handle_local_routine(task)
@@ -291,6 +383,9 @@ class QpuDriver(Driver):
             return result
         elif isinstance(task, SinglePairCallbackTask):
             yield from self._handle_single_pair_callback(task)
+        elif isinstance(task, PairRangeTask):
+            result = yield from self._handle_pair_range(task)
+            return result
         else:
             raise NotImplementedError
         return True
@@ -2,6 +2,8 @@ from pydynaa import EventType
 
 EVENT_WAIT = EventType("SCHEDULER_WAIT", "scheduler wait")
 EPR_DELIVERY = EventType("EPR_DELIVERY", "EPR delivery")
+EVENT_CORE_ASSIGN = EventType("CORE_ASSIGN", "task assigned to processor core")
+EVENT_QDEVICE_IDLE = EventType("QDEVICE_IDLE", "QDevice finished a program")
 
 
 # Signals inside a single node
@@ -21,4 +23,5 @@ SIGNAL_ENTD_NSTK_MSG = "EvEntdNstkMsg"
 # Global signals
 SIGNAL_MEMORY_FREED = "EvMemoryFreed"
 SIGNAL_TASK_COMPLETED = "TaskCompleted"
+SIGNAL_CORE_IDLE = "CoreIdle"
 MSG_REQUEST_DELIVERED = "RequestDelivered"
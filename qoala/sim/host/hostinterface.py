@@ -3,7 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Generator, List, Optional, Tuple
 
-from pydynaa import EventExpression
+from pydynaa import EventExpression, EventType
 from qoala.lang.ehi import EhiNetworkInfo
 from qoala.runtime.message import Message
 from qoala.sim.componentprot import ComponentProtocol, PortListener
@@ -84,6 +84,18 @@ class HostInterface(ComponentProtocol):
         listener = self._listeners[f"peer_{peer}"]
         return listener.buffer.get_all()
 
+    def num_peer_msgs_added(self) -> int:
+        # Total number of messages received from peers so far.
+        return sum(
+            self._listeners[name].buffer.num_added for name in self._listener_names
+        )
+
+    def num_peer_msgs_popped(self) -> int:
+        # Total number of messages from peers that have been consumed so far.
+        return sum(
+            self._listeners[name].buffer.num_popped for name in self._listener_names
+        )
+
     def wait_for_msg(self, peer: str) -> Generator[EventExpression, None, None]:
         yield from self._wait_for_msg(f"peer_{peer}", f"{SIGNAL_HOST_HOST_MSG}_{peer}")
 
@@ -107,7 +119,11 @@ class HostInterface(ComponentProtocol):
         yield from self._wait_for_msg(f"peer_{peer}", f"{SIGNAL_HOST_HOST_MSG}_{peer}")
         return self._pop_any_msg(f"peer_{peer}")
 
-    def wait(self, delta_time: float) -> Generator[EventExpression, None, None]:
-        self._schedule_after(delta_time, EVENT_WAIT)
-        event_expr = EventExpression(source=self, event_type=EVENT_WAIT)
+    def wait(
+        self, delta_time: float, event_type: EventType = EVENT_WAIT
+    ) -> Generator[EventExpression, None, None]:
+        # Waits that may overlap in time (e.g. on different CPU cores) must use
+        # different event types, since any event of the awaited type ends a wait.
+        self._schedule_after(delta_time, event_type)
+        event_expr = EventExpression(source=self, event_type=event_type)
         yield event_expr
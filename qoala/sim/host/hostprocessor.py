@@ -5,13 +5,14 @@ from typing import Dict, Generator, List, Optional, Union
 
 from netqasm.lang.operand import Template
 
-from pydynaa import EventExpression
+from pydynaa import EventExpression, EventType
 from qoala.lang import hostlang
 from qoala.lang.hostlang import ClassicalIqoalaOp, IqoalaSingleton, IqoalaVectorElement
 from qoala.lang.request import CallbackType
 from qoala.runtime.memory import HostMemory
 from qoala.runtime.message import LrCallTuple, RrCallTuple
 from qoala.runtime.sharedmem import MemAddr
+from qoala.sim.events import EVENT_WAIT
 from qoala.sim.host.hostinterface import HostInterface, HostLatencies
 from qoala.sim.process import QoalaProcess
 from qoala.util.logging import LogManager
@@ -25,10 +26,14 @@ class HostProcessor:
         interface: HostInterface,
         latencies: HostLatencies,
         asynchronous: bool = False,
+        wait_event: EventType = EVENT_WAIT,
     ) -> None:
         self._interface = interface
         self._latencies = latencies
         self._asynchronous = asynchronous
+        # Event type used for simulating durations. Host processors that execute
+        # instructions concurrently must each use their own event type.
+        self._wait_event = wait_event
 
         # TODO: name
         self._name = f"{interface.name}_HostProcessor"
@@ -36,6 +41,16 @@ class HostProcessor:
             f"{self.__class__.__name__}({self._name})"
         )
 
+    def copy_with_wait_event(self, wait_event: EventType) -> HostProcessor:
+        """Create a host processor that shares the interface and latencies of
+        this one, but can execute instructions concurrently with it."""
+        return HostProcessor(
+            self._interface, self._latencies, self._asynchronous, wait_event
+        )
+
+    def wait(self, delta_time: float) -> Generator[EventExpression, None, None]:
+        yield from self._interface.wait(delta_time, self._wait_event)
+
     def initialize(self, process: QoalaProcess) -> None:
         host_mem = process.prog_memory.host_mem
         inputs = process.prog_instance.inputs
@@ -91,20 +106,20 @@ class HostProcessor:
         self._interface.program_instance_jumps[pid] = -1
         self._logger.debug(f"Interpreting LHR instruction {instr}")
         if isinstance(instr, hostlang.AssignCValueOp):
-            yield from self._interface.wait(first_half)
+            yield from self.wait(first_half)
             value = instr.attributes[0]
             assert isinstance(value, int)
             assert isinstance(instr.results, hostlang.IqoalaSingleton)
             loc = instr.results.name  # type: ignore
             self._logger.debug(f"writing {value} to {loc}")
-            yield from self._interface.wait(second_half)
+            yield from self.wait(second_half)
             host_mem.write(loc, value)
         elif isinstance(instr, hostlang.BusyOp):
             value = instr.attributes[0]
             if not isinstance(value, int):
                 value = host_mem.read(value)
             self._logger.debug(f"busy for {value} ns")
-            yield from self._interface.wait(value)
+            yield from self.wait(value)
         elif isinstance(instr, hostlang.SendCMsgOp):
             assert isinstance(
                 instr.arguments[0], hostlang.IqoalaSingleton
@@ -125,7 +140,7 @@ class HostProcessor:
             self._logger.info(f"sending msg {value}")
             csck.send_int(value)
             # Simulate instruction duration.
-            yield from self._interface.wait(self._latencies.host_instr_time)
+            yield from self.wait(self._latencies.host_instr_time)
         elif isinstance(instr, hostlang.ReceiveCMsgOp):
             assert isinstance(
                 instr.arguments[0], hostlang.IqoalaSingleton
@@ -143,11 +158,11 @@ class HostProcessor:
             else:
                 msg = csck.read_int()
 
-            yield from self._interface.wait(self._latencies.host_peer_latency)
+            yield from self.wait(self._latencies.host_peer_latency)
             host_mem.write(instr.results.name, msg)
             self._logger.info(f"received msg {msg}")
         elif isinstance(instr, hostlang.AddCValueOp):
-            yield from self._interface.wait(first_half)
+            yield from self.wait(first_half)
             assert isinstance(
                 instr.arguments[0], hostlang.IqoalaSingleton
             ) or isinstance(instr.arguments[0], hostlang.IqoalaVectorElement)
@@ -163,10 +178,10 @@ class HostProcessor:
             result = arg0 + arg1
             self._logger.debug(f"computing {loc} = {arg0} + {arg1} = {result}")
             # Simulate instruction duration.
-            yield from self._interface.wait(second_half)
+            yield from self.wait(second_half)
             host_mem.write(loc, result)
         elif isinstance(instr, hostlang.MultiplyConstantCValueOp):
-            yield from self._interface.wait(first_half)
+            yield from self.wait(first_half)
             assert isinstance(
                 instr.arguments[0], hostlang.IqoalaSingleton
             ) or isinstance(instr.arguments[0], hostlang.IqoalaVectorElement)
@@ -180,10 +195,10 @@ class HostProcessor:
             result = arg0 * const
             self._logger.debug(f"computing {loc} = {arg0} * {const} = {result}")
             # Simulate instruction duration.
-            yield from self._interface.wait(second_half)
+            yield from self.wait(second_half)
             host_mem.write(loc, result)
         elif isinstance(instr, hostlang.BitConditionalMultiplyConstantCValueOp):
-            yield from self._interface.wait(first_half)
+            yield from self.wait(first_half)
 
             assert isinstance(
                 instr.arguments[0], hostlang.IqoalaSingleton
@@ -205,10 +220,10 @@ class HostProcessor:
                 result = arg0
             self._logger.debug(f"computing {loc} = {arg0} * {const}^{cond} = {result}")
             # Simulate instruction duration.
-            yield from self._interface.wait(second_half)
+            yield from self.wait(second_half)
             host_mem.write(loc, result)
         elif isinstance(instr, hostlang.ReturnResultOp):
-            yield from self._interface.wait(first_half)
+            yield from self.wait(first_half)
             assert isinstance(
                 instr.arguments[0], hostlang.IqoalaSingleton
             ) or isinstance(instr.arguments[0], hostlang.IqoalaVector)
@@ -219,16 +234,16 @@ class HostProcessor:
                 value = host_mem.read_vec(loc)
             self._logger.debug(f"returning {loc} = {value}")
             # Simulate instruction duration.
-            yield from self._interface.wait(second_half)
+            yield from self.wait(second_half)
             process.result.values[loc] = value
         elif isinstance(instr, hostlang.JumpOp):
-            yield from self._interface.wait(first_half)
+            yield from self.wait(first_half)
             assert isinstance(instr.attributes[0], str)
             block_name = instr.attributes[0]
             self._logger.debug(f"jumping to block {block_name}")
             block_id = process.prog_instance.program.get_block_id(block_name)
             self._interface.program_instance_jumps[pid] = block_id
-            yield from self._interface.wait(second_half)
+            yield from self.wait(second_half)
         elif isinstance(instr, hostlang.BranchIfEqualOp):
             yield from self._branch(process, instr, "__eq__")
         elif isinstance(instr, hostlang.BranchIfNotEqualOp):
@@ -244,7 +259,7 @@ class HostProcessor:
         instr_time = self._latencies.host_instr_time
         first_half = instr_time / 2
         second_half = instr_time - first_half  # just to make it adds up
-        yield from self._interface.wait(first_half)
+        yield from self.wait(first_half)
 
         assert isinstance(instr.arguments[0], hostlang.IqoalaSingleton) or isinstance(
             instr.arguments[0], hostlang.IqoalaVectorElement
@@ -264,7 +279,7 @@ class HostProcessor:
         if getattr(value0, comparison_op)(value1):
             block_id = process.prog_instance.program.get_block_id(block_name)
             self._interface.program_instance_jumps[pid] = block_id
-        yield from self._interface.wait(second_half)
+        yield from self.wait(second_half)
 
     def prepare_lr_call(
         self, process: QoalaProcess, instr: hostlang.RunSubroutineOp
@@ -1,6 +1,7 @@
+import heapq
 import logging
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from netsquid.protocols import Protocol
 
@@ -28,6 +29,8 @@ class VirtualMapping:
     # mapping from virt ID in specific unit module to phys ID
     unit_module: UnitModule
     mapping: Dict[int, Optional[int]]  # virt ID -> phys ID
+    # virt IDs in the unit module that are communication qubits
+    comm_ids: FrozenSet[int] = frozenset()
 
 
 @dataclass
@@ -58,19 +61,78 @@ class MemoryManager(Protocol):
             i: None for i in qdevice.get_all_qubit_ids()
         }  # phys ID -> virt location
 
+        # Unmapped physical qubits, per qubit type. These are heaps so that the
+        # free qubit with the lowest ID is always allocated first.
+        self._comm_phys_ids: FrozenSet[int] = frozenset(qdevice.get_comm_qubit_ids())
+        self._free_comm: List[int] = sorted(self._comm_phys_ids)
+        self._free_mem: List[int] = sorted(qdevice.get_non_comm_qubit_ids())
+        # Physical qubits that operations on a physical qubit also act on, based
+        # on the topology (see `LhiTopology.get_mediating_qubits`). Filled in on
+        # first use.
+        self._mediating_phys_ids: Dict[int, FrozenSet[int]] = {}
+
+        # Total number of allocations and frees so far. Schedulers use these to
+        # detect whether resource availability may have changed.
+        self._num_allocations: int = 0
+        self._num_frees: int = 0
+
         self.add_signal(SIGNAL_MEMORY_FREED)
 
     def _get_free_comm_phys_id(self) -> int:
-        for phys_id in self._qdevice.get_comm_qubit_ids():
-            if self._physical_mapping[phys_id] is None:
-                return phys_id  # type: ignore
-        raise AllocError
+        if len(self._free_comm) == 0:
+            raise AllocError
+        return self._free_comm[0]
 
     def _get_free_mem_phys_id(self) -> int:
-        for phys_id in self._qdevice.get_non_comm_qubit_ids():
-            if self._physical_mapping[phys_id] is None:
-                return phys_id  # type: ignore
-        raise AllocError
+        if len(self._free_mem) == 0:
+            raise AllocError
+        return self._free_mem[0]
+
+    @property
+    def num_allocations(self) -> int:
+        return self._num_allocations
+
+    @property
+    def num_frees(self) -> int:
+        return self._num_frees
+
+    @property
+    def comm_phys_ids(self) -> FrozenSet[int]:
+        return self._comm_phys_ids
+
+    def mediating_phys_ids(self, phys_id: int) -> FrozenSet[int]:
+        """Physical qubits that any operation on the given physical qubit also
+        acts on, such as the electron for carbon qubits in an NV center."""
+        if phys_id not in self._mediating_phys_ids:
+            mediating = self._qdevice.topology.get_mediating_qubits(phys_id)
+            self._mediating_phys_ids[phys_id] = frozenset(mediating)
+        return self._mediating_phys_ids[phys_id]
+
+    @property
+    def num_free_comm(self) -> int:
+        return len(self._free_comm)
+
+    @property
+    def num_free_mem(self) -> int:
+        return len(self._free_mem)
+
+    def num_allocated(self, pid: int) -> Tuple[int, int]:
+        """Number of (communication, memory) qubits currently allocated by the
+        process with the given ID."""
+        vmap = self._process_mappings[pid]
+        num_comm = 0
+        num_mem = 0
+        for virt_id, phys_id in vmap.mapping.items():
+            if phys_id is None:
+                continue
+            if virt_id in vmap.comm_ids:
+                num_comm += 1
+            else:
+                num_mem += 1
+        return num_comm, num_mem
+
+    def is_comm_virt_id(self, pid: int, virt_id: int) -> bool:
+        return virt_id in self._process_mappings[pid].comm_ids
 
     def get_ehi(self) -> EhiNodeInfo:
         assert self._ehi is not None  # TODO: already enforce this in constructor?
@@ -79,8 +141,11 @@ class MemoryManager(Protocol):
     def add_process(self, process: QoalaProcess) -> None:
         self._processes[process.pid] = process
         unit_module = process.prog_instance.unit_module
+        all_ids = unit_module.get_all_qubit_ids()
         self._process_mappings[process.pid] = VirtualMapping(
-            unit_module, {x: None for x in unit_module.get_all_qubit_ids()}
+            unit_module,
+            {x: None for x in all_ids},
+            frozenset(x for x in all_ids if unit_module.is_communication(x)),
         )
 
     def get_process(self, pid: int) -> QoalaProcess:
@@ -89,10 +154,20 @@ class MemoryManager(Protocol):
     def get_all_program_ids(self) -> List[int]:
         return list(self._processes.keys())
 
+    def remove_process(self, pid: int) -> None:
+        # Free any qubits that the process did not free itself.
+        vmap = self._process_mappings[pid]
+        for virt_id, phys_id in vmap.mapping.items():
+            if phys_id is not None:
+                self.free(pid, virt_id)
+        del self._process_mappings[pid]
+        del self._processes[pid]
+
     def allocate(self, pid: int, virt_id: int) -> int:
         vmap = self._process_mappings[pid]
         # Check if the virtual ID is in the unit module
-        if virt_id not in vmap.unit_module.get_all_qubit_ids():
+        # (the mapping contains exactly the qubit IDs of the unit module)
+        if virt_id not in vmap.mapping:
             raise AllocError
 
         # Check whether this virt ID is already mapped to a physical qubit.
@@ -100,24 +175,50 @@ class MemoryManager(Protocol):
             raise AllocError
 
         phys_id: int
-        if vmap.unit_module.is_communication(virt_id):
+        if virt_id in vmap.comm_ids:
             phys_id = self._get_free_comm_phys_id()
+            heapq.heappop(self._free_comm)
         else:
             phys_id = self._get_free_mem_phys_id()
+            heapq.heappop(self._free_mem)
 
         # update mappings
         self._physical_mapping[phys_id] = VirtualLocation(
             pid, vmap.unit_module, virt_id
         )
         self._process_mappings[pid].mapping[virt_id] = phys_id
+        self._num_allocations += 1
         return phys_id
 
+    def can_allocate(self, pid: int, virt_ids: List[int]) -> bool:
+        """Check whether all given virtual qubits of a process could be allocated
+        at this moment, without actually allocating them.
+
+        This has no side effects (in particular, no signals are sent).
+
+        :param pid: ID of the process
+        :param virt_ids: virtual qubit IDs that would be allocated
+        :return: whether `allocate` would succeed for each of the virtual IDs
+        """
+        vmap = self._process_mappings[pid]
+        num_comm = 0
+        num_mem = 0
+        for virt_id in set(virt_ids):
+            # Same checks as in `allocate`.
+            if virt_id not in vmap.mapping:
+                return False
+            if vmap.mapping[virt_id] is not None:
+                return False
+            if virt_id in vmap.comm_ids:
+                num_comm += 1
+            else:
+                num_mem += 1
+        return num_comm <= len(self._free_comm) and num_mem <= len(self._free_mem)
+
     def allocate_comm(self, pid: int, virt_id: int) -> int:
         vmap = self._process_mappings[pid]
         # Check that the virt ID is indeed a (virtual) comm qubit.
-        if virt_id not in vmap.unit_module.get_all_qubit_ids():
-            raise AllocError
-        if not vmap.unit_module.is_communication(virt_id):
+        if virt_id not in vmap.comm_ids:
             raise AllocError
 
         return self.allocate(pid, virt_id)
@@ -125,7 +226,6 @@ class MemoryManager(Protocol):
     def free(self, pid: int, virt_id: int) -> None:
         vmap = self._process_mappings[pid]
         # Check if the virtual ID is in the unit module
-        assert virt_id in vmap.unit_module.get_all_qubit_ids()
         assert virt_id in vmap.mapping
 
         phys_id = vmap.mapping[virt_id]
@@ -135,6 +235,11 @@ class MemoryManager(Protocol):
         # update mappings
         self._physical_mapping[phys_id] = None
         vmap.mapping[virt_id] = None
+        if phys_id in self._comm_phys_ids:
+            heapq.heappush(self._free_comm, phys_id)
+        else:
+            heapq.heappush(self._free_mem, phys_id)
+        self._num_frees += 1
 
         # update netsquid memory
         self._qdevice.set_mem_pos_in_use(phys_id, False)
@@ -144,12 +249,9 @@ class MemoryManager(Protocol):
 
     def get_unmapped_non_comm_qubit(self, pid: int) -> int:
         """returns virt ID"""
-        vp_map = self._process_mappings[pid].mapping
-        unit_module = self._process_mappings[pid].unit_module
+        vmap = self._process_mappings[pid]
         free_ids = [
-            v
-            for v, p in vp_map.items()
-            if p is None and not unit_module.is_communication(v)
+            v for v, p in vmap.mapping.items() if p is None and v not in vmap.comm_ids
         ]
         if len(free_ids) == 0:
             raise AllocError
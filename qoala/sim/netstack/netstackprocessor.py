@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import logging
 from copy import deepcopy
 from typing import Any, Dict, Generator, List, Optional
@@ -33,6 +35,11 @@ class NetstackProcessor:
 
         self._current_routine: Optional[RunningRequestRoutine] = None
 
+    def copy(self) -> NetstackProcessor:
+        """Create a processor that shares the interface and latencies of this one,
+        but has its own state, so that it can be active while this one is."""
+        return NetstackProcessor(self._interface, self._latencies)
+
     def _prog_mem(self) -> ProgramMemory:
         # May only be called when processor is active
         assert self._current_prog_mem is not None
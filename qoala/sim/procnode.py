@@ -9,7 +9,7 @@ from netsquid.protocols import Protocol
 from qoala.lang.ehi import EhiNetworkInfo, EhiNodeInfo
 from qoala.runtime.lhi import LhiLatencies, LhiTopology
 from qoala.runtime.lhi_to_ehi import LhiConverter, NtfInterface
-from qoala.runtime.program import BatchInfo, ProgramBatch
+from qoala.runtime.program import BatchInfo, ProgramBatch, StreamInfo
 from qoala.sim.host.host import Host
 from qoala.sim.host.hostcomp import HostComponent
 from qoala.sim.host.hostinterface import HostLatencies
@@ -40,6 +40,15 @@ class ProcNode(Protocol):
         deterministic_scheduler: bool = True,
         use_deadlines: bool = True,
         is_predictable: bool = False,
+        retire_finished: bool = False,
+        scheduling_policy: str = "edf",
+        num_cpu_cores: int = 1,
+        num_qpu_lanes: int = 1,
+        admission_control: bool = False,
+        timebin_lookahead: bool = False,
+        pair_range_tasks: bool = False,
+        per_qubit_durations: bool = False,
+        wfq_weights: Optional[Dict[str, Dict[int, float]]] = None,
     ) -> None:
         """ProcNode constructor.
 
@@ -67,7 +76,7 @@ class ProcNode(Protocol):
         self._asynchronous = asynchronous
 
         # Create internal components.
-        self._qdevice: QDevice = QDevice(self._node, qdevice_topology)
+        self._qdevice: QDevice = QDevice(self._node, qdevice_topology, num_qpu_lanes)
         self._local_ehi: EhiNodeInfo = LhiConverter.to_ehi(
             qdevice_topology, ntf_interface, latencies
         )
@@ -118,6 +127,15 @@ class ProcNode(Protocol):
                 deterministic_scheduler,
                 use_deadlines,
                 is_predictable,
+                retire_finished,
+                scheduling_policy,
+                num_cpu_cores,
+                num_qpu_lanes,
+                admission_control,
+                timebin_lookahead,
+                pair_range_tasks,
+                per_qubit_durations,
+                wfq_weights,
             )
         else:
             self._scheduler = scheduler
@@ -243,6 +261,9 @@ class ProcNode(Protocol):
     def submit_batch(self, batch_info: BatchInfo) -> ProgramBatch:
         return self.scheduler.submit_batch(batch_info)
 
+    def submit_stream(self, stream_info: StreamInfo) -> int:
+        return self.scheduler.submit_stream(stream_info)
+
     def initialize_processes(
         self,
         remote_pids: Optional[Dict[int, List[int]]] = None,
@@ -7,8 +7,9 @@ from netsquid.components.qprogram import QuantumProgram
 from netsquid.nodes import Node
 from netsquid.qubits.qubit import Qubit
 
-from pydynaa import EventExpression
+from pydynaa import Entity, EventExpression
 from qoala.runtime.lhi import LhiTopology
+from qoala.sim.events import EVENT_QDEVICE_IDLE
 
 
 class UnsupportedQDeviceCommandError(Exception):
@@ -26,11 +27,28 @@ class QDeviceCommand:
     angle: Optional[float] = None
 
 
+class QDeviceIdleNotifier(Entity):
+    """Source of the events that wake up commands waiting for the QDevice."""
+
+    def notify_idle(self) -> None:
+        self._schedule_now(EVENT_QDEVICE_IDLE)
+
+
 class QDevice:
-    def __init__(self, node: Node, topology: LhiTopology) -> None:
+    def __init__(self, node: Node, topology: LhiTopology, num_lanes: int = 1) -> None:
         self._node = node
         self._topology = topology
 
+        # The QuantumProcessor executes one program at a time. With a single QPU
+        # lane, commands are never executed concurrently, and the processor raises
+        # an error if it is busy anyway. When routines are executed concurrently
+        # (on multiple QPU lanes), commands that arrive while a program is
+        # executing wait until the processor is idle.
+        self._num_lanes = num_lanes
+        self._executing: bool = False
+        self._num_waiting: int = 0
+        self._idle_notifier = QDeviceIdleNotifier()
+
     @property
     def qprocessor(self) -> QuantumProcessor:
         """Get the NetSquid `QuantumProcessor` object of this node."""
@@ -129,7 +147,11 @@ class QDevice:
                 prog.apply(cmd.instr, qubit_indices=cmd.indices, angle=cmd.angle)
             else:
                 prog.apply(cmd.instr, qubit_indices=cmd.indices)
-        yield self.qprocessor.execute_program(prog)
+
+        if self._num_lanes == 1:
+            yield self.qprocessor.execute_program(prog)
+        else:
+            yield from self._execute_queued(prog)
 
         last_result = prog.output["last"]
         if last_result is not None:
@@ -137,6 +159,27 @@ class QDevice:
             return meas_outcome
         return None
 
+    def _execute_queued(
+        self, prog: QuantumProgram
+    ) -> Generator[EventExpression, None, None]:
+        # Execute the program once no other program is executing.
+        while self._executing:
+            self._num_waiting += 1
+            yield EventExpression(
+                source=self._idle_notifier, event_type=EVENT_QDEVICE_IDLE
+            )
+            self._num_waiting -= 1
+
+        self._executing = True
+        try:
+            yield self.qprocessor.execute_program(prog)
+        finally:
+            # Also when the program fails, or the generator is closed, so that
+            # waiting programs are not blocked forever.
+            self._executing = False
+            if self._num_waiting > 0:
+                self._idle_notifier.notify_idle()
+
     def execute_program(
         self, prog: QuantumProgram
     ) -> Generator[EventExpression, None, None]:
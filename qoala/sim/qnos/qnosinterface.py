@@ -3,7 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Generator
 
-from pydynaa import EventExpression
+from pydynaa import EventExpression, EventType
 from qoala.runtime.message import Message
 from qoala.sim.componentprot import ComponentProtocol, PortListener
 from qoala.sim.events import (
@@ -67,7 +67,11 @@ class QnosInterface(ComponentProtocol):
     def memmgr(self) -> MemoryManager:
         return self._memmgr
 
-    def wait(self, delta_time: float) -> Generator[EventExpression, None, None]:
-        self._schedule_after(delta_time, EVENT_WAIT)
-        event_expr = EventExpression(source=self, event_type=EVENT_WAIT)
+    def wait(
+        self, delta_time: float, event_type: EventType = EVENT_WAIT
+    ) -> Generator[EventExpression, None, None]:
+        # Waits that may overlap in time (e.g. on different QPU lanes) must use
+        # different event types, since any event of the awaited type ends a wait.
+        self._schedule_after(delta_time, event_type)
+        event_expr = EventExpression(source=self, event_type=event_type)
         yield event_expr
@@ -24,10 +24,11 @@ from netsquid.components.instructions import (
 )
 from netsquid.components.instructions import Instruction as NsInstr
 
-from pydynaa import EventExpression
+from pydynaa import EventExpression, EventType
 from qoala.lang.routine import LocalRoutine
 from qoala.runtime.memory import ProgramMemory, RunningLocalRoutine
 from qoala.runtime.sharedmem import MemAddr
+from qoala.sim.events import EVENT_WAIT
 from qoala.sim.memmgr import NotAllocatedError
 from qoala.sim.process import QoalaProcess
 from qoala.sim.qdevice import QDevice, QDeviceCommand
@@ -48,10 +49,14 @@ class QnosProcessor:
         interface: QnosInterface,
         latencies: QnosLatencies,
         asynchronous: bool = False,
+        wait_event: EventType = EVENT_WAIT,
     ) -> None:
         self._interface = interface
         self._latencies = latencies
         self._asynchronous = asynchronous
+        # Event type used for simulating durations. Qnos processors that execute
+        # routines concurrently must each use their own event type.
+        self._wait_event = wait_event
 
         # TODO: rewrite
         self._name = f"{interface.name}_QnosProcessor"
@@ -65,6 +70,16 @@ class QnosProcessor:
 
         self._current_routine: Optional[RunningLocalRoutine] = None
 
+    def copy_with_wait_event(self, wait_event: EventType) -> QnosProcessor:
+        """Create a processor of the same type that shares the interface and
+        latencies of this one, but can execute routines concurrently with it."""
+        return self.__class__(
+            self._interface, self._latencies, self._asynchronous, wait_event
+        )
+
+    def wait(self, delta_time: float) -> Generator[EventExpression, None, None]:
+        yield from self._interface.wait(delta_time, self._wait_event)
+
     def _prog_mem(self) -> ProgramMemory:
         # May only be called when processor is active
         assert self._current_prog_mem is not None
@@ -255,7 +270,7 @@ class QnosProcessor:
         qnos_mem = self._prog_mem().qnos_mem
 
         # Simulate instruction duration.
-        yield from self._interface.wait(self._latencies.qnos_instr_time)
+        yield from self.wait(self._latencies.qnos_instr_time)
 
         qnos_mem.set_reg_value(instr.reg, instr.imm.value)
         return None
@@ -283,7 +298,7 @@ class QnosProcessor:
         )
 
         # Simulate instruction duration.
-        yield from self._interface.wait(self._latencies.qnos_instr_time)
+        yield from self.wait(self._latencies.qnos_instr_time)
 
         shared_mem.write_lr_out(result_addr, [value], offset=index)
 
@@ -314,7 +329,7 @@ class QnosProcessor:
         )
 
         # Simulate instruction duration.
-        yield from self._interface.wait(self._latencies.qnos_instr_time)
+        yield from self.wait(self._latencies.qnos_instr_time)
 
         qnos_mem.set_reg_value(instr.reg, value)
         return None
@@ -328,7 +343,7 @@ class QnosProcessor:
         )
 
         # Simulate instruction duration.
-        yield from self._interface.wait(self._latencies.qnos_instr_time)
+        yield from self.wait(self._latencies.qnos_instr_time)
 
         qnos_mem.set_reg_value(instr.reg, instr.address.address)
         return None
@@ -360,7 +375,7 @@ class QnosProcessor:
             condition = True
 
         # Simulate instruction duration.
-        yield from self._interface.wait(self._latencies.qnos_instr_time)
+        yield from self.wait(self._latencies.qnos_instr_time)
         if condition:
             jump_address = instr.line
             self._logger.debug(
@@ -401,7 +416,7 @@ class QnosProcessor:
         )
 
         # Simulate instruction duration.
-        yield from self._interface.wait(self._latencies.qnos_instr_time)
+        yield from self.wait(self._latencies.qnos_instr_time)
 
         qnos_mem.set_reg_value(instr.regout, value)
         return None
@@ -1,10 +1,24 @@
 from __future__ import annotations
 
+import heapq
 import logging
-import random
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Any, Dict, Generator, List, Optional, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Container,
+    Deque,
+    Dict,
+    FrozenSet,
+    Generator,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import netsquid as ns
 from netqasm.lang.operand import Template
@@ -20,40 +34,88 @@ from qoala.lang.ehi import (
     EhiNetworkTimebin,
     EhiNodeInfo,
 )
-from qoala.lang.hostlang import BasicBlockType, ReceiveCMsgOp
+from qoala.lang.hostlang import (
+    BasicBlock,
+    BasicBlockType,
+    ReceiveCMsgOp,
+    RunRequestOp,
+    RunSubroutineOp,
+)
+from qoala.lang.request import RequestVirtIdMapping
+from qoala.runtime.admission import AdmissionController, QubitDemand
 from qoala.runtime.memory import ProgramMemory
 from qoala.runtime.message import Message
+from qoala.runtime.policy import SchedulingPolicy, build_scheduling_policy
 from qoala.runtime.program import (
     BatchInfo,
     BatchResult,
     ProgramBatch,
+    ProgramInput,
     ProgramInstance,
+    ProgramInstanceRecord,
     ProgramResult,
+    StreamInfo,
+    StreamStatistics,
 )
 from qoala.runtime.statistics import SchedulerStatistics
 from qoala.runtime.task import (
     HostEventTask,
     LocalRoutineTask,
     MultiPairTask,
+    PairRangeTask,
     ProcessorType,
     QoalaTask,
     SinglePairTask,
+    TaskDurationEstimator,
     TaskGraph,
     TaskGraphFromBlockBuilder,
     TaskInfo,
 )
 from qoala.sim.driver import CpuDriver, Driver, QpuDriver, SharedSchedulerMemory
 from qoala.sim.eprsocket import EprSocket
-from qoala.sim.events import EVENT_WAIT, SIGNAL_MEMORY_FREED, SIGNAL_TASK_COMPLETED
+from qoala.sim.events import (
+    EVENT_CORE_ASSIGN,
+    EVENT_WAIT,
+    SIGNAL_CORE_IDLE,
+    SIGNAL_MEMORY_FREED,
+    SIGNAL_TASK_COMPLETED,
+)
 from qoala.sim.host.csocket import ClassicalSocket
 from qoala.sim.host.host import Host
 from qoala.sim.host.hostinterface import HostInterface
-from qoala.sim.memmgr import AllocError, MemoryManager
+from qoala.sim.memmgr import MemoryManager
 from qoala.sim.netstack import Netstack
 from qoala.sim.process import QoalaProcess
 from qoala.sim.qnos import Qnos
 from qoala.util.logging import LogManager
 
+# Pseudo qubit ID that stands for the network stack, which can be used by only one
+# task at a time.
+NETSTACK_QUBIT_ID = -1
+
+
+class _NotReady:
+    """
+    Tasks that cannot be executed now: the tasks in any of the given containers,
+    and the tasks for which any of the given predicates holds. Only membership is
+    tested, so schedulers never build the set of all such tasks; a policy only
+    pays for the tasks it inspects.
+    """
+
+    def __init__(
+        self,
+        containers: List[Container[int]],
+        predicates: Optional[List[Callable[[int], bool]]] = None,
+    ) -> None:
+        self._containers = containers
+        self._predicates = predicates if predicates is not None else []
+
+    def __contains__(self, tid: object) -> bool:
+        if any(tid in c for c in self._containers):
+            return True
+        assert isinstance(tid, int)
+        return any(p(tid) for p in self._predicates)
+
 
 class NodeSchedulerComponent(Component):
     """
@@ -132,6 +194,15 @@ class NodeScheduler(Protocol):
         deterministic: bool = True,
         use_deadlines: bool = True,
         is_predictable: bool = False,
+        retire_finished: bool = False,
+        scheduling_policy: str = "edf",
+        num_cpu_cores: int = 1,
+        num_qpu_lanes: int = 1,
+        admission_control: bool = False,
+        timebin_lookahead: bool = False,
+        pair_range_tasks: bool = False,
+        per_qubit_durations: bool = False,
+        wfq_weights: Optional[Dict[str, Dict[int, float]]] = None,
     ) -> None:
         super().__init__(name=f"{node_name}_scheduler")
 
@@ -161,13 +232,36 @@ class NodeScheduler(Protocol):
         self._prog_end_timestamps: Dict[int, float] = {}  # program ID -> end time
 
         self._current_block_index: Dict[int, int] = {}  # program ID -> block index
-        self._task_from_block_builder = TaskGraphFromBlockBuilder()
+        self._task_from_block_builder = TaskGraphFromBlockBuilder(pair_range_tasks)
         self._prog_instance_dependency: Dict[
             int, int
         ] = {}  # program ID -> dependent program ID
-
-        self._last_cpu_task_pid = -1
-        self._last_qpu_task_pid = -1
+        # program ID -> IDs of the program instances that depend on it
+        self._prog_instance_dependents: Dict[int, List[int]] = {}
+        # Program instances whose next block may have become schedulable since the
+        # last call to `schedule_all()`: new instances, and instances of which the
+        # instance they depend on has finished.
+        self._dirty_pids: Set[int] = set()
+
+        # If True, processes are released as soon as they have finished, and only
+        # a compact record of their results is kept.
+        self._retire_finished = retire_finished
+        # program ID -> record
+        self._prog_records: Dict[int, ProgramInstanceRecord] = {}
+
+        self._streams: Dict[int, ProgramInstanceStream] = {}  # stream ID -> stream
+        # live program ID -> stream it belongs to
+        self._pid_stream: Dict[int, ProgramInstanceStream] = {}
+        # live program ID -> arrival time
+        self._arrival_times: Dict[int, float] = {}
+
+        # If enabled, quantum blocks are only released when the qubits they need
+        # are available (see `AdmissionController`).
+        self._admission: Optional[AdmissionController] = None
+        if admission_control:
+            self._admission = AdmissionController(
+                self._free_qubits, self._allocated_qubits
+            )
 
         scheduler_memory = SharedSchedulerMemory()
         netschedule = network_ehi.network_schedule
@@ -177,6 +271,12 @@ class NodeScheduler(Protocol):
         # TODO: refactor
         node_id = self.host._comp.node_id
 
+        # Flows of batches and streams are (kind, ID); see `_register_flow`.
+        flow_weights: Dict[Hashable, float] = {}
+        for kind, weights in (wfq_weights or {}).items():
+            for flow_id, weight in weights.items():
+                flow_weights[(kind, flow_id)] = weight
+
         cpudriver = CpuDriver(node_name, scheduler_memory, host.processor, memmgr)
         self._cpu_scheduler = CpuEdfScheduler(
             f"{node_name}_cpu",
@@ -186,6 +286,10 @@ class NodeScheduler(Protocol):
             host.interface,
             deterministic,
             use_deadlines,
+            build_scheduling_policy(
+                scheduling_policy, deterministic, use_deadlines, flow_weights
+            ),
+            num_cpu_cores,
         )
 
         qpudriver = QpuDriver(
@@ -204,6 +308,12 @@ class NodeScheduler(Protocol):
             netschedule,
             deterministic,
             use_deadlines,
+            build_scheduling_policy(
+                scheduling_policy, deterministic, use_deadlines, flow_weights
+            ),
+            num_qpu_lanes,
+            timebin_lookahead,
+            per_qubit_durations,
         )
 
         self._comp = NodeSchedulerComponent(
@@ -240,6 +350,17 @@ class NodeScheduler(Protocol):
     def qpu_scheduler(self) -> ProcessorScheduler:
         return self._qpu_scheduler
 
+    @property
+    def admission_controller(self) -> Optional[AdmissionController]:
+        return self._admission
+
+    def _free_qubits(self) -> QubitDemand:
+        return QubitDemand(self.memmgr.num_free_comm, self.memmgr.num_free_mem)
+
+    def _allocated_qubits(self, pid: int) -> QubitDemand:
+        num_comm, num_mem = self.memmgr.num_allocated(pid)
+        return QubitDemand(num_comm, num_mem)
+
     def submit_batch(self, batch_info: BatchInfo) -> ProgramBatch:
         prog_instances: List[ProgramInstance] = []
 
@@ -254,6 +375,7 @@ class NodeScheduler(Protocol):
             )
             self._prog_instance_counter += 1
             prog_instances.append(instance)
+            self._register_flow(pid, ("batch", self._batch_counter))
 
         batch = ProgramBatch(
             batch_id=self._batch_counter, info=batch_info, instances=prog_instances
@@ -262,9 +384,86 @@ class NodeScheduler(Protocol):
         self._batch_counter += 1
         return batch
 
+    def _register_flow(self, pid: int, flow: Tuple[str, int]) -> None:
+        # Let the scheduling policies know which batch or stream a pid belongs to.
+        self._cpu_scheduler.policy.register_program_instance(pid, flow)
+        self._qpu_scheduler.policy.register_program_instance(pid, flow)
+
     def get_batches(self) -> Dict[int, ProgramBatch]:
         return self._batches
 
+    def submit_stream(self, stream_info: StreamInfo) -> int:
+        """
+        Submit a stream of program instances. Program instances of the stream are
+        created and scheduled when they arrive (after the node scheduler has been
+        started), and are retired as soon as they have completed.
+
+        :param stream_info: description of the stream
+        :return: ID of the stream
+        """
+        assert not self._is_predictable, "streams require dynamic scheduling"
+        stream_id = len(self._streams)
+        self._streams[stream_id] = ProgramInstanceStream(stream_id, stream_info, self)
+        return stream_id
+
+    def get_stream_records(self, stream_id: int) -> List[ProgramInstanceRecord]:
+        """
+        Get the records of all program instances of the given stream that have
+        completed so far, in order of completion.
+
+        :param stream_id: ID of the stream
+        :return: List of program instance records.
+        """
+        stream = self._streams[stream_id]
+        return [self._prog_records[pid] for pid in stream.finished_pids]
+
+    def get_stream_statistics(self, stream_id: int) -> StreamStatistics:
+        """
+        Get aggregated results of all program instances of the given stream that
+        have completed so far, including those of which the record was dropped
+        (see `StreamInfo.max_records`).
+
+        :param stream_id: ID of the stream
+        :return: Statistics of the stream.
+        """
+        return self._streams[stream_id].statistics
+
+    def forget_program_instance(self, pid: int) -> None:
+        """
+        Drop the record of a retired program instance.
+
+        :param pid: program instance id
+        :return: None
+        """
+        del self._prog_records[pid]
+
+    def admit_program_instance(
+        self, stream: ProgramInstanceStream, inputs: ProgramInput, arrival_time: float
+    ) -> int:
+        """
+        Create a program instance for the given stream, create its process and
+        schedule its first block.
+
+        :param stream: stream the program instance belongs to
+        :param inputs: inputs of the program instance
+        :param arrival_time: time at which the program instance arrived
+        :return: pid of the new program instance
+        """
+        pid = self._prog_instance_counter
+        self._prog_instance_counter += 1
+        prog_instance = ProgramInstance(
+            pid=pid,
+            program=stream.info.program,
+            inputs=inputs,
+            unit_module=stream.info.unit_module,
+        )
+        self.submit_program_instance(prog_instance)
+        self._register_flow(pid, ("stream", stream.stream_id))
+        self._pid_stream[pid] = stream
+        self._arrival_times[pid] = arrival_time
+        self.schedule_next_for(pid)
+        return pid
+
     def create_process(
         self, prog_instance: ProgramInstance, remote_pid: Optional[int] = None
     ) -> QoalaProcess:
@@ -315,41 +514,59 @@ class NodeScheduler(Protocol):
                 self.initialize_process(process)
                 self._current_block_index[prog_instance.pid] = 0
                 if linear:
-                    self._prog_instance_dependency[
-                        prog_instance.pid
-                    ] = prev_prog_instance_id
+                    self._set_dependency(prog_instance.pid, prev_prog_instance_id)
                     prev_prog_instance_id = prog_instance.pid
                 else:
-                    self._prog_instance_dependency[prog_instance.pid] = -1
+                    self._set_dependency(prog_instance.pid, -1)
+
+    def _set_dependency(self, pid: int, dependency_pid: int) -> None:
+        # Program instance `pid` can only start once `dependency_pid` has finished
+        # (-1 for no dependency).
+        self._prog_instance_dependency[pid] = dependency_pid
+        if dependency_pid != -1:
+            self._prog_instance_dependents.setdefault(dependency_pid, []).append(pid)
+        self._dirty_pids.add(pid)
+
+    def _is_blocked_on_dependency(self, pid: int) -> bool:
+        dependency_pid = self._prog_instance_dependency[pid]
+        if dependency_pid == -1 or dependency_pid in self._prog_records:
+            return False
+        return not self.is_program_instance_finished(dependency_pid)
 
     def collect_timestamps(self, batch_id: int) -> List[Optional[Tuple[float, float]]]:
         batch = self._batches[batch_id]
         timestamps: List[Optional[Tuple[float, float]]] = []
         for prog_instance in batch.instances:
-            process = self.memmgr.get_process(prog_instance.pid)
-            cpu_start_end = self.cpu_scheduler.get_timestamps(process.pid)
-            if cpu_start_end is None:
-                timestamps.append(None)
-                continue
-
-            cpu_start, cpu_end = cpu_start_end
-            qpu_start_end = self.qpu_scheduler.get_timestamps(process.pid)
-            # QPU timestamps could be None (if program did not have any quantum tasks)
-            if qpu_start_end is not None:
-                qpu_start, qpu_end = qpu_start_end
-                start = min(cpu_start, qpu_start)
-                end = max(cpu_end, qpu_end)
-                timestamps.append((start, end))
+            pid = prog_instance.pid
+            if pid in self._prog_records:
+                timestamps.append(self._prog_records[pid].timestamps)
             else:
-                timestamps.append((cpu_start, cpu_end))
+                timestamps.append(self._get_timestamps(pid))
         return timestamps
 
+    def _get_timestamps(self, pid: int) -> Optional[Tuple[float, float]]:
+        cpu_start_end = self.cpu_scheduler.get_timestamps(pid)
+        if cpu_start_end is None:
+            return None
+
+        cpu_start, cpu_end = cpu_start_end
+        qpu_start_end = self.qpu_scheduler.get_timestamps(pid)
+        # QPU timestamps could be None (if program did not have any quantum tasks)
+        if qpu_start_end is not None:
+            qpu_start, qpu_end = qpu_start_end
+            return min(cpu_start, qpu_start), max(cpu_end, qpu_end)
+        else:
+            return cpu_start, cpu_end
+
     def collect_batch_results(self) -> None:
         for batch_id, batch in self._batches.items():
             results: List[ProgramResult] = []
             for prog_instance in batch.instances:
-                process = self.memmgr.get_process(prog_instance.pid)
-                results.append(process.result)
+                pid = prog_instance.pid
+                if pid in self._prog_records:
+                    results.append(self._prog_records[pid].result)
+                else:
+                    results.append(self.memmgr.get_process(pid).result)
             timestamps = self.collect_timestamps(batch_id)
             self._batch_results[batch_id] = BatchResult(batch_id, results, timestamps)
 
@@ -382,21 +599,22 @@ class NodeScheduler(Protocol):
         if not self._is_predictable:
             super().start()
             self.schedule_all()
+            for stream in self._streams.values():
+                stream.start()
 
     def stop(self) -> None:
+        for stream in self._streams.values():
+            stream.stop()
         self._qpu_scheduler.stop()
         self._cpu_scheduler.stop()
         super().stop()
 
     def run(self) -> Generator[EventExpression, None, None]:
         while True:
-            if (
-                self._last_cpu_task_pid != -1
-                and self.is_program_instance_finished(self._last_cpu_task_pid)
-            ) or (
-                self._last_qpu_task_pid != -1
-                and self.is_program_instance_finished(self._last_qpu_task_pid)
-            ):
+            if self._admission is not None:
+                # Blocks that were held back may be admitted now.
+                self._dirty_pids.update(self._admission.waiting_pids)
+            if len(self._dirty_pids) > 0:
                 self.schedule_all()
             ev_expr = self.await_signal(self._cpu_scheduler, SIGNAL_TASK_COMPLETED)
             ev_expr = ev_expr | self.await_signal(
@@ -404,27 +622,26 @@ class NodeScheduler(Protocol):
             )
             yield ev_expr
 
-            now = ns.sim_time()
-
-            # Gets the pid of the last finished task at the current time,
-            # if there is no task that is finished at the current time, it returns -1
-            self._last_cpu_task_pid = self.cpu_scheduler.get_last_finished_task_pid_at(
-                now
-            )
-            # If there is a task that is finished at the current time, assign the next
-            if self._last_cpu_task_pid != -1:
-                self.schedule_next_for(self._last_cpu_task_pid)
-
-            self._last_qpu_task_pid = self.qpu_scheduler.get_last_finished_task_pid_at(
-                now
+            # Every program instance that finished a task may continue with its
+            # next block, also if several finished a task at the same time.
+            finished_pids = (
+                self.cpu_scheduler.take_pids_with_finished_tasks()
+                | self.qpu_scheduler.take_pids_with_finished_tasks()
             )
-            # If there is a task that is finished at the current time, assign the next, but we do not need to assign
-            # again if it is the same pid as the one that came from CPU
-            if (
-                self._last_qpu_task_pid != -1
-                and self._last_qpu_task_pid != self._last_cpu_task_pid
-            ):
-                self.schedule_next_for(self._last_qpu_task_pid)
+            self._dirty_pids.update(finished_pids)
+            if self._admission is not None:
+                for pid in finished_pids:
+                    if self._is_block_completed(pid):
+                        # Its qubits are no longer reserved for the block.
+                        self._admission.release(pid)
+
+            for pid in sorted(finished_pids):
+                if pid not in self._current_block_index:
+                    continue  # already retired
+                # Program instances of streams are always retired.
+                if self._retire_finished or pid in self._pid_stream:
+                    if self.is_program_instance_completed(pid):
+                        self.retire_program_instance(pid)
 
     def schedule_next_for(self, pid: int) -> None:
         """
@@ -435,6 +652,7 @@ class NodeScheduler(Protocol):
         :param pid: program instance id
         :return: None
         """
+        self._dirty_pids.discard(pid)
         new_cpu_tasks, new_qpu_tasks = self.find_next_tasks_for(pid)
 
         # If there are new tasks, send a message to schedulers
@@ -448,31 +666,34 @@ class NodeScheduler(Protocol):
 
     def schedule_all(self) -> None:
         """
-        Schedules the tasks of the next block for each available program instance in the memory manager
-        by assigning respective tasks to CPU and QPU schedulers and sends a message
-        to schedulers for informing them about the newly assigned tasks.
+        Schedules the tasks of the next block for each available program instance whose
+        state changed since the previous call (see `_dirty_pids`) by assigning respective
+        tasks to CPU and QPU schedulers and sends a message to schedulers for informing
+        them about the newly assigned tasks.
 
-        This method is responsible for scheduling tasks for each available program instance in the memory manager.
         A program instance is considered available if it meets two conditions:
         1. It is not finished.
         2. It does not have any dependencies on an unfinished program instance
         (it can have such dependencies if the batch of program instances are submitted to run linearly).
+        Program instances that are not available because of their dependency are
+        considered again when the instance they depend on has finished.
 
         :return: None
         """
         all_new_cpu_tasks: Dict[int, TaskInfo] = {}
         all_new_qpu_tasks: Dict[int, TaskInfo] = {}
 
-        for pid in self.memmgr.get_all_program_ids():
+        dirty_pids = sorted(self._dirty_pids)
+        if self._admission is not None:
+            # Blocks that were held back first, in order of their deadline.
+            dirty_pids = self._admission.order(dirty_pids)
+        self._dirty_pids = set()
+        for pid in dirty_pids:
+            if pid not in self._current_block_index:
+                continue  # retired
             # If there is a dependency, check if it is finished
-            dependency_pid = self._prog_instance_dependency[pid]
-            if dependency_pid != -1:
-                dep_cur_index = self._current_block_index[dependency_pid]
-                dep_block_length = len(
-                    self.memmgr.get_process(dependency_pid).prog_instance.program.blocks
-                )
-                if dep_cur_index < dep_block_length:
-                    continue
+            if self._is_blocked_on_dependency(pid):
+                continue
 
             # Note that find_next_tasks_for() returns None if there are no new tasks for that processor
             new_cpu_tasks, new_qpu_tasks = self.find_next_tasks_for(pid)
@@ -519,7 +740,9 @@ class NodeScheduler(Protocol):
         is_program_finished = current_block_index >= len(blocks)
         # If program is finished or CPU scheduler has a task for this pid, do not schedule
         # Note that for all block types, there will be tasks for CPU scheduler
-        if is_program_finished or self.cpu_scheduler.task_exists_for_pid(pid):
+        if self.cpu_scheduler.task_exists_for_pid(pid):
+            return None, None
+        if is_program_finished:
             return None, None
 
         block = prog_instance.program.blocks[current_block_index]
@@ -529,27 +752,104 @@ class NodeScheduler(Protocol):
             BasicBlockType.CL,
             BasicBlockType.CC,
         }:
+            if self._admission is not None:
+                self._admission.block_released(pid, block.name, ns.sim_time())
             graph = self._task_from_block_builder.build(
                 prog_instance, current_block_index, self._network_ehi
             )
             new_cpu_tasks.update(graph.get_tasks())
 
-            self._current_block_index[pid] += 1
+            self._advance_block(pid)
             # If scheduler does not have any task send a message to wake it up
             self._comp.send_cpu_scheduler_message(Message(-1, -1, "New Task"))
             return new_cpu_tasks, None
         elif not self.qpu_scheduler.task_exists_for_pid(pid):
             # Note that we know that cpu does not have any tasks for this pid
-            graph = self._task_from_block_builder.build(
+            if self._admission is not None and not self._admission.try_admit(
+                pid,
+                block.name,
+                self._block_qubit_demand(pid, block),
+                ns.sim_time(),
+                block.deadlines,
+            ):
+                # Held back until enough qubits are available.
+                return None, None
+            builder = self._task_from_block_builder
+            cpu_graph, qpu_graph = builder.build_partial_graphs(
                 prog_instance, current_block_index, self._network_ehi
             )
-            new_cpu_tasks.update(graph.partial_graph(ProcessorType.CPU).get_tasks())
-            new_qpu_tasks.update(graph.partial_graph(ProcessorType.QPU).get_tasks())
+            new_cpu_tasks.update(cpu_graph.get_tasks())
+            new_qpu_tasks.update(qpu_graph.get_tasks())
 
-            self._current_block_index[pid] += 1
+            self._advance_block(pid)
 
         return new_cpu_tasks, new_qpu_tasks
 
+    def _block_qubit_demand(self, pid: int, block: BasicBlock) -> QubitDemand:
+        """
+        Computes the number of qubits that the given quantum block of the program
+        instance with given pid still needs to allocate: the virtual qubits that its
+        routines use (including the EPR pairs and callback of a request routine)
+        and that are not allocated yet.
+
+        :param pid: program instance id
+        :param block: QL or QC block
+        :return: Number of communication and memory qubits to allocate.
+        """
+        process = self.memmgr.get_process(pid)
+        prog_input = process.prog_instance.inputs.values
+        assert len(block.instructions) == 1
+        instr = block.instructions[0]
+
+        virt_ids: Set[int] = set()
+        if block.typ == BasicBlockType.QL:
+            assert isinstance(instr, RunSubroutineOp)
+            routine = process.get_local_routine(instr.subroutine)
+            virt_ids.update(routine.metadata.qubit_use)
+        else:
+            assert isinstance(instr, RunRequestOp)
+            req_routine = process.get_request_routine(instr.req_routine)
+            request = req_routine.request
+
+            # Templates are only instantiated when the routine is executed.
+            num_pairs = request.num_pairs
+            if isinstance(num_pairs, Template):
+                num_pairs = prog_input[num_pairs.name]
+            mapping = request.virt_ids
+            if isinstance(mapping.single_value, Template):
+                mapping = RequestVirtIdMapping(
+                    mapping.typ,
+                    prog_input[mapping.single_value.name],
+                    mapping.custom_values,
+                )
+            virt_ids.update(mapping.get_id(i) for i in range(num_pairs))
+
+            if req_routine.callback is not None:
+                callback = process.get_local_routine(req_routine.callback)
+                virt_ids.update(callback.metadata.qubit_use)
+
+        num_comm = 0
+        num_mem = 0
+        for virt_id in virt_ids:
+            if self.memmgr.phys_id_for(pid, virt_id) is not None:
+                continue
+            if self.memmgr.is_comm_virt_id(pid, virt_id):
+                num_comm += 1
+            else:
+                num_mem += 1
+        return QubitDemand(num_comm, num_mem)
+
+    def _is_block_completed(self, pid: int) -> bool:
+        # All tasks of the last released block of the program instance have finished.
+        cpu, qpu = self.cpu_scheduler, self.qpu_scheduler
+        return not cpu.task_exists_for_pid(pid) and not qpu.task_exists_for_pid(pid)
+
+    def _advance_block(self, pid: int) -> None:
+        self._current_block_index[pid] += 1
+        if self.is_program_instance_finished(pid):
+            # Program instances that depend on this one can start now.
+            self._dirty_pids.update(self._prog_instance_dependents.get(pid, []))
+
     def upload_task_graph(self, graph: TaskGraph) -> None:
         """
         Assigns tasks in the given task graph to the CPU and QPU schedulers.
@@ -564,10 +864,75 @@ class NodeScheduler(Protocol):
         self._qpu_scheduler.upload_task_graph(qpu_graph)
 
     def is_program_instance_finished(self, pid: int) -> bool:
+        if pid in self._prog_records:
+            return True
         return self._current_block_index[pid] >= len(
             self.memmgr.get_process(pid).prog_instance.program.blocks
         )
 
+    def is_program_instance_completed(self, pid: int) -> bool:
+        """
+        Checks whether all tasks of the program instance with given pid have been
+        executed, i.e. all of its blocks have been scheduled (and no jump back is
+        pending) and neither processor scheduler has any tasks left for it.
+
+        :param pid: program instance id
+        :return: True if the program instance has completed, False otherwise.
+        """
+        if pid in self._prog_records:
+            return True
+        jumps = self.host.interface.program_instance_jumps
+        if jumps.get(pid, -1) != -1:
+            return False
+        return (
+            self.is_program_instance_finished(pid)
+            and not self.cpu_scheduler.task_exists_for_pid(pid)
+            and not self.qpu_scheduler.task_exists_for_pid(pid)
+        )
+
+    def retire_program_instance(self, pid: int) -> ProgramInstanceRecord:
+        """
+        Releases all state of the completed program instance with given pid
+        (its process, including its memory, and any per-task bookkeeping of the
+        processor schedulers), and keeps only a compact record of its result
+        and start and end timestamps.
+
+        :param pid: program instance id
+        :return: The record of the retired program instance.
+        """
+        assert self.is_program_instance_completed(pid)
+        if pid in self._prog_records:
+            return self._prog_records[pid]
+
+        process = self.memmgr.get_process(pid)
+        record = ProgramInstanceRecord(
+            pid,
+            process.result,
+            self._get_timestamps(pid),
+            self._arrival_times.pop(pid, None),
+        )
+        self._prog_records[pid] = record
+
+        record.num_cpu_tasks = self.cpu_scheduler.release_pid(pid)
+        record.num_qpu_tasks = self.qpu_scheduler.release_pid(pid)
+        self.memmgr.remove_process(pid)
+        self.host.interface.program_instance_jumps.pop(pid, None)
+        del self._current_block_index[pid]
+        del self._prog_instance_dependency[pid]
+        self._prog_instance_dependents.pop(pid, None)
+        self._dirty_pids.discard(pid)
+        if self._admission is not None:
+            self._admission.remove(pid)
+
+        stream = self._pid_stream.pop(pid, None)
+        if stream is not None:
+            # This may admit a new program instance of the stream.
+            stream.on_retired(pid, record)
+        return record
+
+    def get_program_instance_records(self) -> Dict[int, ProgramInstanceRecord]:
+        return self._prog_records
+
     def submit_program_instance(
         self, prog_instance: ProgramInstance, remote_pid: Optional[int] = None
     ) -> None:
@@ -575,7 +940,7 @@ class NodeScheduler(Protocol):
         self.memmgr.add_process(process)
         self.initialize_process(process)
         self._current_block_index[prog_instance.pid] = 0
-        self._prog_instance_dependency[prog_instance.pid] = -1
+        self._set_dependency(prog_instance.pid, -1)
 
     def get_statistics(self) -> SchedulerStatistics:
         return SchedulerStatistics(
@@ -585,9 +950,98 @@ class NodeScheduler(Protocol):
             qpu_task_starts=self.qpu_scheduler.get_task_starts(),
             cpu_task_ends=self.cpu_scheduler.get_task_ends(),
             qpu_task_ends=self.qpu_scheduler.get_task_ends(),
+            cpu_task_cores=self.cpu_scheduler.get_task_cores(),
+            qpu_task_lanes=self.qpu_scheduler.get_task_cores(),
         )
 
 
+class ProgramInstanceStream(Protocol):
+    """
+    Feeds the program instances of a stream into a node scheduler at their
+    (simulated) arrival times.
+
+    Arriving program instances are admitted directly if the stream has fewer
+    than `max_live` live program instances, and otherwise wait (in order of
+    arrival) until a live program instance of the stream has been retired.
+    Of the retired program instances, only the `max_records` most recent records
+    are kept; all of them are included in the statistics of the stream.
+
+    :param stream_id: ID of the stream
+    :param info: description of the stream
+    :param node_scheduler: node scheduler to admit program instances to
+    """
+
+    def __init__(
+        self, stream_id: int, info: StreamInfo, node_scheduler: NodeScheduler
+    ) -> None:
+        super().__init__(name=f"{node_scheduler.name}_stream_{stream_id}")
+        self._stream_id = stream_id
+        self._info = info
+        self._node_scheduler = node_scheduler
+
+        self._live_pids: Set[int] = set()
+        # pids of retired instances of which the record is kept, oldest first
+        self._finished_pids: Deque[int] = deque()
+        self._statistics = StreamStatistics()
+        # (arrival time, inputs) of arrived but not yet admitted instances
+        self._waiting: Deque[Tuple[float, ProgramInput]] = deque()
+
+    @property
+    def stream_id(self) -> int:
+        return self._stream_id
+
+    @property
+    def info(self) -> StreamInfo:
+        return self._info
+
+    @property
+    def live_pids(self) -> Set[int]:
+        return self._live_pids
+
+    @property
+    def finished_pids(self) -> List[int]:
+        return list(self._finished_pids)
+
+    @property
+    def statistics(self) -> StreamStatistics:
+        return self._statistics
+
+    @property
+    def num_waiting(self) -> int:
+        return len(self._waiting)
+
+    def wait(self, delta_time: float) -> Generator[EventExpression, None, None]:
+        self._schedule_after(delta_time, EVENT_WAIT)
+        event_expr = EventExpression(source=self, event_type=EVENT_WAIT)
+        yield event_expr
+
+    def run(self) -> Generator[EventExpression, None, None]:
+        for delta, inputs in self._info.arrivals:
+            yield from self.wait(delta)
+            self._waiting.append((ns.sim_time(), inputs))
+            self.admit_waiting()
+
+    def admit_waiting(self) -> None:
+        max_live = self._info.max_live
+        while len(self._waiting) > 0 and (
+            max_live is None or len(self._live_pids) < max_live
+        ):
+            arrival_time, inputs = self._waiting.popleft()
+            pid = self._node_scheduler.admit_program_instance(
+                self, inputs, arrival_time
+            )
+            self._live_pids.add(pid)
+
+    def on_retired(self, pid: int, record: ProgramInstanceRecord) -> None:
+        self._live_pids.remove(pid)
+        self._statistics.add(record)
+        self._finished_pids.append(pid)
+        max_records = self._info.max_records
+        if max_records is not None and len(self._finished_pids) > max_records:
+            self._node_scheduler.forget_program_instance(self._finished_pids.popleft())
+        self.admit_waiting()
+
+
 class ProcessorSchedulerComponent(Component):
     """
     NetSquid component representing for the ProcessorScheduler.
@@ -617,6 +1071,7 @@ class ProcessorScheduler(Protocol):
         memmgr: MemoryManager,
         deterministic: bool = True,
         use_deadlines: bool = True,
+        policy: Optional[SchedulingPolicy] = None,
     ) -> None:
         super().__init__(name=name)
         self.add_signal(SIGNAL_TASK_COMPLETED)
@@ -629,11 +1084,19 @@ class ProcessorScheduler(Protocol):
         self._driver = driver
         self._other_scheduler: Optional[ProcessorScheduler] = None
         self._memmgr = memmgr
-        self._deterministic = deterministic
-        self._use_deadlines = use_deadlines
+        # `deterministic` and `use_deadlines` only configure the default policy.
+        if policy is None:
+            policy = build_scheduling_policy("edf", deterministic, use_deadlines)
+        self._policy = policy
 
         self._task_graph: TaskGraph = TaskGraph()
-        self._finished_tasks: List[int] = []
+        # IDs of finished tasks. Tasks of released program instances are dropped.
+        self._finished_tasks: Set[int] = set()
+
+        # Events that happened since the scheduler last updated its status.
+        self._pending_events: List[SchedulerEvent] = []
+        # End time of the task after which deadlines were last decreased.
+        self._last_deadline_decrease: Optional[float] = None
 
         self._prog_start_timestamps: Dict[int, float] = {}  # program ID -> start time
         self._prog_end_timestamps: Dict[int, float] = {}  # program ID -> end time
@@ -641,7 +1104,17 @@ class ProcessorScheduler(Protocol):
         self._tasks_executed: Dict[int, QoalaTask] = {}
         self._task_starts: Dict[int, float] = {}
         self._task_ends: Dict[int, float] = {}
+        self._task_cores: Dict[int, int] = {}  # task ID -> core (multi-core only)
+        self._pid_tasks_started: Dict[int, List[int]] = {}  # pid -> task IDs
+
+        # Tracing of status transitions. Disabled (None) by default.
+        self._trace_hook: Optional[Callable[[SchedulerTraceEntry], None]] = None
+        self._trace: List[SchedulerTraceEntry] = []
+        self._last_traced: Optional[Tuple[FrozenSet[Status], Optional[int]]] = None
         self.last_finished_task_pid: Tuple[int, int] = (-1, -1)  # (pid, end_time)
+        # pids of the tasks that finished since the last call to
+        # `take_pids_with_finished_tasks()`
+        self._pids_with_finished_tasks: Set[int] = set()
 
         self._comp = ProcessorSchedulerComponent(name + "_comp")
 
@@ -653,6 +1126,10 @@ class ProcessorScheduler(Protocol):
     def driver(self) -> Driver:
         return self._driver
 
+    @property
+    def policy(self) -> SchedulingPolicy:
+        return self._policy
+
     def upload_task_graph(self, graph: TaskGraph) -> None:
         """
         Sets the given task graph as the current task graph.
@@ -661,6 +1138,9 @@ class ProcessorScheduler(Protocol):
         :return: None
         """
         self._task_graph = graph
+        self._pending_events.append(
+            SchedulerEvent(SchedulerEventType.TASKS_ADDED, list(graph.get_tasks()))
+        )
 
     # Gets the pid of the last finished task at the current time,
     # if there is no task that is finished at the current time, it returns -1
@@ -677,6 +1157,18 @@ class ProcessorScheduler(Protocol):
         else:
             return -1
 
+    def take_pids_with_finished_tasks(self) -> Set[int]:
+        """
+        Returns the pids of all tasks that finished since the previous call, and
+        clears them. Unlike `get_last_finished_task_pid_at`, this includes all
+        tasks that finished at the same time.
+
+        :return: The pids of the finished tasks.
+        """
+        pids = self._pids_with_finished_tasks
+        self._pids_with_finished_tasks = set()
+        return pids
+
     def task_exists_for_pid(self, pid: int) -> bool:
         """
         Checks the current task graph for the existence of a task with the given pid. Returns True if such task exists,
@@ -694,7 +1186,18 @@ class ProcessorScheduler(Protocol):
         :param tasks: The tasks to add.
         :return: None
         """
-        self._task_graph.get_tasks().update(tasks)
+        self._task_graph.add_tinfos(tasks)
+        self.notify(SchedulerEvent(SchedulerEventType.TASKS_ADDED, list(tasks)))
+
+    def notify(self, event: SchedulerEvent) -> None:
+        """
+        Notifies this scheduler of an event that may change which of its tasks can
+        be executed. Events are handled when the scheduler next updates its status.
+
+        :param event: The event.
+        :return: None
+        """
+        self._pending_events.append(event)
 
     def has_finished(self, task_id: int) -> bool:
         return task_id in self._finished_tasks
@@ -718,6 +1221,70 @@ class ProcessorScheduler(Protocol):
         assert pid in self._prog_end_timestamps
         return self._prog_start_timestamps[pid], self._prog_end_timestamps[pid]
 
+    def set_trace_hook(
+        self, hook: Optional[Callable[[SchedulerTraceEntry], None]]
+    ) -> None:
+        """
+        Set a function that is called for every status transition of this scheduler,
+        with a tuple (time, scheduler name, statuses, task ID or None).
+        Use None to disable tracing.
+
+        :param hook: The function to call, or None.
+        :return: None
+        """
+        self._trace_hook = hook
+        self._last_traced = None
+
+    def enable_trace(self) -> None:
+        """
+        Record all status transitions of this scheduler. They can be retrieved
+        using `get_trace()`.
+
+        :return: None
+        """
+        self.set_trace_hook(self._trace.append)
+
+    def get_trace(self) -> List[SchedulerTraceEntry]:
+        return self._trace
+
+    def trace_status(self, status: SchedulerStatus) -> None:
+        """
+        Pass the given status to the trace hook if it differs from the last
+        traced status. Should only be called if a trace hook has been set.
+
+        :param status: The current status.
+        :return: None
+        """
+        assert self._trace_hook is not None
+        current = (frozenset(status.status), status.params.get("task_id"))
+        if current != self._last_traced:
+            self._last_traced = current
+            self._trace_hook((ns.sim_time(), self.name, current[0], current[1]))
+
+    def release_pid(self, pid: int) -> int:
+        """
+        Drops all bookkeeping of tasks of the (completed) program instance with
+        given pid, including the shared lrcall/rrcall objects of these tasks.
+
+        :param pid: The pid of the program instance.
+        :return: The number of tasks of the program instance that were executed.
+        """
+        assert not self.task_exists_for_pid(pid)
+        self._policy.release_program_instance(pid)
+        self._prog_start_timestamps.pop(pid, None)
+        self._prog_end_timestamps.pop(pid, None)
+        num_executed = 0
+        for task_id in self._pid_tasks_started.pop(pid, []):
+            self._finished_tasks.discard(task_id)
+            task = self._tasks_executed.pop(task_id, None)
+            self._task_starts.pop(task_id, None)
+            self._task_ends.pop(task_id, None)
+            self._task_cores.pop(task_id, None)
+            if task is not None:
+                num_executed += 1
+                self._driver.release_task_memory(task)
+        return num_executed
+
     def get_tasks_executed(self) -> Dict[int, QoalaTask]:
         return self._tasks_executed
 
@@ -727,6 +1294,10 @@ class ProcessorScheduler(Protocol):
     def get_task_ends(self) -> Dict[int, float]:
         return self._task_ends
 
+    def get_task_cores(self) -> Dict[int, int]:
+        # Empty if the processor has a single core.
+        return self._task_cores
+
     def wait(self, delta_time: float) -> Generator[EventExpression, None, None]:
         self._schedule_after(delta_time, EVENT_WAIT)
         event_expr = EventExpression(source=self, event_type=EVENT_WAIT)
@@ -742,6 +1313,7 @@ class Status(Enum):
     WAITING_START_TIME = auto()
     WAITING_RESOURCES = auto()
     WAITING_TIME_BIN = auto()
+    WAITING_CORE = auto()
 
 
 @dataclass
@@ -750,6 +1322,26 @@ class SchedulerStatus:
     params: Dict[str, Any]
 
 
+# (time, scheduler name, statuses, task ID if a task is executed next)
+SchedulerTraceEntry = Tuple[float, str, FrozenSet[Status], Optional[int]]
+
+
+class SchedulerEventType(Enum):
+    TASKS_ADDED = auto()
+    OTHER_TASK_FINISHED = auto()
+    MESSAGES_ARRIVED = auto()
+    MESSAGES_CONSUMED = auto()
+    MEMORY_ALLOCATED = auto()
+    MEMORY_FREED = auto()
+
+
+@dataclass
+class SchedulerEvent:
+    typ: SchedulerEventType
+    # IDs of the added or finished tasks, if applicable
+    task_ids: List[int] = field(default_factory=list)
+
+
 class EdfScheduler(ProcessorScheduler):
     def __init__(
         self,
@@ -759,6 +1351,7 @@ class EdfScheduler(ProcessorScheduler):
         memmgr: MemoryManager,
         deterministic: bool = True,
         use_deadlines: bool = True,
+        policy: Optional[SchedulingPolicy] = None,
     ) -> None:
         super().__init__(
             name=name,
@@ -767,28 +1360,163 @@ class EdfScheduler(ProcessorScheduler):
             memmgr=memmgr,
             deterministic=deterministic,
             use_deadlines=use_deadlines,
+            policy=policy,
         )
         self._status: SchedulerStatus = SchedulerStatus(status=set(), params={})
 
+        # With multiple cores, this scheduler only assigns tasks to idle cores,
+        # which execute them concurrently. All cores share the task graph of this
+        # scheduler. With a single core, tasks are executed by this scheduler itself
+        # and `_cores` is empty.
+        self._cores: List[ProcessorCore] = []
+        # Tasks that are currently executed by a core.
+        self._running: Set[int] = set()
+
     @property
     def status(self) -> SchedulerStatus:
         return self._status
 
-    def update_external_predcessors(self) -> None:
-        if self._other_scheduler is None:
-            return
-        assert self._task_graph is not None
+    def _create_cores(self, drivers: List[Driver]) -> None:
+        # Core i executes tasks using drivers[i].
+        self.add_signal(SIGNAL_CORE_IDLE)
+        self._cores = [ProcessorCore(i, self, drv) for i, drv in enumerate(drivers)]
+
+    @property
+    def num_cores(self) -> int:
+        return max(len(self._cores), 1)
+
+    def start(self) -> None:
+        # Cores must be waiting for tasks before any task is assigned to them.
+        for core in self._cores:
+            core.start()
+        super().start()
+
+    def stop(self) -> None:
+        super().stop()
+        for core in self._cores:
+            core.stop()
+
+    def on_core_idle(self, task_id: int) -> None:
+        """
+        Called by a core when it has finished executing a task.
+
+        :param task_id: ID of the task that the core executed.
+        :return: None
+        """
+        self._running.discard(task_id)
+        self.send_signal(SIGNAL_CORE_IDLE)
+
+    def update_status(self) -> None:
+        raise NotImplementedError
 
+    def _wait_for_status(self) -> Generator[EventExpression, None, None]:
+        # Wait until something happens that may change the current status.
+        raise NotImplementedError
+
+    def _run_multi_core(self) -> Generator[EventExpression, None, None]:
+        while True:
+            self._task_logger.debug("updating status...")
+            self._status = SchedulerStatus(status=set(), params={})
+            idle = [core for core in self._cores if core.is_idle]
+            if len(idle) > 0:
+                self.process_events()
+                self.update_status()
+            else:
+                self._status.status.add(Status.WAITING_CORE)
+            if self._trace_hook is not None:
+                self.trace_status(self.status)
+            self._task_logger.debug(f"status: {self.status.status}")
+            if (
+                Status.NEXT_TASK in self.status.status
+                or Status.EPR_GEN in self.status.status
+            ):
+                task_id = self.status.params["task_id"]
+                self._running.add(task_id)
+                self._task_cores[task_id] = idle[0].index
+                idle[0].assign(task_id)
+                # Let the core start executing the task before choosing a task for
+                # the next core, so that its effects (e.g. qubit allocations) are
+                # taken into account.
+                self._schedule_now(EVENT_CORE_ASSIGN)
+                yield EventExpression(source=self, event_type=EVENT_CORE_ASSIGN)
+            else:
+                yield from self._wait_for_status()
+
+    def collect_events(self) -> None:
+        """
+        Notifies this scheduler of events that are detected by polling, rather
+        than being pushed by other components. Implemented by subclasses.
+
+        :return: None
+        """
+        pass
+
+    def handle_event(self, event: SchedulerEvent) -> None:
+        """
+        Updates the task graph for the given event. Only the tasks affected by the
+        event are inspected.
+
+        :param event: The event to handle.
+        :return: None
+        """
         tg = self._task_graph
+        if event.typ == SchedulerEventType.TASKS_ADDED:
+            if self._other_scheduler is None:
+                return
+            # External predecessors of new tasks may have finished already.
+            for tid in event.task_ids:
+                if tid not in tg:
+                    continue
+                tinfo = tg.get_tinfo(tid)
+                finished = {
+                    ext
+                    for ext in tinfo.ext_predecessors
+                    if self._other_scheduler.has_finished(ext)
+                }
+                if len(finished) > 0:
+                    tg.remove_ext_predecessors(tid, finished)
+                for ext in list(tinfo.ext_rel_deadlines):
+                    if self._other_scheduler.has_finished(ext):
+                        tg.resolve_ext_rel_deadline(ext, self._time_since_finished(ext))
+        elif event.typ == SchedulerEventType.OTHER_TASK_FINISHED:
+            for tid in event.task_ids:
+                tg.resolve_ext_predecessor(tid)
+                tg.resolve_ext_rel_deadline(tid, self._time_since_finished(tid))
+
+    def _time_since_finished(self, other_task_id: int) -> float:
+        # Time since the given task finished on the other processor. Deadlines
+        # relative to it are counted from that moment, not from the moment this
+        # scheduler handles the notification.
+        assert self._other_scheduler is not None
+        end = self._other_scheduler.get_task_ends().get(other_task_id)
+        if end is None:
+            return 0
+        return ns.sim_time() - end
+
+    def process_events(self) -> None:
+        """
+        Handles all events that happened since the previous call.
 
-        for r in tg.get_roots(ignore_external=True):
-            ext_preds = tg.get_tinfo(r).ext_predecessors
-            new_ext_preds = {
-                ext for ext in ext_preds if not self._other_scheduler.has_finished(ext)
-            }
-            tg.get_tinfo(r).ext_predecessors = new_ext_preds
+        :return: None
+        """
+        self.collect_events()
+        events = self._pending_events
+        self._pending_events = []
+        for event in events:
+            self.handle_event(event)
+
+    def handle_task(
+        self, task_id: int, driver: Optional[Driver] = None
+    ) -> Generator[EventExpression, None, None]:
+        """
+        Executes the given task and updates the task graph when it has finished.
 
-    def handle_task(self, task_id: int) -> Generator[EventExpression, None, None]:
+        :param task_id: ID of the task to execute.
+        :param driver: The driver to execute the task with. Defaults to the driver of
+            this scheduler; other drivers are used by the cores of a multi-core
+            processor.
+        :return: None
+        """
         assert self._task_graph is not None
         tinfo = self._task_graph.get_tinfo(task_id)
         task = tinfo.task
@@ -797,31 +1525,98 @@ class EdfScheduler(ProcessorScheduler):
 
         before = ns.sim_time()
 
-        self._logger.info(f"executing task {task}")
-        self._task_logger.info(f"start  {task}")
-        self._task_starts[task.task_id] = before
-        self.record_start_timestamp(task.pid, before)
+        self._task_started(task, before)
 
         # Execute the task
-        success = yield from self._driver.handle_task(task)
+        if driver is None:
+            driver = self._driver
+        success = yield from driver.handle_task(task)
         if success:
             after = ns.sim_time()
+            self._decrease_deadlines(before, after)
+            self._task_finished(task, after, after - before)
+        else:
+            self._task_logger.info("task failed")
 
-            self.record_end_timestamp(task.pid, after)
-            self.last_finished_task_pid = (task.pid, after)
-            duration = after - before
-            self._task_graph.decrease_deadlines(duration)
-            self._task_graph.remove_task(task_id)
+    def _task_started(self, task: QoalaTask, time: float) -> None:
+        self._logger.info(f"executing task {task}")
+        self._task_logger.info(f"start  {task}")
+        self._task_starts[task.task_id] = time
+        self._pid_tasks_started.setdefault(task.pid, []).append(task.task_id)
+        self.record_start_timestamp(task.pid, time)
 
-            self._finished_tasks.append(task.task_id)
-            self.send_signal(SIGNAL_TASK_COMPLETED)
-            self._logger.info(f"finished task {task}")
-            self._task_logger.info(f"finish {task}")
+    def _decrease_deadlines(self, before: float, after: float) -> None:
+        # Deadlines are decreased by the time the processor has been busy.
+        # Tasks can overlap on a multi-core CPU; overlapping time counts once.
+        assert self._task_graph is not None
+        busy_since = before
+        if self._last_deadline_decrease is not None:
+            busy_since = max(before, self._last_deadline_decrease)
+        self._last_deadline_decrease = after
+        self._task_graph.decrease_deadlines(after - busy_since)
+
+    def _task_finished(self, task: QoalaTask, time: float, duration: float) -> None:
+        # Remove a task that has finished at the given time from the task graph,
+        # after it has been executed for the given duration.
+        assert self._task_graph is not None
+        self.record_end_timestamp(task.pid, time)
+        self.last_finished_task_pid = (task.pid, time)
+        self._pids_with_finished_tasks.add(task.pid)
+        self._task_graph.remove_task(task.task_id)
+        self._policy.task_finished(task, duration)
+
+        self._finished_tasks.add(task.task_id)
+        if self._other_scheduler is not None:
+            self._other_scheduler.notify(
+                SchedulerEvent(SchedulerEventType.OTHER_TASK_FINISHED, [task.task_id])
+            )
+        self.send_signal(SIGNAL_TASK_COMPLETED)
+        self._logger.info(f"finished task {task}")
+        self._task_logger.info(f"finish {task}")
 
-            self._tasks_executed[task.task_id] = task
-            self._task_ends[task.task_id] = after
-        else:
-            self._task_logger.info("task failed")
+        self._tasks_executed[task.task_id] = task
+        self._task_ends[task.task_id] = time
+
+
+class ProcessorCore(Protocol):
+    """
+    One core of a multi-core processor: a CPU core, or a QPU lane that executes
+    tasks on qubits that are not used by the other lanes. Executes the tasks that
+    the processor scheduler assigns to it, one at a time.
+
+    :param index: Index of the core within the processor.
+    :param scheduler: The processor scheduler that assigns tasks to this core.
+    :param driver: The driver to execute tasks with.
+    """
+
+    def __init__(self, index: int, scheduler: EdfScheduler, driver: Driver) -> None:
+        super().__init__(name=f"{scheduler.name}_core{index}")
+        self._index = index
+        self._scheduler = scheduler
+        self._driver = driver
+        self._task_id: Optional[int] = None  # task currently executed
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def is_idle(self) -> bool:
+        return self._task_id is None
+
+    def assign(self, task_id: int) -> None:
+        assert self.is_idle
+        self._task_id = task_id
+        self._schedule_now(EVENT_CORE_ASSIGN)
+
+    def run(self) -> Generator[EventExpression, None, None]:
+        while True:
+            yield EventExpression(source=self, event_type=EVENT_CORE_ASSIGN)
+            task_id = self._task_id
+            assert task_id is not None
+            yield from self._scheduler.handle_task(task_id, self._driver)
+            self._task_id = None
+            self._scheduler.on_core_idle(task_id)
 
 
 class CpuEdfScheduler(EdfScheduler):
@@ -834,6 +1629,8 @@ class CpuEdfScheduler(EdfScheduler):
         host_interface: HostInterface,
         deterministic: bool = True,
         use_deadlines: bool = True,
+        policy: Optional[SchedulingPolicy] = None,
+        num_cores: int = 1,
     ) -> None:
         super().__init__(
             name=name,
@@ -842,10 +1639,82 @@ class CpuEdfScheduler(EdfScheduler):
             memmgr=memmgr,
             deterministic=deterministic,
             use_deadlines=use_deadlines,
+            policy=policy,
         )
         self._host_interface = host_interface
 
-    def is_message_available(self, tid: int) -> bool:
+        assert num_cores >= 1
+        if num_cores > 1:
+            self._create_cores(
+                [driver] + [driver.for_core(i) for i in range(1, num_cores)]
+            )
+
+        # Event roots whose message has not arrived yet, also indexed by the source
+        # of the message (remote node name, pid, remote pid). Only updated for new
+        # roots, for roots that a policy inspects, and when messages arrive.
+        self._blocked_on_message: Set[int] = set()
+        self._message_waiters: Dict[Tuple[str, int, int], Set[int]] = {}
+        # Event roots of which the message was available when no message had been
+        # consumed since. Cleared when messages are consumed.
+        self._message_checked: Set[int] = set()
+        # Message counts of the host interface when last inspected.
+        self._num_msgs_added: int = 0
+        self._num_msgs_popped: int = 0
+
+    def upload_task_graph(self, graph: TaskGraph) -> None:
+        super().upload_task_graph(graph)
+        self._blocked_on_message = set()
+        self._message_waiters = {}
+        self._message_checked = set()
+
+    def collect_events(self) -> None:
+        if self._host_interface is None:
+            return
+        num_added = self._host_interface.num_peer_msgs_added()
+        if num_added != self._num_msgs_added:
+            self._num_msgs_added = num_added
+            self.notify(SchedulerEvent(SchedulerEventType.MESSAGES_ARRIVED))
+        num_popped = self._host_interface.num_peer_msgs_popped()
+        if num_popped != self._num_msgs_popped:
+            self._num_msgs_popped = num_popped
+            self.notify(SchedulerEvent(SchedulerEventType.MESSAGES_CONSUMED))
+
+    def handle_event(self, event: SchedulerEvent) -> None:
+        super().handle_event(event)
+        if event.typ == SchedulerEventType.MESSAGES_ARRIVED:
+            # Only blocked tasks can become unblocked; look up each source once.
+            by_remote_name: Dict[str, List[Tuple[str, int, int]]] = {}
+            for source in self._message_waiters:
+                by_remote_name.setdefault(source[0], []).append(source)
+            for remote_name, sources in by_remote_name.items():
+                messages = set(self._host_interface.get_available_messages(remote_name))
+                for source in sources:
+                    if (source[1], source[2]) in messages:
+                        tids = self._message_waiters.pop(source)
+                        self._blocked_on_message -= tids
+                        self._message_checked |= tids
+        elif event.typ == SchedulerEventType.MESSAGES_CONSUMED:
+            # Roots of which the message was available may now be blocked. They are
+            # checked again when they are inspected (see `_lacks_message`).
+            self._message_checked = set()
+
+    def _lacks_message(self, tid: int) -> bool:
+        # Whether the root is an event task of which the message is not available.
+        if tid in self._blocked_on_message:
+            return True
+        if tid in self._message_checked:
+            return False
+        if not self._task_graph.get_tinfo(tid).task.is_event_task():
+            return False
+        if self.is_message_available(tid):
+            self._message_checked.add(tid)
+            return False
+        self._blocked_on_message.add(tid)
+        self._message_waiters.setdefault(self._message_source(tid), set()).add(tid)
+        return True
+
+    def _message_source(self, tid: int) -> Tuple[str, int, int]:
+        # (remote node name, pid, remote pid) of the message an event task waits for.
         assert self._task_graph is not None
         task = self._task_graph.get_tinfo(tid).task
         assert isinstance(task, HostEventTask)
@@ -856,10 +1725,12 @@ class CpuEdfScheduler(EdfScheduler):
         assert isinstance(instr.arguments[0], hostlang.IqoalaSingleton)
         csck_id = process.host_mem.read(instr.arguments[0].name)
         csck = process.csockets[csck_id]
-        remote_name = csck.remote_name
-        remote_pid = csck.remote_pid
+        return csck.remote_name, task.pid, csck.remote_pid
+
+    def is_message_available(self, tid: int) -> bool:
+        remote_name, pid, remote_pid = self._message_source(tid)
         messages = self._host_interface.get_available_messages(remote_name)
-        if (task.pid, remote_pid) in messages:
+        if (pid, remote_pid) in messages:
             self._task_logger.debug(f"task {tid} NOT blocked")
             return True
         else:
@@ -870,77 +1741,48 @@ class CpuEdfScheduler(EdfScheduler):
 
         tg = self._task_graph
 
-        if tg is None or len(tg.get_tasks()) == 0:
+        if tg is None or len(tg) == 0:
             self._status = SchedulerStatus(status={Status.GRAPH_EMPTY}, params={})
             return
 
-        # All tasks that have no predecessors, internal nor external.
-        no_predecessors = tg.get_roots()
-
-        # All tasks that have only external predecessors.
-        blocked_on_other_core = tg.get_tasks_blocked_only_on_external()
+        # Whether there are tasks that have only external predecessors.
+        blocked_on_other_core = tg.has_tasks_blocked_only_on_external()
 
-        # All "receive message" tasks without predecessors (internal nor external).
-        event_no_predecessors = [
-            tid for tid in no_predecessors if tg.get_tinfo(tid).task.is_event_task()
-        ]
-
-        event_blocked_on_message = [
-            tid for tid in event_no_predecessors if not self.is_message_available(tid)
-        ]
+        # All "receive message" tasks without predecessors (internal nor external)
+        # for which the message has not arrived yet.
+        # Tasks that were roots already have been checked when handling events, or
+        # are checked when the policy inspects them.
+        for tid in tg.take_new_roots():
+            self._lacks_message(tid)
+        event_blocked_on_message = self._blocked_on_message
 
         now = ns.sim_time()
-        with_future_start: Dict[int, float] = {
-            tid: tg.get_tinfo(tid).start_time  # type: ignore
-            for tid in no_predecessors
-            if tg.get_tinfo(tid).start_time is not None
-            and tg.get_tinfo(tid).start_time > now
-        }
-        wait_for_start: Optional[Tuple[int, float]] = None  # (task ID, start time)
-        if len(with_future_start) > 0:
-            sorted_by_start = sorted(
-                with_future_start.items(), key=lambda item: item[1]
-            )
-            wait_for_start = sorted_by_start[0]
+        # (task ID, start time) of the next task that waits for its start time
+        wait_for_start = tg.get_next_start_time(now)
         self._task_logger.info(f"wait_for_start: {wait_for_start}")
 
-        ready = [
-            tid
-            for tid in no_predecessors
-            if tid not in event_blocked_on_message and tid not in with_future_start
-        ]
-
-        if len(ready) > 0:
-            # From the readily executable tasks, choose which one to execute
-            with_deadline = [t for t in ready if tg.get_tinfo(t).deadline is not None]
-            if not self._use_deadlines:
-                with_deadline = []
-
-            to_return: int
-
-            if len(with_deadline) > 0:
-                # Sort them by deadline and return the one with the earliest deadline
-                deadlines = {t: tg.get_tinfo(t).deadline for t in with_deadline}
-                sorted_by_deadline = sorted(deadlines.items(), key=lambda item: item[1])  # type: ignore
-                self._task_logger.info(f"tasks with deadlines: {sorted_by_deadline}")
-                to_return = sorted_by_deadline[0][0]
-                self._logger.debug(f"Return task {to_return}")
-                self._task_logger.debug(f"Return task {to_return}")
-            else:
-                # No deadlines
-                if self._deterministic:
-                    to_return = ready[0]
-                else:
-                    index = random.randint(0, len(ready) - 1)
-                    to_return = ready[index]
-                self._logger.debug(f"Return task {to_return}")
-                self._task_logger.debug(f"Return task {to_return}")
+        not_ready = _NotReady(
+            [self._running],
+            [self._lacks_message, lambda tid: tg.starts_after(tid, now)],
+        )
+
+        # From the readily executable tasks, let the policy choose which one to
+        # execute.
+        to_return = self._policy.select_root(tg, not_ready)
+
+        if to_return is not None:
+            self._task_logger.info(
+                f"task chosen by policy: {to_return} "
+                f"(deadline: {tg.get_tinfo(to_return).deadline})"
+            )
+            self._logger.debug(f"Return task {to_return}")
+            self._task_logger.debug(f"Return task {to_return}")
             self._status = SchedulerStatus(
                 status={Status.NEXT_TASK}, params={"task_id": to_return}
             )
             return
         else:
-            if len(blocked_on_other_core) > 0:
+            if blocked_on_other_core:
                 self._logger.debug("Waiting other core")
                 self._task_logger.debug("Waiting other core")
                 self._status.status.add(Status.WAITING_OTHER_CORE)
@@ -954,49 +1796,63 @@ class CpuEdfScheduler(EdfScheduler):
                 self._task_logger.debug("Waiting Start Time")
                 self._status.status.add(Status.WAITING_START_TIME)
                 self._status.params["start_time"] = start
+            if len(self._running) > 0:
+                self._logger.debug("Waiting CPU core")
+                self._task_logger.debug("Waiting CPU core")
+                self._status.status.add(Status.WAITING_CORE)
 
             if len(self.status.status) == 0:
                 raise RuntimeError
 
+    def _wait_for_status(self) -> Generator[EventExpression, None, None]:
+        ev_expr = self.await_port_input(self.node_scheduler_in_port)
+        if Status.WAITING_OTHER_CORE in self.status.status:
+            ev_expr = ev_expr | self.await_signal(
+                sender=self._other_scheduler,
+                signal_label=SIGNAL_TASK_COMPLETED,
+            )
+        if Status.WAITING_CORE in self.status.status:
+            ev_expr = ev_expr | self.await_signal(
+                sender=self,
+                signal_label=SIGNAL_CORE_IDLE,
+            )
+        if Status.WAITING_START_TIME in self.status.status:
+            start_time = self.status.params["start_time"]
+            now = ns.sim_time()
+            delta = start_time - now
+            self._schedule_after(delta, EVENT_WAIT)
+            ev_start_time = EventExpression(source=self, event_type=EVENT_WAIT)
+            ev_expr = ev_expr | ev_start_time
+
+        if Status.WAITING_MSG in self.status.status:
+            ev_msg_arrived = self._host_interface.get_evexpr_for_any_msg()
+
+            ev_expr = ev_msg_arrived | ev_expr
+            yield ev_expr
+            if len(ev_expr.first_term.triggered_events) > 0:
+                # It was "ev_msg_arrived" that triggered.
+                # Need to process this event (flushing potential other messages)
+                yield from self._host_interface.handle_msg_evexpr(ev_expr.first_term)
+        else:
+            yield ev_expr
+
     def run(self) -> Generator[EventExpression, None, None]:
+        if len(self._cores) > 0:
+            yield from self._run_multi_core()
+            return
         while True:
             self._task_logger.debug("updating status...")
             self._status = SchedulerStatus(status=set(), params={})
-            self.update_external_predcessors()
+            self.process_events()
             self.update_status()
-            print(self.name, ns.sim_time(), f"status: {self.status.status}")
+            if self._trace_hook is not None:
+                self.trace_status(self.status)
             self._task_logger.debug(f"status: {self.status.status}")
             if Status.NEXT_TASK in self.status.status:
                 task_id = self.status.params["task_id"]
                 yield from self.handle_task(task_id)
             else:
-                ev_expr = self.await_port_input(self.node_scheduler_in_port)
-                if Status.WAITING_OTHER_CORE in self.status.status:
-                    ev_expr = ev_expr | self.await_signal(
-                        sender=self._other_scheduler,
-                        signal_label=SIGNAL_TASK_COMPLETED,
-                    )
-                if Status.WAITING_START_TIME in self.status.status:
-                    start_time = self.status.params["start_time"]
-                    now = ns.sim_time()
-                    delta = start_time - now
-                    self._schedule_after(delta, EVENT_WAIT)
-                    ev_start_time = EventExpression(source=self, event_type=EVENT_WAIT)
-                    ev_expr = ev_expr | ev_start_time
-
-                if Status.WAITING_MSG in self.status.status:
-                    ev_msg_arrived = self._host_interface.get_evexpr_for_any_msg()
-
-                    ev_expr = ev_msg_arrived | ev_expr
-                    yield ev_expr
-                    if len(ev_expr.first_term.triggered_events) > 0:
-                        # It was "ev_msg_arrived" that triggered.
-                        # Need to process this event (flushing potential other messages)
-                        yield from self._host_interface.handle_msg_evexpr(
-                            ev_expr.first_term
-                        )
-                else:
-                    yield ev_expr
+                yield from self._wait_for_status()
 
 
 class QpuEdfScheduler(EdfScheduler):
@@ -1009,6 +1865,10 @@ class QpuEdfScheduler(EdfScheduler):
         network_schedule: Optional[EhiNetworkSchedule] = None,
         deterministic: bool = True,
         use_deadlines: bool = True,
+        policy: Optional[SchedulingPolicy] = None,
+        num_lanes: int = 1,
+        timebin_lookahead: bool = False,
+        per_qubit_durations: bool = False,
     ) -> None:
         super().__init__(
             name=name,
@@ -1017,13 +1877,99 @@ class QpuEdfScheduler(EdfScheduler):
             memmgr=memmgr,
             deterministic=deterministic,
             use_deadlines=use_deadlines,
+            policy=policy,
         )
         self._network_schedule = network_schedule
+        # If True, while an EPR task waits for its time bin, only tasks that are
+        # estimated to finish before that bin starts are executed (see
+        # `tasks_exceeding_gap`), so that the bin is not missed.
+        self._timebin_lookahead = timebin_lookahead
+        # If True, the durations of local routines are estimated again when they
+        # become ready, from the gates on the physical qubits they act on (see
+        # `estimate_duration_per_qubit`).
+        self._per_qubit_durations = per_qubit_durations
+
+        # With multiple lanes, tasks that act on disjoint qubits are dispatched
+        # concurrently (see `qubits_used_by`). Their classical instructions and
+        # entanglement generation overlap, but the QDevice still executes their
+        # gates one program at a time.
+        assert num_lanes >= 1
+        if num_lanes > 1:
+            self._create_cores(
+                [driver] + [driver.for_lane(i) for i in range(1, num_lanes)]
+            )
+
+        # Heap of (start of next usable time bin, task order, task ID) for EPR tasks
+        # without predecessors, and the current bin start per task ID.
+        self._timebin_heap: List[Tuple[float, int, int]] = []
+        self._timebin_starts: Dict[int, float] = {}
+
+        # Roots for which not all resources are available. Only updated for new
+        # roots, for roots that a policy inspects, and when memory is freed.
+        self._blocked_on_resources: Set[int] = set()
+        # Roots of which the resources were available when no memory had been
+        # allocated since. Cleared when memory is allocated.
+        self._resources_checked: Set[int] = set()
+        # Allocation and free counts of the memory manager when last inspected.
+        self._num_allocations: int = 0
+        self._num_frees: int = 0
+
+        # Pair range tasks of which some pairs have been generated:
+        # task ID -> (index of the next pair, time spent on the previous pairs).
+        self._pair_progress: Dict[int, Tuple[int, float]] = {}
+
+    def upload_task_graph(self, graph: TaskGraph) -> None:
+        super().upload_task_graph(graph)
+        self._timebin_heap = []
+        self._timebin_starts = {}
+        self._blocked_on_resources = set()
+        self._resources_checked = set()
+        self._pair_progress = {}
+
+    def next_pair_index(self, tid: int) -> int:
+        """Index of the next pair to generate by the given pair range task."""
+        return self._pair_progress.get(tid, (0, 0))[0]
+
+    def collect_events(self) -> None:
+        if self._memmgr is None:
+            return
+        num_allocations = self._memmgr.num_allocations
+        if num_allocations != self._num_allocations:
+            self._num_allocations = num_allocations
+            self.notify(SchedulerEvent(SchedulerEventType.MEMORY_ALLOCATED))
+        num_frees = self._memmgr.num_frees
+        if num_frees != self._num_frees:
+            self._num_frees = num_frees
+            self.notify(SchedulerEvent(SchedulerEventType.MEMORY_FREED))
+
+    def handle_event(self, event: SchedulerEvent) -> None:
+        super().handle_event(event)
+        if event.typ == SchedulerEventType.MEMORY_FREED:
+            # Only blocked tasks can become unblocked.
+            for tid in list(self._blocked_on_resources):
+                self._blocked_on_resources.discard(tid)
+                self._lacks_resources(tid)
+        elif event.typ == SchedulerEventType.MEMORY_ALLOCATED:
+            # Roots of which the resources were available may now be blocked. They
+            # are checked again when they are inspected (see `_lacks_resources`).
+            self._resources_checked = set()
+
+    def _lacks_resources(self, tid: int) -> bool:
+        # Whether not all resources of the root are available.
+        if tid in self._blocked_on_resources:
+            return True
+        if tid in self._resources_checked:
+            return False
+        if self.are_resources_available(tid):
+            self._resources_checked.add(tid)
+            return False
+        self._blocked_on_resources.add(tid)
+        return True
 
     def timebin_for_task(self, tid: int) -> EhiNetworkTimebin:
         assert self._task_graph is not None
         task = self._task_graph.get_tinfo(tid).task
-        assert isinstance(task, SinglePairTask) or isinstance(task, MultiPairTask)
+        assert isinstance(task, (SinglePairTask, MultiPairTask, PairRangeTask))
         drv_mem = self._driver._memory
         rrcall = drv_mem.read_shared_rrcall(task.shared_ptr)
         process = self._memmgr.get_process(task.pid)
@@ -1038,6 +1984,194 @@ class QpuEdfScheduler(EdfScheduler):
             },
         )
 
+    def _push_timebin(self, tid: int, now: float) -> None:
+        # Find the time of the next netschedule timebin that allows this EPR task.
+        assert self._network_schedule is not None
+        bin = self.timebin_for_task(tid)
+        self._task_logger.info(f"EPR ready: task {tid}, bin: {bin}")
+        delta = self._network_schedule.next_specific_bin(now, bin)
+        self._task_logger.info(f"EPR ready: task {tid}, delta: {delta}")
+        bin_start = now + delta
+        if self._timebin_starts.get(tid) == bin_start:
+            return  # already in the heap
+        self._timebin_starts[tid] = bin_start
+        entry = (bin_start, self._task_graph.order_of(tid), tid)
+        heapq.heappush(self._timebin_heap, entry)
+
+    def _check_timebins(
+        self, now: float, blocked: Container[int]
+    ) -> Tuple[List[int], Optional[Tuple[int, int]]]:
+        """Find the EPR roots that can be executed in the current time bin, and the
+        EPR root (if any) that has to wait the shortest for its time bin.
+
+        EPR roots are kept in a heap ordered by the start of their next time bin,
+        so only EPR tasks that just became roots (see `update_status`) or whose bin
+        has passed need a lookup in the network schedule.
+
+        :param now: current time
+        :param blocked: tasks that are blocked on resources; these are ignored
+        :return: 2-tuple of (IDs of EPR tasks that can be executed now,
+            (task ID, delta) of the EPR task that waits for the next bin)
+        """
+        assert self._task_graph is not None
+        heap = self._timebin_heap
+        is_epr_root = self._task_graph.is_epr_root
+
+        # Entries for bins that start now (or have passed).
+        in_bin: List[Tuple[float, int, int]] = []
+        while len(heap) > 0 and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            bin_start, _, tid = entry
+            if not is_epr_root(tid) or self._timebin_starts.get(tid) != bin_start:
+                # Task has been executed or the entry is outdated.
+                if not is_epr_root(tid):
+                    self._timebin_starts.pop(tid, None)
+            elif bin_start < now:
+                # Bin has passed; find the next one.
+                self._push_timebin(tid, now)
+            else:
+                in_bin.append(entry)
+        for entry in in_bin:
+            heapq.heappush(heap, entry)
+        epr_ready = [tid for (_, _, tid) in sorted(in_bin) if tid not in blocked]
+
+        # Find the earliest future bin of an EPR task that is not blocked.
+        skipped: List[Tuple[float, int, int]] = []
+        wait_for_bin: Optional[Tuple[int, int]] = None
+        while len(heap) > 0:
+            bin_start, _, tid = heap[0]
+            if not is_epr_root(tid) or self._timebin_starts.get(tid) != bin_start:
+                heapq.heappop(heap)
+                if not is_epr_root(tid):
+                    self._timebin_starts.pop(tid, None)
+            elif bin_start <= now or tid in blocked:
+                skipped.append(heapq.heappop(heap))
+            else:
+                wait_for_bin = (tid, bin_start - now)  # type: ignore
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return epr_ready, wait_for_bin
+
+    def qubits_used_by(self, tid: int) -> Optional[FrozenSet[int]]:
+        """
+        Returns the physical qubits that the given task acts on, as far as known
+        now. Tasks that act on disjoint qubits can be executed on different lanes
+        at the same time.
+
+        EPR tasks use the communication qubits and the network stack. Local
+        routines use the qubits their virtual qubits are mapped to, and the qubits
+        that operations on those qubits go through according to the topology
+        (e.g. the electron for carbon qubits in an NV center). Memory qubits that
+        still have to be allocated are not included, since they are chosen from
+        the free qubits, which no other task acts on.
+
+        :param tid: ID of the task
+        :return: IDs of the physical qubits, or None if the task may act on any
+            qubit (i.e. it cannot be executed concurrently with other tasks)
+        """
+        assert self._task_graph is not None
+        task = self._task_graph.get_tinfo(tid).task
+        comm_ids = self._memmgr.comm_phys_ids
+        if isinstance(task, SinglePairTask) or isinstance(task, MultiPairTask):
+            # There is a single network stack, so EPR tasks never overlap.
+            return comm_ids | {NETSTACK_QUBIT_ID}
+        elif isinstance(task, PairRangeTask):
+            if task.callback_name is not None:
+                # Same as callback tasks.
+                return None
+            return comm_ids | {NETSTACK_QUBIT_ID}
+        elif isinstance(task, LocalRoutineTask):
+            lrcall = self._driver._memory.read_shared_lrcall(task.shared_ptr)
+            process = self._memmgr.get_process(task.pid)
+            local_routine = process.get_local_routine(lrcall.routine_name)
+            used: Set[int] = set()
+            for virt_id in local_routine.metadata.qubit_use:
+                phys_id = self._memmgr.phys_id_for(task.pid, virt_id)
+                if phys_id is not None:
+                    used.add(phys_id)
+                    used |= self._memmgr.mediating_phys_ids(phys_id)
+                elif self._memmgr.is_comm_virt_id(task.pid, virt_id):
+                    # Allocating a communication qubit interferes with EPR tasks.
+                    used |= comm_ids
+            return frozenset(used)
+        else:
+            # Callback tasks: the qubits of their routine are not checked.
+            return None
+
+    def estimate_duration_per_qubit(self, tid: int) -> None:
+        """
+        Estimates the duration of a local routine task again, now that (some of)
+        its virtual qubits are mapped to physical qubits, using the durations of
+        the gates on those qubits. Gates on qubits that are not mapped yet count
+        with their worst-case duration. Other tasks are not changed.
+
+        :param tid: ID of a task that has no predecessors
+        """
+        assert self._task_graph is not None
+        task = self._task_graph.get_tinfo(tid).task
+        if not isinstance(task, LocalRoutineTask):
+            return
+        lrcall = self._driver._memory.read_shared_lrcall(task.shared_ptr)
+        process = self._memmgr.get_process(task.pid)
+        local_routine = process.get_local_routine(lrcall.routine_name)
+        virt_to_phys = {
+            virt_id: self._memmgr.phys_id_for(task.pid, virt_id)
+            for virt_id in local_routine.metadata.qubit_use
+        }
+        task.duration = TaskDurationEstimator.lr_duration_per_qubit(
+            self._memmgr.get_ehi(), local_routine, virt_to_phys
+        )
+
+    def _qubits_in_use(self) -> Optional[Set[int]]:
+        # Qubits that running tasks act on, or None if a running task may act on
+        # any qubit.
+        in_use: Set[int] = set()
+        for running in self._running:
+            qubits = self.qubits_used_by(running)
+            if qubits is None:
+                return None
+            in_use |= qubits
+        return in_use
+
+    def _conflicts_with(self, tid: int, in_use: Optional[Set[int]]) -> bool:
+        # Whether the task may act on any of the qubits in use (see
+        # `_qubits_in_use`).
+        if in_use is None:
+            return True
+        qubits = self.qubits_used_by(tid)
+        return qubits is None or not qubits.isdisjoint(in_use)
+
+    def tasks_conflicting_with_running(self, tids: List[int]) -> Set[int]:
+        """
+        Returns the given tasks that cannot be executed now because they act on
+        qubits that a running task acts on.
+
+        :param tids: IDs of tasks that are not running
+        :return: IDs of the conflicting tasks
+        """
+        in_use = self._qubits_in_use()
+        return {tid for tid in tids if self._conflicts_with(tid, in_use)}
+
+    def _exceeds_gap(self, tid: int, gap: float) -> bool:
+        assert self._task_graph is not None
+        task = self._task_graph.get_tinfo(tid).task
+        if task.is_epr_task():
+            return False
+        return task.duration is None or task.duration > gap
+
+    def tasks_exceeding_gap(self, tids: List[int], gap: float) -> Set[int]:
+        """
+        Returns the given non-EPR tasks that may not finish within the given time,
+        based on their estimated duration. Tasks without estimated duration are
+        included.
+
+        :param tids: IDs of tasks
+        :param gap: time until the next usable time bin
+        :return: IDs of the tasks that do not fit in the gap
+        """
+        return {tid for tid in tids if self._exceeds_gap(tid, gap)}
+
     def are_resources_available(self, tid: int) -> bool:
         assert self._task_graph is not None
         task = self._task_graph.get_tinfo(tid).task
@@ -1052,15 +2186,16 @@ class QpuEdfScheduler(EdfScheduler):
             # Get virt ID which would be need to be allocated
             virt_id = routine.request.virt_ids.get_id(task.pair_index)
 
-            # Check if virt ID is available by trying to allocate
-            # (without actually allocating)
-
-            try:
-                self._memmgr.allocate(task.pid, virt_id)
-                self._memmgr.free(task.pid, virt_id)
-                return True
-            except AllocError:
-                return False
+            # Check if virt ID is available (without actually allocating)
+            return self._memmgr.can_allocate(task.pid, [virt_id])
+        elif isinstance(task, PairRangeTask):
+            # Only the next pair is generated when the task is executed.
+            drv_mem = self._driver._memory
+            rrcall = drv_mem.read_shared_rrcall(task.shared_ptr)
+            process = self._memmgr.get_process(task.pid)
+            routine = process.get_request_routine(rrcall.routine_name)
+            virt_id = routine.request.virt_ids.get_id(self.next_pair_index(tid))
+            return self._memmgr.can_allocate(task.pid, [virt_id])
         elif isinstance(task, MultiPairTask):
             # TODO: refactor
             drv_mem = self._driver._memory
@@ -1078,30 +2213,20 @@ class QpuEdfScheduler(EdfScheduler):
 
             # Get virt IDs which would be need to be allocated
             virt_ids = [routine.request.virt_ids.get_id(i) for i in range(num_pairs)]
-            # Check if virt IDs are available by trying to allocate
-            # (without actually allocating)
-            try:
-                for virt_id in virt_ids:
-                    self._memmgr.allocate(task.pid, virt_id)
-                    self._memmgr.free(task.pid, virt_id)
-                return True
-            except AllocError:
-                return False
+            # Check if virt IDs are available (without actually allocating)
+            return self._memmgr.can_allocate(task.pid, virt_ids)
         elif isinstance(task, LocalRoutineTask):
             drv_mem = self._driver._memory
             lrcall = drv_mem.read_shared_lrcall(task.shared_ptr)
             process = self._memmgr.get_process(task.pid)
             local_routine = process.get_local_routine(lrcall.routine_name)
-            virt_ids = local_routine.metadata.qubit_use
-            try:
-                for virt_id in virt_ids:
-                    if self._memmgr.phys_id_for(task.pid, virt_id) is not None:
-                        continue  # already allocated
-                    self._memmgr.allocate(task.pid, virt_id)
-                    self._memmgr.free(task.pid, virt_id)
-                return True
-            except AllocError:
-                return False
+            # Virt IDs that are already allocated do not need to be checked.
+            to_allocate = [
+                virt_id
+                for virt_id in local_routine.metadata.qubit_use
+                if self._memmgr.phys_id_for(task.pid, virt_id) is None
+            ]
+            return self._memmgr.can_allocate(task.pid, to_allocate)
         else:
             self._logger.info(
                 f"Checking if resources are available for task type {type(task)}, "
@@ -1111,113 +2236,140 @@ class QpuEdfScheduler(EdfScheduler):
             # resources so they can always return `True` here.
             return True
 
+    def handle_task(
+        self, task_id: int, driver: Optional[Driver] = None
+    ) -> Generator[EventExpression, None, None]:
+        assert self._task_graph is not None
+        task = self._task_graph.get_tinfo(task_id).task
+        if isinstance(task, PairRangeTask):
+            yield from self.handle_pair(task, driver)
+        else:
+            yield from super().handle_task(task_id, driver)
+
+    def handle_pair(
+        self, task: PairRangeTask, driver: Optional[Driver] = None
+    ) -> Generator[EventExpression, None, None]:
+        """
+        Generates the next pair of a pair range task (followed by its callback).
+        The task stays in the task graph until its last pair has been generated,
+        and is scheduled again for each pair, so that resources and time bins are
+        checked per pair.
+
+        :param task: The pair range task.
+        :param driver: The driver to execute the pair with (see `handle_task`).
+        :return: None
+        """
+        tid = task.task_id
+        index, busy = self._pair_progress.get(tid, (0, 0))
+
+        before = ns.sim_time()
+        if index == 0:
+            self._task_started(task, before)
+
+        if driver is None:
+            driver = self._driver
+        assert isinstance(driver, QpuDriver)
+        success = yield from driver.handle_pair(task, index)
+        if not success:
+            self._task_logger.info(f"pair {index} of task {tid} failed")
+            return
+
+        after = ns.sim_time()
+        self._decrease_deadlines(before, after)
+        busy += after - before
+        if index + 1 == task.num_pairs:
+            self._pair_progress.pop(tid, None)
+            self._task_finished(task, after, busy)
+            return
+
+        self._task_logger.info(f"generated pair {index} of task {tid}")
+        self._pair_progress[tid] = (index + 1, busy)
+        # The next pair needs its own qubit and time bin.
+        self._resources_checked.discard(tid)
+        self._lacks_resources(tid)
+        if self._network_schedule is not None:
+            self._push_timebin(tid, after)
+
     def update_status(self) -> None:
         tg = self._task_graph
 
-        if tg is None or len(tg.get_tasks()) == 0:
+        if tg is None or len(tg) == 0:
             self._status = SchedulerStatus(status={Status.GRAPH_EMPTY}, params={})
             return
 
-        # All tasks that have no predecessors, internal nor external.
-        no_predecessors = tg.get_roots()
-
-        # All tasks that have only external predecessors.
-        blocked_on_other_core = tg.get_tasks_blocked_only_on_external()
-
-        # All EPR (SinglePair or MultiPair) tasks that have no predecessors,
-        # internal nor external.
-        epr_no_predecessors = [
-            tid for tid in no_predecessors if tg.get_tinfo(tid).task.is_epr_task()
-        ]
+        # Whether there are tasks that have only external predecessors.
+        blocked_on_other_core = tg.has_tasks_blocked_only_on_external()
 
         # All tasks without predecessors for which not all resources are availables.
-        blocked_on_resources = [
-            tid for tid in no_predecessors if not self.are_resources_available(tid)
-        ]
-
-        # All non-EPR tasks that are ready for execution.
-        non_epr_ready = [
-            tid
-            for tid in no_predecessors
-            if tid not in epr_no_predecessors and tid not in blocked_on_resources
-        ]
-
-        # All EPR tasks that have no predecessors and are not blocked on resources.
-        epr_no_preds_not_blocked = [
-            tid for tid in epr_no_predecessors if tid not in blocked_on_resources
-        ]
+        # Tasks that were roots already have been checked when handling events, or
+        # are checked when the policy inspects them.
+        # EPR tasks that just became roots are looked up in the network schedule.
+        now = ns.sim_time()
+        for tid in tg.take_new_roots():
+            self._lacks_resources(tid)
+            if self._network_schedule is not None and tg.is_epr_root(tid):
+                self._push_timebin(tid, now)
+            elif self._per_qubit_durations:
+                self.estimate_duration_per_qubit(tid)
+        blocked_on_resources = self._blocked_on_resources
+        lacks_resources = _NotReady([], [self._lacks_resources])
+
+        # Tasks that are executed on another lane, and tasks that would act on the
+        # same qubits (only with multiple lanes).
+        busy = _NotReady([self._running])
+        if len(self._running) > 0:
+            in_use = self._qubits_in_use()
+            busy = _NotReady(
+                [self._running], [lambda tid: self._conflicts_with(tid, in_use)]
+            )
 
         # All EPR tasks that can be immediately executed.
-        epr_ready = []
+        epr_ready: List[int]
 
         # The next EPR task (if any) that is ready to execute but needs to wait for its
         # corresponding time bin.
         epr_wait_for_bin: Optional[Tuple[int, int]] = None  # (task ID, delta)
 
-        time_until_bin: Dict[int, int] = {}  # task ID -> time until bin
-
-        now = ns.sim_time()
-        for e in epr_no_preds_not_blocked:
-            if self._network_schedule is not None:
-                # Find the time until the next netschedule timebin that allows this EPR task.
-                bin = self.timebin_for_task(e)
-                self._task_logger.info(f"EPR ready: task {e}, bin: {bin}")
-                delta = self._network_schedule.next_specific_bin(now, bin)
-                time_until_bin[e] = delta
-                self._task_logger.info(f"EPR ready: task {e}, delta: {delta}")
-                if delta == 0:
-                    epr_ready.append(e)
-            else:
-                # No network schedule: immediate just execute the EPR task
-                epr_ready.append(e)
-
-        epr_non_zero_delta = {
-            tid: delta for tid, delta in time_until_bin.items() if delta > 0
-        }
-        if len(epr_non_zero_delta) > 0:
-            sorted_by_delta = sorted(
-                epr_non_zero_delta.items(), key=lambda item: item[1]
+        if self._network_schedule is not None:
+            epr_ready, epr_wait_for_bin = self._check_timebins(now, lacks_resources)
+            epr_ready = [e for e in epr_ready if e not in busy]
+        else:
+            # No network schedule: immediate just execute the first EPR task
+            first = tg.get_first_root(
+                skip=_NotReady([busy], [self._lacks_resources]), epr=True
             )
-            earliest, delta = sorted_by_delta[0]
-            epr_wait_for_bin = (earliest, delta)
+            epr_ready = [first] if first is not None else []
 
         self._task_logger.info(f"epr_wait_for_bin: {epr_wait_for_bin}")
 
+        # All non-EPR tasks that are not ready for execution.
+        not_ready_if: List[Callable[[int], bool]] = [tg.is_epr_root]
+        if self._timebin_lookahead and epr_wait_for_bin is not None:
+            # Only fill the gap until the next usable time bin.
+            _, gap = epr_wait_for_bin
+            not_ready_if.append(lambda tid: self._exceeds_gap(tid, gap))
+        not_ready = _NotReady([busy], not_ready_if + [self._lacks_resources])
+
+        to_return: Optional[int] = None
         if len(epr_ready) > 0:
             self._task_logger.info(f"epr_ready: {epr_ready}")
+            to_return = self._policy.select_epr_task(tg, epr_ready)
             self._status = SchedulerStatus(
-                status={Status.EPR_GEN}, params={"task_id": epr_ready[0]}
+                status={Status.EPR_GEN}, params={"task_id": to_return}
+            )
+            return
+
+        # Let the policy choose one of the ready non-EPR tasks.
+        to_return = self._policy.select_root(tg, not_ready, epr_wait_for_bin)
+
+        if to_return is not None:
+            self._logger.debug(f"Return task {to_return}")
+            self._task_logger.debug(f"Return task {to_return}")
+            self._status = SchedulerStatus(
+                status={Status.NEXT_TASK}, params={"task_id": to_return}
             )
-        elif len(non_epr_ready) > 0:
-            with_deadline = [
-                t for t in non_epr_ready if tg.get_tinfo(t).deadline is not None
-            ]
-            if not self._use_deadlines:
-                with_deadline = []
-            if len(with_deadline) > 0:
-                # Sort them by deadline and return the one with the earliest deadline
-                deadlines = {t: tg.get_tinfo(t).deadline for t in with_deadline}
-                sorted_by_deadline = sorted(deadlines.items(), key=lambda item: item[1])  # type: ignore
-                to_return = sorted_by_deadline[0][0]
-                self._logger.debug(f"Return task {to_return}")
-                self._task_logger.debug(f"Return task {to_return}")
-                self._status = SchedulerStatus(
-                    status={Status.NEXT_TASK}, params={"task_id": to_return}
-                )
-            else:
-                # No deadlines
-                if self._deterministic:
-                    index = 0
-                else:
-                    index = random.randint(0, len(non_epr_ready) - 1)
-                to_return = non_epr_ready[index]
-                self._logger.debug(f"Return task {to_return}")
-                self._task_logger.debug(f"Return task {to_return}")
-                self._status = SchedulerStatus(
-                    status={Status.NEXT_TASK}, params={"task_id": to_return}
-                )
         else:
-            if len(blocked_on_other_core) > 0:
+            if blocked_on_other_core:
                 self._logger.debug("Waiting other core")
                 self._task_logger.debug("Waiting other core")
                 self._status.status.add(Status.WAITING_OTHER_CORE)
@@ -1231,16 +2383,49 @@ class QpuEdfScheduler(EdfScheduler):
                 task_id, delta = epr_wait_for_bin
                 self._status.status.add(Status.WAITING_TIME_BIN)
                 self._status.params["delta"] = delta
+            if len(self._running) > 0:
+                self._logger.debug("Waiting QPU lane")
+                self._task_logger.debug("Waiting QPU lane")
+                self._status.status.add(Status.WAITING_CORE)
 
             if len(self.status.status) == 0:
                 raise RuntimeError
 
+    def _wait_for_status(self) -> Generator[EventExpression, None, None]:
+        ev_expr = self.await_port_input(self.node_scheduler_in_port)
+        if Status.WAITING_OTHER_CORE in self.status.status:
+            ev_expr = ev_expr | self.await_signal(
+                sender=self._other_scheduler,
+                signal_label=SIGNAL_TASK_COMPLETED,
+            )
+        if Status.WAITING_CORE in self.status.status:
+            ev_expr = ev_expr | self.await_signal(
+                sender=self,
+                signal_label=SIGNAL_CORE_IDLE,
+            )
+        if Status.WAITING_RESOURCES in self.status.status:
+            ev_expr = ev_expr | self.await_signal(
+                sender=self._memmgr,
+                signal_label=SIGNAL_MEMORY_FREED,
+            )
+        if Status.WAITING_TIME_BIN in self.status.status:
+            delta = self.status.params["delta"]
+            self._schedule_after(delta, EVENT_WAIT)
+            ev_timebin = EventExpression(source=self, event_type=EVENT_WAIT)
+            ev_expr = ev_expr | ev_timebin
+        yield ev_expr
+
     def run(self) -> Generator[EventExpression, None, None]:
+        if len(self._cores) > 0:
+            yield from self._run_multi_core()
+            return
         while True:
             self._task_logger.debug("updating status...")
             self._status = SchedulerStatus(status=set(), params={})
-            self.update_external_predcessors()
+            self.process_events()
             self.update_status()
+            if self._trace_hook is not None:
+                self.trace_status(self.status)
             self._task_logger.debug(f"status: {self.status.status}")
             if Status.EPR_GEN in self.status.status:
                 task_id = self.status.params["task_id"]
@@ -1249,20 +2434,4 @@ class QpuEdfScheduler(EdfScheduler):
                 task_id = self.status.params["task_id"]
                 yield from self.handle_task(task_id)
             else:
-                ev_expr = self.await_port_input(self.node_scheduler_in_port)
-                if Status.WAITING_OTHER_CORE in self.status.status:
-                    ev_expr = ev_expr | self.await_signal(
-                        sender=self._other_scheduler,
-                        signal_label=SIGNAL_TASK_COMPLETED,
-                    )
-                if Status.WAITING_RESOURCES in self.status.status:
-                    ev_expr = ev_expr | self.await_signal(
-                        sender=self._memmgr,
-                        signal_label=SIGNAL_MEMORY_FREED,
-                    )
-                if Status.WAITING_TIME_BIN in self.status.status:
-                    delta = self.status.params["delta"]
-                    self._schedule_after(delta, EVENT_WAIT)
-                    ev_timebin = EventExpression(source=self, event_type=EVENT_WAIT)
-                    ev_expr = ev_expr | ev_timebin
-                yield ev_expr
+                yield from self._wait_for_status()
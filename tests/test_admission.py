@@ -0,0 +1,89 @@
+from typing import Dict
+
+from qoala.runtime.admission import AdmissionController, QubitDemand
+
+
+class QubitState:
+    def __init__(self, num_comm: int, num_mem: int) -> None:
+        self.free = QubitDemand(num_comm, num_mem)
+        self.allocated: Dict[int, QubitDemand] = {}
+
+    def allocate(self, pid: int, comm: int, mem: int) -> None:
+        demand = QubitDemand(comm, mem)
+        self.free = self.free - demand
+        self.allocated[pid] = self.allocated.get(pid, QubitDemand()) + demand
+
+    def free_all(self, pid: int) -> None:
+        self.free = self.free + self.allocated.pop(pid, QubitDemand())
+
+    def controller(self) -> AdmissionController:
+        return AdmissionController(
+            lambda: self.free, lambda pid: self.allocated.get(pid, QubitDemand())
+        )
+
+
+def test_qubit_demand():
+    assert QubitDemand(1, 2) + QubitDemand(1, 1) == QubitDemand(2, 3)
+    assert QubitDemand(1, 2) - QubitDemand(2, 1) == QubitDemand(0, 1)
+    assert QubitDemand(1, 2).fits_in(QubitDemand(1, 3))
+    assert not QubitDemand(1, 2).fits_in(QubitDemand(0, 3))
+
+
+def test_reservations():
+    qubits = QubitState(num_comm=1, num_mem=2)
+    controller = qubits.controller()
+
+    assert controller.try_admit(0, "b0", QubitDemand(1, 1), now=0)
+    # The comm qubit is reserved for pid 0, even though it is still free.
+    assert not controller.try_admit(1, "b0", QubitDemand(1, 0), now=0)
+    assert controller.try_admit(2, "b0", QubitDemand(0, 1), now=0)
+    assert controller.waiting_pids == [1]
+
+    # Allocated qubits are no longer counted as reserved.
+    qubits.allocate(0, 1, 1)
+    assert controller.outstanding(0) == QubitDemand()
+    assert not controller.try_admit(1, "b0", QubitDemand(1, 0), now=10)
+
+    qubits.free_all(0)
+    controller.release(0)
+    assert controller.try_admit(1, "b0", QubitDemand(1, 0), now=20)
+    assert controller.waiting_pids == []
+
+    assert [(r.pid, r.delay) for r in controller.records] == [(0, 0), (2, 0), (1, 20)]
+    assert controller.max_queueing_delay == 20
+
+
+def test_always_admit_without_reservations():
+    qubits = QubitState(num_comm=1, num_mem=0)
+    controller = qubits.controller()
+    # The block needs more qubits than the node has, but nothing else runs.
+    assert controller.try_admit(0, "b0", QubitDemand(2, 0), now=0)
+
+
+def test_deadline_order():
+    qubits = QubitState(num_comm=1, num_mem=1)
+    controller = qubits.controller()
+
+    assert controller.try_admit(0, "b0", QubitDemand(1, 1), now=0)
+    controller.block_released(1, "start", now=0)
+    controller.block_released(2, "start", now=0)
+    assert not controller.try_admit(1, "b1", QubitDemand(1, 0), 5, {"start": 100})
+    assert not controller.try_admit(2, "b1", QubitDemand(1, 0), 5, {"start": 50})
+    assert controller.order([0, 1, 2, 3]) == [2, 1, 0, 3]
+
+    controller.release(0)
+    # Pid 2 has the earliest deadline, so pid 1 cannot take its comm qubit.
+    assert not controller.try_admit(1, "b1", QubitDemand(1, 0), now=60)
+    assert controller.try_admit(2, "b1", QubitDemand(1, 0), now=60)
+    assert controller.records[-1].deadline == 50
+    assert controller.num_deadline_misses == 1
+
+    controller.remove(1)
+    assert controller.waiting_pids == []
+
+
+if __name__ == "__main__":
+    test_qubit_demand()
+    test_reservations()
+    test_always_admit_without_reservations()
+    test_deadline_order()
@@ -0,0 +1,101 @@
+from qoala.runtime.analysis import TaskGraphAnalyzer
+from qoala.runtime.task import (
+    HostLocalTask,
+    LocalRoutineTask,
+    PostCallTask,
+    PreCallTask,
+    ProcessorType,
+    QoalaTask,
+    SinglePairTask,
+    TaskGraph,
+)
+
+
+class CpuTask(QoalaTask):
+    def __init__(self, task_id: int, duration: int) -> None:
+        super().__init__(task_id, ProcessorType.CPU, 0, duration)
+
+
+class QpuTask(QoalaTask):
+    def __init__(self, task_id: int, duration: int) -> None:
+        super().__init__(task_id, ProcessorType.QPU, 0, duration)
+
+
+def test_critical_path():
+    graph = TaskGraph()
+    graph.add_tasks([CpuTask(0, 100), QpuTask(1, 500), CpuTask(2, 200), CpuTask(3, 50)])
+    graph.add_precedences([(0, 1), (1, 3), (2, 3)])
+
+    analysis = TaskGraphAnalyzer(graph).critical_path()
+    assert analysis.length == 650
+    assert analysis.critical_path == [0, 1, 3]
+    assert analysis.earliest_start == {0: 0, 1: 100, 2: 0, 3: 600}
+    assert analysis.latest_start == {0: 0, 1: 100, 2: 400, 3: 600}
+    assert analysis.slack(2) == 400
+    assert analysis.latest_finish(2) == 600
+    assert analysis.critical_tasks() == [0, 1, 3]
+
+
+def test_start_times():
+    graph = TaskGraph()
+    graph.add_tasks([CpuTask(0, 100), CpuTask(1, 100)])
+    graph.add_precedences([(0, 1)])
+    graph.get_tinfo(0).start_time = 50
+
+    analysis = TaskGraphAnalyzer(graph).critical_path()
+    assert analysis.length == 250
+    assert analysis.earliest_start == {0: 50, 1: 150}
+
+
+def test_processor_paths():
+    graph = TaskGraph()
+    graph.add_tasks([CpuTask(0, 100), QpuTask(1, 500), CpuTask(2, 200), QpuTask(3, 50)])
+    graph.add_precedences([(0, 1), (1, 2), (0, 3)])
+
+    analyzer = TaskGraphAnalyzer(graph)
+    for proc_type in [ProcessorType.CPU, ProcessorType.QPU]:
+        # Same as the critical path of the partial graph.
+        partial = graph.partial_graph(proc_type)
+        expected = TaskGraphAnalyzer(partial).critical_path().length
+        assert analyzer.critical_path(proc_type).length == expected
+    assert analyzer.critical_path(ProcessorType.CPU).length == 300
+    assert analyzer.critical_path(ProcessorType.QPU).length == 500
+
+
+def test_blocks():
+    pid = 0
+    graph = TaskGraph()
+    graph.add_tasks(
+        [
+            HostLocalTask(0, pid, "b0", 100),
+            PreCallTask(1, pid, "b1", 1, 10),
+            LocalRoutineTask(2, pid, "b1", 1, 300),
+            PostCallTask(3, pid, "b1", 1, 10),
+            PreCallTask(4, pid, "b2", 4, 10),
+            SinglePairTask(5, pid, 0, 4, 1000),
+            SinglePairTask(6, pid, 1, 4, 1000),
+            PostCallTask(7, pid, "b2", 4, 10),
+        ]
+    )
+    graph.add_precedences(
+        [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (4, 6), (5, 7), (6, 7)]
+    )
+
+    analysis = TaskGraphAnalyzer(graph).analyze()
+    assert analysis.critical_path.length == 1440
+    assert analysis.critical_blocks == ["b0", "b1", "b2"]
+    assert analysis.work == {ProcessorType.CPU: 140, ProcessorType.QPU: 2300}
+    assert analysis.block_work["b2"] == {ProcessorType.CPU: 20, ProcessorType.QPU: 2000}
+    # The QPU has to execute both pairs, which takes longer than the critical path.
+    assert analysis.makespan_lower_bound == 2300
+    assert analysis.bottleneck == ProcessorType.QPU
+    assert analysis.min_period == 2300
+    assert analysis.bottleneck_blocks() == ["b2", "b1"]
+    assert "makespan lower bound: 2300" in str(analysis)
+
+
+if __name__ == "__main__":
+    test_critical_path()
+    test_start_times()
+    test_processor_paths()
+    test_blocks()
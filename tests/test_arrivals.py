@@ -0,0 +1,36 @@
+import itertools
+import random
+
+from qoala.runtime.arrivals import periodic_arrivals, poisson_arrivals
+from qoala.runtime.program import ProgramInput
+
+
+def test_periodic_arrivals():
+    inputs = [ProgramInput({"x": i}) for i in range(3)]
+    arrivals = list(periodic_arrivals(100, inputs))
+    assert arrivals == [(100, inputs[0]), (100, inputs[1]), (100, inputs[2])]
+
+    # Infinite inputs, limited number of arrivals.
+    arrivals = list(periodic_arrivals(50, itertools.repeat(ProgramInput.empty()), 4))
+    assert len(arrivals) == 4
+    assert all(delta == 50 for delta, _ in arrivals)
+
+
+def test_poisson_arrivals():
+    inputs = itertools.repeat(ProgramInput.empty())
+    arrivals = list(poisson_arrivals(0.01, inputs, 1000, rng=random.Random(42)))
+    assert len(arrivals) == 1000
+
+    deltas = [delta for delta, _ in arrivals]
+    assert all(delta >= 0 for delta in deltas)
+    # Mean inter-arrival time is 1 / rate = 100.
+    assert 90 < sum(deltas) / len(deltas) < 110
+
+    # Same seed gives the same arrivals.
+    again = list(poisson_arrivals(0.01, inputs, 1000, rng=random.Random(42)))
+    assert [delta for delta, _ in again] == deltas
+
+
+if __name__ == "__main__":
+    test_periodic_arrivals()
+    test_poisson_arrivals()
@@ -3,6 +3,7 @@ from typing import Dict, Generator
 import netsquid as ns
 
 from pydynaa import EventExpression
+from qoala.runtime.statistics import SchedulerStatistics
 from qoala.runtime.task import ProcessorType, QoalaTask, TaskGraph
 from qoala.sim.driver import Driver
 from qoala.sim.events import EVENT_WAIT
@@ -32,6 +33,9 @@ class MockDriver(Driver):
         return True
         yield
 
+    def for_core(self, core: int) -> "MockDriver":
+        return MockDriver()
+
 
 def test_update_status_one_root():
     graph = TaskGraph()
@@ -94,8 +98,88 @@ def test_edf_2():
     assert scheduler._driver._executed_tasks == {1: 0, 2: 500, 4: 580, 3: 680}
 
 
+def test_trace():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(0, 200), SimpleTask(1, 500)])
+    graph.add_precedences([(0, 1)])
+
+    scheduler = CpuEdfScheduler("sched", 0, MockDriver(), None, None)
+    scheduler.add_tasks(graph.get_tasks())
+    scheduler.enable_trace()
+
+    ns.sim_reset()
+    scheduler.start()
+    ns.sim_run()
+
+    assert scheduler.get_trace() == [
+        (0, "sched", frozenset({Status.NEXT_TASK}), 0),
+        (200, "sched", frozenset({Status.NEXT_TASK}), 1),
+        (700, "sched", frozenset({Status.GRAPH_EMPTY}), None),
+    ]
+
+
+def test_other_core():
+    graph1 = TaskGraph()
+    graph1.add_tasks([SimpleTask(0, 300)])
+    graph2 = TaskGraph()
+    graph2.add_tasks([SimpleTask(1, 100), SimpleTask(2, 50)])
+    graph2.add_ext_precedences([(0, 1)])
+
+    scheduler1 = CpuEdfScheduler("sched1", 0, MockDriver(), None, None)
+    scheduler2 = CpuEdfScheduler("sched2", 0, MockDriver(), None, None)
+    scheduler1.set_other_scheduler(scheduler2)
+    scheduler2.set_other_scheduler(scheduler1)
+    scheduler1.add_tasks(graph1.get_tasks())
+    scheduler2.add_tasks(graph2.get_tasks())
+
+    ns.sim_reset()
+    scheduler1.start()
+    scheduler2.start()
+    ns.sim_run()
+
+    assert scheduler1._driver._executed_tasks == {0: 0}
+    # Task 1 can only start after task 0 finished on the other scheduler.
+    assert scheduler2._driver._executed_tasks == {2: 0, 1: 300}
+    assert scheduler1.has_finished(0)
+    assert not scheduler2.has_finished(0)
+
+
+def test_multi_core():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(0, 200), SimpleTask(1, 500), SimpleTask(2, 100)])
+    graph.add_precedences([(0, 2)])
+
+    scheduler = CpuEdfScheduler("sched", 0, MockDriver(), None, None, num_cores=2)
+    scheduler.add_tasks(graph.get_tasks())
+
+    ns.sim_reset()
+    scheduler.start()
+    ns.sim_run()
+
+    core0, core1 = scheduler._cores
+    assert core0._driver._executed_tasks == {0: 0, 2: 200}
+    assert core1._driver._executed_tasks == {1: 0}
+    assert scheduler.get_task_cores() == {0: 0, 1: 1, 2: 0}
+
+    stats = SchedulerStatistics(
+        cpu_tasks_executed=scheduler.get_tasks_executed(),
+        qpu_tasks_executed={},
+        cpu_task_starts=scheduler.get_task_starts(),
+        qpu_task_starts={},
+        cpu_task_ends=scheduler.get_task_ends(),
+        qpu_task_ends={},
+        cpu_task_cores=scheduler.get_task_cores(),
+    )
+    assert stats.cpu_task_starts_per_core == {0: {0: 0, 2: 200}, 1: {1: 0}}
+    assert stats.cpu_core_busy_time(0) == 300
+    assert stats.cpu_core_busy_time(1) == 500
+
+
 if __name__ == "__main__":
     test_update_status_one_root()
     test_update_status_two_roots()
     test_edf_1()
     test_edf_2()
+    test_trace()
+    test_other_core()
+    test_multi_core()
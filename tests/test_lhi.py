@@ -198,6 +198,23 @@ def test_find_gates():
     assert topology.find_multi_gate([0, 0], INSTR_CNOT) is None
 
 
+def test_mediating_qubits():
+    # Gates on carbons of an NV center go through the electron.
+    cfg = TopologyConfig.from_nv_params(3, NvParams())
+    topology = LhiTopologyBuilder.from_config(cfg)
+    assert topology.get_mediating_qubits(0) == set()
+    assert topology.get_mediating_qubits(1) == {0}
+    assert topology.get_mediating_qubits(2) == {0}
+
+    # Qubits that interact with several other qubits are independent.
+    topology = LhiTopologyBuilder.perfect_uniform_default_gates(num_qubits=3)
+    for i in range(3):
+        assert topology.get_mediating_qubits(i) == set()
+
+    topology = LhiTopologyBuilder.perfect_uniform_default_gates(num_qubits=1)
+    assert topology.get_mediating_qubits(0) == set()
+
+
 def test_perfect_qubit():
     qubit_info = LhiTopologyBuilder.perfect_qubit(is_communication=True)
     assert qubit_info.is_communication
@@ -499,6 +516,7 @@ if __name__ == "__main__":
     test_topology_from_config_2()
     test_topology_from_nv_config()
     test_find_gates()
+    test_mediating_qubits()
     test_perfect_qubit()
     test_t1t2_qubit()
     test_perfect_gates()
@@ -259,6 +259,58 @@ def test_alloc_multiple_processes_same_virt_id():
         mgr.allocate(pid1, 1)
 
 
+def test_can_allocate():
+    [pid0, pid1], mgr = setup_manager_multiple_processes(2)
+
+    assert mgr.can_allocate(pid0, [])
+    assert mgr.can_allocate(pid0, [0])
+    assert mgr.can_allocate(pid0, [0, 1])
+    assert not mgr.can_allocate(pid0, [2])
+
+    mgr.allocate(pid0, 0)
+    # Already allocated for pid0.
+    assert not mgr.can_allocate(pid0, [0])
+    # Only physical comm qubit is in use.
+    assert not mgr.can_allocate(pid1, [0])
+    assert not mgr.can_allocate(pid1, [0, 1])
+    assert mgr.can_allocate(pid1, [1])
+
+    # Checking does not allocate anything.
+    assert mgr.phys_id_for(pid1, 1) is None
+
+    mgr.free(pid0, 0)
+    assert mgr.can_allocate(pid1, [0, 1])
+
+
+def test_alloc_reuses_lowest_free_id():
+    [pid0, pid1], mgr = setup_manager_multiple_processes(2, typ="uniform")
+
+    assert mgr.allocate(pid0, 0) == 0
+    assert mgr.allocate(pid0, 1) == 1
+    assert not mgr.can_allocate(pid1, [0])
+
+    mgr.free(pid0, 1)
+    mgr.free(pid0, 0)
+    assert mgr.allocate(pid1, 1) == 0
+    assert mgr.allocate(pid0, 0) == 1
+    assert mgr.virt_id_for(pid1, 0) == 1
+    assert mgr.virt_id_for(pid0, 1) == 0
+
+
+def test_remove_process():
+    [pid0, pid1], mgr = setup_manager_multiple_processes(2)
+
+    mgr.allocate(pid0, 0)
+    assert not mgr.can_allocate(pid1, [0])
+
+    # Removing a process frees the qubits it still has allocated.
+    mgr.remove_process(pid0)
+    assert mgr.get_all_program_ids() == [pid1]
+    assert mgr.virt_id_for(pid1, 0) is None
+    assert mgr.can_allocate(pid1, [0, 1])
+    assert mgr.allocate(pid1, 0) == 0
+
+
 if __name__ == "__main__":
     test_alloc_free_0()
     test_alloc_free_0_1()
@@ -268,3 +320,6 @@ if __name__ == "__main__":
     test_get_unmapped_qubit()
     test_alloc_multiple_processes()
     test_alloc_multiple_processes_same_virt_id()
+    test_can_allocate()
+    test_alloc_reuses_lowest_free_id()
+    test_remove_process()
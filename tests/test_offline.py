@@ -0,0 +1,152 @@
+from qoala.lang.ehi import (
+    EhiNetworkInfo,
+    EhiNetworkSchedule,
+    EhiNetworkTimebin,
+    EhiNodeInfo,
+    UnitModule,
+)
+from qoala.lang.parse import QoalaParser
+from qoala.runtime.offline import OfflineScheduler
+from qoala.runtime.program import ProgramInput, ProgramInstance
+from qoala.runtime.task import ProcessorType, QoalaTask, TaskGraph
+
+EPR_PROGRAM = """
+META_START
+    name: alice
+    parameters:
+    csockets:
+    epr_sockets: 0 -> bob
+META_END
+
+^b0 {type = QC}:
+    run_request() : req_wait_all
+
+^b1 {type = QC}:
+    run_request() : req_sequential
+
+REQUEST req_wait_all
+  callback_type: wait_all
+  callback:
+  return_vars:
+  remote_id: 1
+  epr_socket_id: 0
+  num_pairs: 2
+  virt_ids: increment 0
+  timeout: 1000
+  fidelity: 1.0
+  typ: create_keep
+  role: create
+
+REQUEST req_sequential
+  callback_type: sequential
+  callback:
+  return_vars:
+  remote_id: 1
+  epr_socket_id: 0
+  num_pairs: 2
+  virt_ids: all 0
+  timeout: 1000
+  fidelity: 1.0
+  typ: create_keep
+  role: create
+"""
+
+
+class CpuTask(QoalaTask):
+    def __init__(self, task_id: int, duration: int) -> None:
+        super().__init__(task_id, ProcessorType.CPU, 0, duration)
+
+
+class QpuTask(QoalaTask):
+    def __init__(self, task_id: int, duration: int) -> None:
+        super().__init__(task_id, ProcessorType.QPU, 0, duration)
+
+
+class EprTask(QpuTask):
+    def is_epr_task(self) -> bool:
+        return True
+
+
+def test_list_schedule():
+    graph = TaskGraph()
+    graph.add_tasks([CpuTask(0, 100), QpuTask(1, 500), CpuTask(2, 200), CpuTask(3, 50)])
+    graph.add_precedences([(0, 1), (1, 3)])
+
+    schedule = OfflineScheduler(graph).schedule()
+    assert schedule.start_times == {0: 0, 1: 100, 2: 100, 3: 600}
+    assert schedule.makespan == 650
+    assert schedule.num_deadline_misses == 0
+    assert schedule.execution_order(ProcessorType.CPU) == [0, 2, 3]
+    assert schedule.execution_order(ProcessorType.QPU) == [1]
+
+    # Tasks of each processor are chained, and have their start times.
+    scheduled = schedule.graph
+    assert scheduled.get_tinfo(2).predecessors == {0}
+    assert scheduled.get_tinfo(3).predecessors == {1, 2}
+    assert scheduled.get_tinfo(3).start_time == 600
+    # The original graph is not modified.
+    assert graph.get_tinfo(2).predecessors == set()
+
+
+def test_deadlines():
+    graph = TaskGraph()
+    graph.add_tasks([CpuTask(0, 100), CpuTask(1, 100), CpuTask(2, 100)])
+    graph.add_precedences([(0, 2)])
+    graph.add_deadlines([(1, 150)])
+    graph.add_rel_deadlines([((0, 2), 50)])
+
+    schedule = OfflineScheduler(graph).schedule()
+    # Task 1 has the earliest deadline, so it is executed first.
+    assert schedule.execution_order(ProcessorType.CPU) == [1, 0, 2]
+    # Task 2 must finish within 50 after task 0, which is not possible.
+    assert schedule.deadline_misses == {2: (250, 300)}
+    assert "deadline misses: 1" in str(schedule)
+
+
+def test_start_times_and_timebins():
+    graph = TaskGraph()
+    graph.add_tasks([CpuTask(0, 100), EprTask(1, 100), QpuTask(2, 100)])
+    graph.add_precedences([(1, 2)])
+    graph.get_tinfo(0).start_time = 300
+
+    bin0 = EhiNetworkTimebin(frozenset({0, 1}), {0: 0, 1: 0})
+    bin1 = EhiNetworkTimebin(frozenset({0, 1}), {0: 1, 1: 1})
+    network_schedule = EhiNetworkSchedule(
+        bin_length=200, first_bin=0, bin_pattern=[bin0, bin1], repeat_period=400
+    )
+    scheduler = OfflineScheduler(graph, network_schedule, {1: bin1})
+    schedule = scheduler.schedule()
+    assert schedule.start_times == {0: 300, 1: 200, 2: 300}
+    assert schedule.makespan == 400
+
+
+def test_timebins_for_instances():
+    program = QoalaParser(EPR_PROGRAM).parse()
+    unit_module = UnitModule.from_full_ehi(EhiNodeInfo({}, {}, {}, {}, None))
+    instance = ProgramInstance(3, program, ProgramInput.empty(), unit_module)
+    network_ehi = EhiNetworkInfo.perfect_fully_connected({0: "alice", 1: "bob"}, 100)
+    graph = OfflineScheduler.graph_for_instances([instance], None, network_ehi)
+
+    timebins = OfflineScheduler.timebins_for_instances(
+        [instance], graph, 0, network_ehi, {3: 7}
+    )
+    epr_tasks = [t for t, i in graph.get_tasks().items() if i.task.is_epr_task()]
+    assert len(epr_tasks) == 3  # one multi-pair task and two single-pair tasks
+    expected = EhiNetworkTimebin(frozenset({0, 1}), {0: 3, 1: 7})
+    assert timebins == {tid: expected for tid in epr_tasks}
+
+    # EPR tasks only start in the bin of the instance.
+    other = EhiNetworkTimebin(frozenset({0, 1}), {0: 4, 1: 8})
+    network_schedule = EhiNetworkSchedule(
+        bin_length=200, first_bin=0, bin_pattern=[other, expected], repeat_period=400
+    )
+    schedule = OfflineScheduler(graph, network_schedule, timebins).schedule()
+    for tid in epr_tasks:
+        assert schedule.start_times[tid] % 400 >= 200
+
+
+if __name__ == "__main__":
+    test_list_schedule()
+    test_deadlines()
+    test_start_times_and_timebins()
+    test_timebins_for_instances()
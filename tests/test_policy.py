@@ -0,0 +1,134 @@
+import pytest
+
+from qoala.runtime.policy import (
+    EdfPolicy,
+    FifoPolicy,
+    LlfPolicy,
+    ThroughputPolicy,
+    WfqPolicy,
+    build_scheduling_policy,
+)
+from qoala.runtime.task import ProcessorType, QoalaTask, TaskGraph
+
+
+class SimpleTask(QoalaTask):
+    def __init__(self, task_id: int, duration: int, pid: int = 0) -> None:
+        super().__init__(task_id, ProcessorType.CPU, pid, duration)
+
+
+def setup_graph() -> TaskGraph:
+    graph = TaskGraph()
+    graph.add_tasks(
+        [
+            SimpleTask(0, 500),
+            SimpleTask(1, 100),
+            SimpleTask(2, 400),
+            SimpleTask(3, 50),
+        ]
+    )
+    graph.add_deadlines([(1, 1000), (2, 800)])
+    return graph
+
+
+def test_edf():
+    graph = setup_graph()
+    roots = graph.get_roots()
+    assert EdfPolicy().select_task(graph, roots, set()) == 2
+    assert EdfPolicy().select_task(graph, roots, {2}) == 1
+    assert EdfPolicy().select_task(graph, roots, {1, 2}) == 0
+    assert EdfPolicy(use_deadlines=False).select_task(graph, roots, set()) == 0
+    assert EdfPolicy().select_task(graph, roots, set(roots)) is None
+
+
+def test_fifo():
+    graph = setup_graph()
+    roots = graph.get_roots()
+    assert FifoPolicy().select_task(graph, roots, set()) == 0
+    assert FifoPolicy().select_task(graph, roots, {0, 1}) == 2
+
+
+def test_llf():
+    graph = setup_graph()
+    roots = graph.get_roots()
+    # Laxity of task 1 is 900, laxity of task 2 is 400.
+    assert LlfPolicy().select_task(graph, roots, set()) == 2
+    graph.add_deadlines([(1, 450)])
+    assert LlfPolicy().select_task(graph, roots, set()) == 1
+    assert LlfPolicy().select_task(graph, roots, {1, 2}) == 0
+
+
+def test_wfq():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(i, 100, pid=i) for i in range(4)])
+    roots = graph.get_roots()
+
+    policy = WfqPolicy()
+    policy.register_program_instance(0, "a")
+    policy.register_program_instance(1, "a")
+    policy.register_program_instance(2, "b")
+    policy.register_program_instance(3, "b")
+    policy.set_weight("b", 2)
+
+    assert policy.select_task(graph, roots, set()) == 0
+    policy.task_finished(graph.get_tinfo(0).task, 100)
+    # Flow "a" has received service, so flow "b" is next.
+    assert policy.select_task(graph, roots, {0}) == 2
+    policy.task_finished(graph.get_tinfo(2).task, 100)
+    # Flow "b" has weight 2, so it has received less weighted service.
+    assert policy.select_task(graph, roots, {0, 2}) == 3
+    policy.task_finished(graph.get_tinfo(3).task, 100)
+    assert policy.select_task(graph, roots, {0, 2, 3}) == 1
+
+
+def test_throughput():
+    graph = setup_graph()
+    roots = graph.get_roots()
+    policy = ThroughputPolicy()
+    assert policy.select_task(graph, roots, set()) == 3
+    assert policy.select_task(graph, roots, {3}) == 1
+    # Only tasks that finish before the next time bin.
+    assert policy.select_task(graph, roots, {1, 3}, epr_wait=(10, 450)) == 2
+    assert policy.select_task(graph, roots, {1, 3}, epr_wait=(10, 300)) is None
+
+
+def test_select_root():
+    graph = setup_graph()
+    roots = graph.get_roots()
+    policies = [
+        EdfPolicy(),
+        EdfPolicy(use_deadlines=False),
+        FifoPolicy(),
+        LlfPolicy(),
+        ThroughputPolicy(),
+    ]
+    # Same choice as `select_task` with all roots.
+    for policy in policies:
+        for not_ready in [set(), {2}, {0, 2}, {1, 2}, set(roots)]:
+            expected = policy.select_task(graph, roots, not_ready)
+            assert policy.select_root(graph, not_ready) == expected
+
+
+def test_build_scheduling_policy():
+    assert isinstance(build_scheduling_policy("edf"), EdfPolicy)
+    assert isinstance(build_scheduling_policy("fifo"), FifoPolicy)
+    assert isinstance(build_scheduling_policy("llf"), LlfPolicy)
+    assert isinstance(build_scheduling_policy("wfq"), WfqPolicy)
+    weights = {"a": 2.0}
+    policy = build_scheduling_policy("wfq", wfq_weights=weights)
+    assert isinstance(policy, WfqPolicy)
+    assert policy.weight_of("a") == 2.0 and policy.weight_of("c") == 1
+    policy.set_weight("b", 3.0)
+    assert weights == {"a": 2.0}
+    assert isinstance(build_scheduling_policy("throughput"), ThroughputPolicy)
+    with pytest.raises(ValueError):
+        build_scheduling_policy("unknown")
+
+
+if __name__ == "__main__":
+    test_edf()
+    test_fifo()
+    test_llf()
+    test_wfq()
+    test_throughput()
+    test_select_root()
+    test_build_scheduling_policy()
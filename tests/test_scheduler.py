@@ -1,14 +1,32 @@
+import itertools
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Generator, List, Optional, Tuple
 
 import netsquid as ns
 import pytest
 from netqasm.lang.instr import core
 
-from qoala.lang.ehi import EhiNodeInfo, UnitModule
+from pydynaa import EventExpression
+from qoala.lang.ehi import (
+    EhiNetworkInfo,
+    EhiNetworkSchedule,
+    EhiNetworkTimebin,
+    EhiNodeInfo,
+    UnitModule,
+)
 from qoala.lang.hostlang import BasicBlock, BasicBlockType
 from qoala.lang.parse import QoalaParser
 from qoala.lang.program import QoalaProgram
+from qoala.runtime.admission import QubitDemand
+from qoala.runtime.arrivals import periodic_arrivals
+from qoala.runtime.config import (
+    LatenciesConfig,
+    NetworkScheduleConfig,
+    NtfConfig,
+    ProcNodeConfig,
+    ProcNodeNetworkConfig,
+    TopologyConfig,
+)
 from qoala.runtime.lhi import (
     LhiLatencies,
     LhiLinkInfo,
@@ -16,22 +34,36 @@ from qoala.runtime.lhi import (
     LhiProcNodeInfo,
     LhiTopologyBuilder,
 )
+from qoala.runtime.message import LrCallTuple, RrCallTuple
 from qoala.runtime.ntf import GenericNtf
-from qoala.runtime.program import ProgramInput, ProgramInstance
+from qoala.runtime.policy import WfqPolicy
+from qoala.runtime.program import BatchInfo, ProgramInput, ProgramInstance, StreamInfo
+from qoala.runtime.sharedmem import MemAddr
 from qoala.runtime.task import (
     HostLocalTask,
     LocalRoutineTask,
+    PairRangeTask,
     PostCallTask,
     PreCallTask,
+    SinglePairCallbackTask,
+    SinglePairTask,
+    TaskGraph,
     TaskGraphBuilder,
     TaskInfo,
 )
-from qoala.sim.build import build_network_from_lhi
+from qoala.sim.build import (
+    build_network_from_config,
+    build_network_from_lhi,
+    build_qprocessor_from_topology,
+)
 from qoala.sim.driver import CpuDriver, QpuDriver, SharedSchedulerMemory
+from qoala.sim.events import EVENT_WAIT
 from qoala.sim.network import ProcNodeNetwork
-from qoala.sim.scheduler import CpuEdfScheduler, QpuEdfScheduler
+from qoala.sim.procnode import ProcNode
+from qoala.sim.scheduler import CpuEdfScheduler, QpuEdfScheduler, Status
 from qoala.util.builder import ObjectBuilder
 from qoala.util.logging import LogManager
+from qoala.util.tests import netsquid_run
 
 CL = BasicBlockType.CL
 CC = BasicBlockType.CC
@@ -89,6 +121,74 @@ SUBROUTINE add_one
     return QoalaParser(program_text).parse()
 
 
+def get_lr_result_program() -> QoalaProgram:
+    program_text = """
+META_START
+    name: alice
+    parameters:
+    csockets:
+    epr_sockets:
+META_END
+
+^b0 {type = CL}:
+    x = assign_cval() : 3
+^b1 {type = QL}:
+    tuple<y> = run_subroutine(tuple<x>) : add_one
+^b2 {type = CL}:
+    return_result(y)
+
+SUBROUTINE add_one
+    params: x
+    returns: y
+    uses: 
+    keeps:
+    request:
+  NETQASM_START
+    load C0 @input[0]
+    set C1 1
+    add R0 C0 C1
+    store R0 @output[0]
+  NETQASM_END
+    """
+
+    return QoalaParser(program_text).parse()
+
+
+def get_all_qubits_program() -> QoalaProgram:
+    program_text = """
+META_START
+    name: alice
+    parameters:
+    csockets:
+    epr_sockets:
+META_END
+
+^b0 {type = QL}:
+    tuple<m> = run_subroutine() : measure
+^b1 {type = CL}:
+    return_result(m)
+
+SUBROUTINE measure
+    params:
+    returns: m
+    uses: 0, 1, 2
+    keeps:
+    request:
+  NETQASM_START
+    set Q0 0
+    set Q1 1
+    set Q2 2
+    init Q0
+    init Q1
+    init Q2
+    meas Q0 M0
+    store M0 @output[0]
+  NETQASM_END
+    """
+
+    return QoalaParser(program_text).parse()
+
+
 def load_program(path: str) -> QoalaProgram:
     path = os.path.join(os.path.dirname(__file__), path)
     with open(path) as file:
@@ -96,6 +196,55 @@ def load_program(path: str) -> QoalaProgram:
     return QoalaParser(text).parse()
 
 
+def get_pair_callback_program(name: str, remote_name: str, role: str) -> QoalaProgram:
+    # Three pairs with virtual ID 0, each measured by a callback that frees it.
+    remote_id = 1 if remote_name == "bob" else 0
+    program_text = """
+META_START
+    name: NAME
+    parameters:
+    csockets:
+    epr_sockets: 0 -> REMOTE
+META_END
+
+^b0 {type = QC}:
+    tuple<m0; m1; m2> = run_request() : req
+
+SUBROUTINE meas_pair
+    params:
+    returns: m
+    uses: 0
+    keeps:
+    request:
+  NETQASM_START
+    set C15 0
+    set Q0 0
+    meas Q0 M0
+    store M0 @output[C15]
+  NETQASM_END
+
+REQUEST req
+  callback_type: sequential
+  callback: meas_pair
+  return_vars:
+  remote_id: REMOTE_ID
+  epr_socket_id: 0
+  num_pairs: 3
+  virt_ids: all 0
+  timeout: 1000
+  fidelity: 1.0
+  typ: create_keep
+  role: ROLE
+    """
+    program_text = (
+        program_text.replace("REMOTE_ID", str(remote_id))
+        .replace("REMOTE", remote_name)
+        .replace("NAME", name)
+        .replace("ROLE", role)
+    )
+    return QoalaParser(program_text).parse()
+
+
 def setup_network(internal_sched_latency: float = 0) -> ProcNodeNetwork:
     topology = LhiTopologyBuilder.perfect_uniform_default_gates(num_qubits=3)
     latencies = LhiLatencies(
@@ -116,6 +265,52 @@ def setup_network(internal_sched_latency: float = 0) -> ProcNodeNetwork:
     return build_network_from_lhi([alice_lhi, bob_lhi], ntfs, network_lhi)
 
 
+def setup_procnode(**kwargs) -> ProcNode:
+    # Single node with the latencies of `setup_network`. Keyword arguments are
+    # passed to the ProcNode (e.g. options of its node scheduler).
+    network_ehi = EhiNetworkInfo(nodes={0: "alice"}, links={})
+    topology = LhiTopologyBuilder.perfect_uniform_default_gates(num_qubits=3)
+    latencies = LhiLatencies(
+        host_instr_time=1000, qnos_instr_time=2000, host_peer_latency=3000
+    )
+    qprocessor = build_qprocessor_from_topology("alice_processor", topology)
+    return ProcNode(
+        name="alice",
+        qprocessor=qprocessor,
+        qdevice_topology=topology,
+        latencies=latencies,
+        ntf_interface=GenericNtf(),
+        network_ehi=network_ehi,
+        node_id=0,
+        **kwargs,
+    )
+
+
+def setup_config_network(
+    netschedule: Optional[NetworkScheduleConfig] = None, **kwargs
+) -> ProcNodeNetwork:
+    # Network of `setup_network`, built from configuration. Keyword arguments are
+    # set on the configuration of both nodes (e.g. options of their schedulers).
+    nodes = [
+        ProcNodeConfig(
+            node_name=name,
+            node_id=node_id,
+            topology=TopologyConfig.perfect_config_uniform_default_params(3),
+            latencies=LatenciesConfig(
+                host_instr_time=1000, qnos_instr_time=2000, host_peer_latency=3000
+            ),
+            ntf=NtfConfig.from_cls_name("GenericNtf"),
+            **kwargs,
+        )
+        for node_id, name in [(0, "alice"), (1, "bob")]
+    ]
+    network_cfg = ProcNodeNetworkConfig.from_nodes_perfect_links(
+        nodes=nodes, link_duration=20_000
+    )
+    network_cfg.netschedule = netschedule
+    return build_network_from_config(network_cfg)
+
+
 def instantiate(
     program: QoalaProgram,
     ehi: EhiNodeInfo,
@@ -375,6 +570,158 @@ def test_qpu_scheduler_2_processes():
     assert ns.sim_time() == 1000
 
 
+def test_qpu_scheduler_lanes():
+    procnode = ObjectBuilder.simple_procnode("alice", 1)
+    procnode.qnos.processor._latencies.qnos_instr_time = 1000
+    program = get_lr_program()
+
+    pid0 = 0
+    pid1 = 1
+    instance0 = ObjectBuilder.simple_program_instance(program, pid0)
+    instance1 = ObjectBuilder.simple_program_instance(program, pid1)
+
+    procnode.scheduler.submit_program_instance(instance0)
+    procnode.scheduler.submit_program_instance(instance1)
+
+    shared_ptr_pid0 = 0
+    shared_ptr_pid1 = 1
+
+    cpu_tasks = [
+        (HostLocalTask(0, pid0, "b0", CL), 0),
+        (HostLocalTask(1, pid1, "b0", CL), 0),
+        (PreCallTask(2, pid0, "b1", shared_ptr_pid0), 0),
+        (PreCallTask(3, pid1, "b1", shared_ptr_pid1), 0),
+        (PostCallTask(4, pid0, "b1", shared_ptr_pid0), 0),
+        (PostCallTask(5, pid1, "b1", shared_ptr_pid1), 0),
+    ]
+    cpu_graph = TaskGraphBuilder.linear_tasks_with_start_times(cpu_tasks)
+    # The local routines do not use any qubits, so they do not conflict.
+    qpu_graph = TaskGraph()
+    qpu_graph.add_tasks(
+        [
+            LocalRoutineTask(6, pid0, "b1", shared_ptr_pid0),
+            LocalRoutineTask(7, pid1, "b1", shared_ptr_pid1),
+        ]
+    )
+
+    cpu_graph.get_tinfo(4).ext_predecessors.add(6)
+    cpu_graph.get_tinfo(5).ext_predecessors.add(7)
+    qpu_graph.get_tinfo(6).ext_predecessors.add(2)
+    qpu_graph.get_tinfo(7).ext_predecessors.add(3)
+
+    mem = SharedSchedulerMemory()
+    cpu_driver = CpuDriver("alice", mem, procnode.host.processor, procnode.memmgr)
+    cpu_scheduler = CpuEdfScheduler(
+        "alice", 0, cpu_driver, procnode.memmgr, procnode.host.interface
+    )
+    cpu_scheduler.add_tasks(cpu_graph.get_tasks())
+
+    qpu_driver = QpuDriver(
+        "alice",
+        mem,
+        procnode.host.processor,
+        procnode.qnos.processor,
+        procnode.netstack.processor,
+        procnode.memmgr,
+    )
+    qpu_scheduler = QpuEdfScheduler(
+        "alice", 0, qpu_driver, procnode.memmgr, None, num_lanes=2
+    )
+    qpu_scheduler.add_tasks(qpu_graph.get_tasks())
+
+    cpu_scheduler.set_other_scheduler(qpu_scheduler)
+    qpu_scheduler.set_other_scheduler(cpu_scheduler)
+
+    ns.sim_reset()
+    cpu_scheduler.start()
+    qpu_scheduler.start()
+    ns.sim_run()
+
+    assert procnode.memmgr.get_process(pid0).host_mem.read("y") == 4
+    assert procnode.memmgr.get_process(pid1).host_mem.read("y") == 4
+
+    # Both routines (4 instructions each) are executed at the same time.
+    assert qpu_scheduler.get_task_starts() == {6: 0, 7: 0}
+    assert qpu_scheduler.get_task_cores() == {6: 0, 7: 1}
+    assert ns.sim_time() == 4000
+
+
+def test_qpu_scheduler_timebin_lookahead():
+    # Under a TDMA network schedule, EPR task 0 waits for its time bin, which
+    # starts after 10_000. With lookahead, local routines are only executed in the
+    # meantime if they are estimated to finish before that bin starts.
+    network = setup_network()
+    alice = network.nodes["alice"]
+    program = load_program("test_scheduling_alice.iqoala")
+    pid = 0
+    inputs = ProgramInput({"bob_id": 1})
+    instance = instantiate(program, alice.local_ehi, pid, inputs)
+    alice.scheduler.submit_program_instance(instance, remote_pid=0)
+
+    own_bin = EhiNetworkTimebin(frozenset({0, 1}), {0: pid, 1: 0})
+    other_bin = EhiNetworkTimebin(frozenset({0, 1}), {0: 1, 1: 1})
+    network_schedule = EhiNetworkSchedule(
+        bin_length=10_000,
+        first_bin=0,
+        bin_pattern=[other_bin, own_bin],
+        repeat_period=20_000,
+    )
+
+    def create_scheduler(lookahead: bool, lr_durations: List[int]) -> QpuEdfScheduler:
+        mem = SharedSchedulerMemory()
+        mem.write_shared_rrcall(0, RrCallTuple.no_alloc("epr_md_1"))
+        mem.write_shared_lrcall(1, LrCallTuple("add_one", MemAddr(0), MemAddr(0)))
+        driver = QpuDriver(
+            "alice",
+            mem,
+            alice.host.processor,
+            alice.qnos.processor,
+            alice.memmgr,
+            alice.memmgr,
+        )
+        scheduler = QpuEdfScheduler(
+            "alice",
+            0,
+            driver,
+            alice.memmgr,
+            network_schedule,
+            timebin_lookahead=lookahead,
+        )
+        graph = TaskGraph()
+        graph.add_tasks([SinglePairTask(0, pid, 0, 0, 20_000)])
+        graph.add_tasks(
+            [
+                LocalRoutineTask(1 + i, pid, "blk_add_one", 1, duration)
+                for i, duration in enumerate(lr_durations)
+            ]
+        )
+        # The routine that takes longest has the earliest deadline.
+        graph.add_deadlines([(1 + i, 100_000 - d) for i, d in enumerate(lr_durations)])
+        scheduler.add_tasks(graph.get_tasks())
+        return scheduler
+
+    ns.sim_reset()
+
+    # The routine that fits in the gap is executed before the EPR bin.
+    scheduler = create_scheduler(True, [5_000, 15_000])
+    scheduler.update_status()
+    assert scheduler.status.status == {Status.NEXT_TASK}
+    assert scheduler.status.params == {"task_id": 1}
+
+    # Without lookahead, the routine with the earliest deadline is executed, even
+    # though the EPR bin is then missed.
+    scheduler = create_scheduler(False, [5_000, 15_000])
+    scheduler.update_status()
+    assert scheduler.status.status == {Status.NEXT_TASK}
+    assert scheduler.status.params == {"task_id": 2}
+
+    # A routine that does not fit is held back until the EPR task has executed.
+    scheduler = create_scheduler(True, [15_000])
+    scheduler.update_status()
+    assert scheduler.status.status == {Status.WAITING_TIME_BIN}
+    assert scheduler.status.params == {"delta": 10_000}
+
+
 def test_host_program():
 
     network = setup_network()
@@ -629,6 +976,144 @@ def test_epr_ck_2():
     assert alice_outcomes == bob_outcomes
 
 
+def run_pair_callback_programs(
+    netschedule: Optional[NetworkScheduleConfig] = None, **kwargs
+) -> ProcNodeNetwork:
+    network = setup_config_network(netschedule, **kwargs)
+    alice = network.nodes["alice"]
+    bob = network.nodes["bob"]
+    program_alice = get_pair_callback_program("alice", "bob", "create")
+    program_bob = get_pair_callback_program("bob", "alice", "receive")
+    instance_alice = instantiate(program_alice, alice.local_ehi, 0)
+    instance_bob = instantiate(program_bob, bob.local_ehi, 0)
+    alice.scheduler.submit_program_instance(instance_alice, instance_bob.pid)
+    bob.scheduler.submit_program_instance(instance_bob, instance_alice.pid)
+
+    ns.sim_reset()
+    network.start()
+    ns.sim_run()
+    return network
+
+
+def check_pair_range_tasks(netschedule: Optional[NetworkScheduleConfig]) -> float:
+    # Generating the pairs with a pair range task per node gives the same results
+    # at the same time as with a pair task and a callback task per pair.
+    per_pair = run_pair_callback_programs(netschedule)
+    per_pair_end = ns.sim_time()
+    ranges = run_pair_callback_programs(netschedule, pair_range_tasks=True)
+    assert ns.sim_time() == per_pair_end
+
+    for network in [per_pair, ranges]:
+        alice_mem = network.nodes["alice"].memmgr.get_process(0).host_mem
+        bob_mem = network.nodes["bob"].memmgr.get_process(0).host_mem
+        alice_outcomes = [alice_mem.read(f"m{i}") for i in range(3)]
+        bob_outcomes = [bob_mem.read(f"m{i}") for i in range(3)]
+        assert alice_outcomes == bob_outcomes
+
+    for name in ["alice", "bob"]:
+        qpu_scheduler = per_pair.nodes[name].scheduler.qpu_scheduler
+        tasks = list(qpu_scheduler.get_tasks_executed().values())
+        assert len([t for t in tasks if isinstance(t, SinglePairTask)]) == 3
+        assert len([t for t in tasks if isinstance(t, SinglePairCallbackTask)]) == 3
+
+        # The callbacks are executed as part of the pair range task.
+        qpu_scheduler = ranges.nodes[name].scheduler.qpu_scheduler
+        tasks = list(qpu_scheduler.get_tasks_executed().values())
+        assert [type(t) for t in tasks] == [PairRangeTask]
+        assert qpu_scheduler.next_pair_index(tasks[0].task_id) == 0
+        # The qubits of all pairs have been freed by the callbacks.
+        assert ranges.nodes[name].memmgr.phys_id_for(0, 0) is None
+    return per_pair_end
+
+
+def test_pair_range_tasks():
+    check_pair_range_tasks(None)
+
+
+def test_pair_range_tasks_netschedule():
+    # Each pair has to wait for the next time bin of the program instances, so the
+    # pair range task looks up a time bin (and checks resources) for every pair.
+    netschedule = NetworkScheduleConfig(
+        bin_length=30_000,
+        first_bin=0,
+        bin_pattern=[(0, 0, 1, 0), (0, 1, 1, 1)],
+        repeat_period=60_000,
+    )
+    end = check_pair_range_tasks(netschedule)
+    assert end > 2 * 60_000
+
+
+class ScriptedQpuDriver(QpuDriver):
+    # Generates pairs of pair range tasks without entanglement distribution: each
+    # pair takes 1000, and the first attempt of the pairs in `failures` fails.
+    def __init__(
+        self, procnode: ProcNode, memory: SharedSchedulerMemory, failures: List[int]
+    ) -> None:
+        super().__init__(
+            procnode.name,
+            memory,
+            procnode.host.processor,
+            procnode.qnos.processor,
+            procnode.netstack.processor,
+            procnode.memmgr,
+        )
+        self._failures = set(failures)
+        # (pair index, start time, success) of each attempt
+        self.attempts: List[Tuple[int, float, bool]] = []
+
+    def handle_pair(
+        self, task: PairRangeTask, pair_index: int
+    ) -> Generator[EventExpression, None, bool]:
+        success = pair_index not in self._failures
+        self._failures.discard(pair_index)
+        self.attempts.append((pair_index, ns.sim_time(), success))
+        self._schedule_after(1000, EVENT_WAIT)
+        yield EventExpression(source=self, event_type=EVENT_WAIT)
+        return success
+
+
+def test_pair_range_failed_pair():
+    network = setup_network()
+    alice = network.nodes["alice"]
+    pid = 0
+    program = get_pair_callback_program("alice", "bob", "create")
+    instance = instantiate(program, alice.local_ehi, pid)
+    alice.scheduler.submit_program_instance(instance, remote_pid=0)
+
+    mem = SharedSchedulerMemory()
+    mem.write_shared_rrcall(0, RrCallTuple.no_alloc("req"))
+    driver = ScriptedQpuDriver(alice, mem, failures=[1])
+    scheduler = QpuEdfScheduler("alice", 0, driver, alice.memmgr)
+    graph = TaskGraph()
+    graph.add_tasks([PairRangeTask(0, pid, 3, "meas_pair", 0, 3000)])
+    scheduler.add_tasks(graph.get_tasks())
+
+    ns.sim_reset()
+    scheduler.start()
+    ns.sim_run()
+
+    # The failed pair is generated again, after which the task continues with the
+    # next pair. The task only finishes after its last pair.
+    assert driver.attempts == [
+        (0, 0, True),
+        (1, 1000, False),
+        (1, 2000, True),
+        (2, 3000, True),
+    ]
+    assert scheduler.get_task_starts() == {0: 0}
+    assert scheduler.get_task_ends() == {0: 4000}
+    assert scheduler.next_pair_index(0) == 0
+
+    # Executed by the driver itself, all pairs are generated at once, and the task
+    # fails at the first pair that fails.
+    task = PairRangeTask(1, pid, 3, "meas_pair", 0)
+    for failures, indices, success in [([], [0, 1, 2], True), ([1], [0, 1], False)]:
+        driver = ScriptedQpuDriver(alice, mem, failures)
+        ns.sim_reset()
+        assert netsquid_run(driver.handle_task(task)) == success
+        assert [index for (index, _, _) in driver.attempts] == indices
+
+
 def test_cc():
     network = setup_network()
     alice = network.nodes["alice"]
@@ -1011,18 +1496,226 @@ def test_internal_sched_latency():
     assert ns.sim_time() == total_time
 
 
+def test_retire_finished():
+    procnode = setup_procnode(retire_finished=True)
+    scheduler = procnode.scheduler
+    program = get_lr_result_program()
+    for pid in range(2):
+        instance = instantiate(program, procnode.local_ehi, pid)
+        scheduler.submit_program_instance(instance)
+
+    ns.sim_reset()
+    procnode.start()
+    ns.sim_run()
+
+    records = scheduler.get_program_instance_records()
+    assert set(records.keys()) == {0, 1}
+    for record in records.values():
+        assert record.result.values == {"y": 4}
+        assert record.timestamps is not None
+        # CPU: b0, precall and postcall of b1, b2. QPU: local routine of b1.
+        assert record.num_cpu_tasks == 4
+        assert record.num_qpu_tasks == 1
+
+    # Processes, shared scheduler memory and task records have been released.
+    assert procnode.memmgr.get_all_program_ids() == []
+    memory = scheduler.cpu_scheduler.driver._memory
+    assert memory._shared_lrcalls == {} and memory._shared_rrcalls == {}
+    for proc_scheduler in [scheduler.cpu_scheduler, scheduler.qpu_scheduler]:
+        assert proc_scheduler.get_tasks_executed() == {}
+        assert proc_scheduler.get_task_starts() == {}
+        assert proc_scheduler.get_timestamps(0) is None
+        assert not proc_scheduler.has_finished(0)
+
+
+def test_linear_batch():
+    procnode = setup_procnode()
+    unit_module = UnitModule.from_full_ehi(procnode.local_ehi)
+    batch_info = BatchInfo(
+        program=get_lr_result_program(),
+        unit_module=unit_module,
+        inputs=[ProgramInput.empty() for _ in range(3)],
+        num_iterations=3,
+        deadline=0,
+    )
+    procnode.submit_batch(batch_info)
+    procnode.initialize_processes(linear=True)
+
+    ns.sim_reset()
+    procnode.start()
+    ns.sim_run()
+
+    result = procnode.scheduler.get_batch_results()[0]
+    assert all(r.values == {"y": 4} for r in result.results)
+    # Each instance starts after the previous one.
+    starts = [start for (start, _) in result.timestamps]
+    ends = [end for (_, end) in result.timestamps]
+    assert starts == sorted(starts) and len(set(starts)) == 3
+    assert ends == sorted(ends) and len(set(ends)) == 3
+
+
+def test_concurrent_finish():
+    # With two CPU cores, the first blocks of both instances finish at the same
+    # time. Both instances must continue.
+    procnode = setup_procnode(num_cpu_cores=2, retire_finished=True)
+    scheduler = procnode.scheduler
+    program = get_lr_result_program()
+    for pid in range(2):
+        instance = instantiate(program, procnode.local_ehi, pid)
+        scheduler.submit_program_instance(instance)
+
+    ns.sim_reset()
+    procnode.start()
+    ns.sim_run()
+
+    records = scheduler.get_program_instance_records()
+    assert set(records.keys()) == {0, 1}
+    assert records[0].timestamps[0] == records[1].timestamps[0]
+    for record in records.values():
+        assert record.result.values == {"y": 4}
+        assert record.num_cpu_tasks == 4
+        assert record.num_qpu_tasks == 1
+    assert procnode.memmgr.get_all_program_ids() == []
+
+
+def test_admission_control():
+    # Both instances need all qubits of the node.
+    procnode = setup_procnode(admission_control=True)
+    scheduler = procnode.scheduler
+    program = get_all_qubits_program()
+    for pid in range(2):
+        instance = instantiate(program, procnode.local_ehi, pid)
+        scheduler.submit_program_instance(instance)
+
+    ns.sim_reset()
+    procnode.start()
+    ns.sim_run()
+
+    for pid in range(2):
+        assert procnode.memmgr.get_process(pid).result.values == {"m": 0}
+
+    # The quantum block of pid 1 is held back until the one of pid 0 has
+    # completed, i.e. until its postcall task has finished.
+    admission = scheduler.admission_controller
+    assert [(r.pid, r.block_name) for r in admission.records] == [
+        (0, "b0"),
+        (1, "b0"),
+    ]
+    cpu = scheduler.cpu_scheduler
+    [postcall] = [
+        task
+        for task in cpu.get_tasks_executed().values()
+        if task.pid == 0 and isinstance(task, PostCallTask)
+    ]
+    assert admission.records[0].delay == 0
+    assert admission.records[1].admitted == cpu.get_task_ends()[postcall.task_id]
+    assert admission.waiting_pids == []
+    for pid in range(2):
+        assert admission.outstanding(pid) == QubitDemand()
+
+
+def test_wfq_weights():
+    weights = {"batch": {0: 2.0}, "stream": {1: 3.0}}
+    procnode = setup_procnode(scheduling_policy="wfq", wfq_weights=weights)
+    for proc_scheduler in [
+        procnode.scheduler.cpu_scheduler,
+        procnode.scheduler.qpu_scheduler,
+    ]:
+        policy = proc_scheduler.policy
+        assert isinstance(policy, WfqPolicy)
+        assert policy.weight_of(("batch", 0)) == 2.0
+        assert policy.weight_of(("stream", 1)) == 3.0
+        assert policy.weight_of(("batch", 1)) == 1
+
+
+def test_stream_max_live():
+    procnode = setup_procnode()
+    scheduler = procnode.scheduler
+    program = get_lr_result_program()
+    unit_module = UnitModule.from_full_ehi(procnode.local_ehi)
+    # All instances arrive while the first two are still executing.
+    arrivals = periodic_arrivals(100, itertools.repeat(ProgramInput.empty()), 5)
+    stream_id = procnode.submit_stream(
+        StreamInfo(program, unit_module, arrivals, max_live=2)
+    )
+
+    ns.sim_reset()
+    procnode.start()
+    ns.sim_run()
+
+    # All instances have been admitted and retired.
+    stream = scheduler._streams[stream_id]
+    assert stream.live_pids == set()
+    assert stream.num_waiting == 0
+    assert procnode.memmgr.get_all_program_ids() == []
+
+    records = scheduler.get_stream_records(stream_id)
+    assert len(records) == 5
+    for i, record in enumerate(records):
+        assert record.result.values == {"y": 4}
+        assert record.arrival_time == 100 * (i + 1)
+        assert record.timestamps is not None
+
+    # At most two instances are executing at the same time, and the CPU tasks of
+    # one instance overlap with the QPU task of another.
+    max_concurrent = 0
+    for record in records:
+        start = record.timestamps[0]
+        concurrent = [r for r in records if r.timestamps[0] <= start < r.timestamps[1]]
+        max_concurrent = max(max_concurrent, len(concurrent))
+    assert max_concurrent == 2
+
+    statistics = scheduler.get_stream_statistics(stream_id)
+    assert statistics.num_finished == 5
+    assert statistics.last_end == max(r.timestamps[1] for r in records)
+    assert statistics.max_latency == max(
+        r.timestamps[1] - r.arrival_time for r in records
+    )
+    assert statistics.throughput == 5 / (statistics.last_end - 100)
+
+
+def test_stream_max_records():
+    procnode = setup_procnode()
+    scheduler = procnode.scheduler
+    program = get_lr_result_program()
+    unit_module = UnitModule.from_full_ehi(procnode.local_ehi)
+    arrivals = periodic_arrivals(100_000, itertools.repeat(ProgramInput.empty()), 4)
+    stream_id = procnode.submit_stream(
+        StreamInfo(program, unit_module, arrivals, max_live=1, max_records=2)
+    )
+
+    ns.sim_reset()
+    procnode.start()
+    ns.sim_run()
+
+    # Only the records of the last two instances are kept.
+    records = scheduler.get_stream_records(stream_id)
+    assert [record.pid for record in records] == [2, 3]
+    assert set(scheduler.get_program_instance_records().keys()) == {2, 3}
+
+    statistics = scheduler.get_stream_statistics(stream_id)
+    assert statistics.num_finished == 4
+    assert statistics.first_arrival == 100_000
+    assert statistics.last_end == records[-1].timestamps[1]
+
+
 if __name__ == "__main__":
     test_cpu_scheduler()
     test_cpu_scheduler_no_time()
     test_cpu_scheduler_2_processes()
     test_qpu_scheduler()
     test_qpu_scheduler_2_processes()
+    test_qpu_scheduler_lanes()
+    test_qpu_scheduler_timebin_lookahead()
     test_host_program()
     test_lr_program()
     test_epr_md_1()
     test_epr_md_2()
     test_epr_ck_1()
     test_epr_ck_2()
+    test_pair_range_tasks()
+    test_pair_range_tasks_netschedule()
+    test_pair_range_failed_pair()
     test_cc()
     test_full_program()
     test_jump_instruction()
@@ -1035,3 +1728,10 @@ if __name__ == "__main__":
     test_blt_instruction_1()
     test_blt_instruction_2()
     test_internal_sched_latency()
+    test_retire_finished()
+    test_admission_control()
+    test_wfq_weights()
+    test_linear_batch()
+    test_concurrent_finish()
+    test_stream_max_live()
+    test_stream_max_records()
@@ -0,0 +1,97 @@
+import gc
+import os
+
+from netqasm.lang.instr import core
+
+from qoala.lang.ehi import EhiBuilder, EhiLatencies
+from qoala.lang.parse import QoalaParser
+from qoala.runtime.task import TaskDurationEstimator, _ehi_durations
+
+
+def relative_path(path: str) -> str:
+    return os.path.join(os.getcwd(), os.path.dirname(__file__), path)
+
+
+def setup_ehi():
+    # Measuring the communication qubit (ID 0) is faster than measuring
+    # a memory qubit.
+    return EhiBuilder.perfect_star(
+        num_qubits=3,
+        flavour=None,
+        comm_instructions=[core.MeasInstruction],
+        comm_duration=500,
+        mem_instructions=[core.MeasInstruction],
+        mem_duration=2000,
+        two_instructions=[],
+        two_duration=0,
+        latencies=EhiLatencies(
+            host_instr_time=0,
+            qnos_instr_time=10,
+            host_peer_latency=0,
+            internal_sched_latency=0,
+        ),
+    )
+
+
+def load_routines():
+    with open(relative_path("test_callbacks_2_pairs.iqoala")) as file:
+        text = file.read()
+    return QoalaParser(text).parse().local_routines
+
+
+def test_gate_durations():
+    ehi = setup_ehi()
+    durations = TaskDurationEstimator.gate_durations(ehi)
+    assert durations == {core.MeasInstruction: 2000}
+    assert TaskDurationEstimator.gate_durations(ehi) is durations
+    # Durations are memoized per EHI.
+    assert TaskDurationEstimator.gate_durations(setup_ehi()) is not durations
+
+
+def test_durations_released():
+    ehi = setup_ehi()
+    TaskDurationEstimator.gate_durations(ehi)
+    ehi_id = id(ehi)
+    assert ehi_id in _ehi_durations
+    del ehi
+    gc.collect()
+    assert ehi_id not in _ehi_durations
+
+
+def test_lr_duration():
+    ehi = setup_ehi()
+    routines = load_routines()
+
+    # 3 classical instructions and 1 measurement
+    assert TaskDurationEstimator.lr_duration(ehi, routines["meas_1_pair"]) == 2030
+    # 6 classical instructions and 2 measurements
+    assert TaskDurationEstimator.lr_duration(ehi, routines["meas_2_pairs"]) == 4060
+    # Memoized result
+    assert TaskDurationEstimator.lr_duration(ehi, routines["meas_2_pairs"]) == 4060
+
+
+def test_lr_duration_per_qubit():
+    ehi = setup_ehi()
+    routines = load_routines()
+    estimator = TaskDurationEstimator
+
+    # meas_1_pair measures virtual qubit 0.
+    routine = routines["meas_1_pair"]
+    assert estimator.lr_duration_per_qubit(ehi, routine) == 530
+    assert estimator.lr_duration_per_qubit(ehi, routine, {0: 0}) == 530
+    assert estimator.lr_duration_per_qubit(ehi, routine, {0: 2}) == 2030
+    # Unmapped qubit: worst case
+    assert estimator.lr_duration_per_qubit(ehi, routine, {0: None}) == 2030
+
+    # meas_2_pairs measures virtual qubits 0 and 1.
+    routine = routines["meas_2_pairs"]
+    assert estimator.lr_duration_per_qubit(ehi, routine) == 2560
+    mapping = {0: 1, 1: 0}
+    assert estimator.lr_duration_per_qubit(ehi, routine, mapping) == 2560
+
+
+if __name__ == "__main__":
+    test_gate_durations()
+    test_durations_released()
+    test_lr_duration()
+    test_lr_duration_per_qubit()
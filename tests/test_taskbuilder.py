@@ -1,5 +1,6 @@
 import os
 
+from qoala.lang.ehi import UnitModule
 from qoala.lang.hostlang import BasicBlockType
 from qoala.lang.parse import QoalaParser
 from qoala.runtime.lhi import (
@@ -10,16 +11,20 @@ from qoala.runtime.lhi import (
     LhiTopologyBuilder,
 )
 from qoala.runtime.ntf import GenericNtf
+from qoala.runtime.program import ProgramInput, ProgramInstance
 from qoala.runtime.task import (
     HostLocalTask,
     MultiPairCallbackTask,
     MultiPairTask,
+    PairRangeTask,
     PostCallTask,
     PreCallTask,
+    ProcessorType,
     SinglePairCallbackTask,
     SinglePairTask,
     TaskGraph,
     TaskGraphBuilder,
+    TaskGraphFromBlockBuilder,
 )
 from qoala.sim.build import build_network_from_lhi
 from qoala.sim.network import ProcNodeNetwork
@@ -153,6 +158,69 @@ def test_qoala_tasks_2_pairs_callback():
     assert task_graph == expected_graph
 
 
+def test_qoala_tasks_2_pairs_pair_range():
+    network = setup_network()
+    alice = network.nodes["alice"]
+
+    path = relative_path("test_callbacks_2_pairs.iqoala")
+    with open(path) as file:
+        text = file.read()
+    program = QoalaParser(text).parse()
+
+    cpu_time = alice.local_ehi.latencies.host_instr_time
+    cb_time = alice.local_ehi.latencies.qnos_instr_time
+    pair_time = alice.network_ehi.get_link(0, 1).duration
+
+    pid = 3
+    task_graph = TaskGraphBuilder.from_program(
+        program, pid, alice.local_ehi, alice.network_ehi, pair_ranges=True
+    )
+
+    expected_tasks = [
+        # blk_2_pairs_wait_all
+        PreCallTask(0, pid, "blk_2_pairs_wait_all", 0, cpu_time),
+        PostCallTask(1, pid, "blk_2_pairs_wait_all", 0, cpu_time),
+        MultiPairTask(2, pid, 0, 2 * pair_time),
+        MultiPairCallbackTask(3, pid, "meas_2_pairs", 0, cb_time),
+        # blk_2_pairs_sequential: a single task for both pairs and callbacks
+        PreCallTask(4, pid, "blk_2_pairs_sequential", 4, cpu_time),
+        PostCallTask(5, pid, "blk_2_pairs_sequential", 4, cpu_time),
+        PairRangeTask(6, pid, 2, "meas_1_pair", 4, 2 * (pair_time + cb_time)),
+    ]
+
+    expected_precedences = [
+        (0, 2),  # rr after precall
+        (2, 3),  # callback after rr
+        (3, 1),  # postcall after callback
+        (1, 4),  # second block after first block
+        (4, 6),  # pair range after precall
+        (6, 5),  # postcall after pair range
+    ]
+
+    expected_graph = TaskGraph()
+    expected_graph.add_tasks(expected_tasks)
+    expected_graph.add_precedences(expected_precedences)
+
+    assert task_graph == expected_graph
+    assert task_graph.get_tinfo(6).task.is_epr_task()
+
+    # The block builder creates the same tasks.
+    unit_module = UnitModule.from_full_ehi(alice.local_ehi)
+    instance = ProgramInstance(pid, program, ProgramInput.empty(), unit_module)
+    builder = TaskGraphFromBlockBuilder(pair_ranges=True)
+    block_graph = builder.build(instance, 1, alice.network_ehi)
+    expected_block_graph = TaskGraph()
+    expected_block_graph.add_tasks(
+        [
+            PreCallTask(0, pid, "blk_2_pairs_sequential", 0, cpu_time),
+            PostCallTask(1, pid, "blk_2_pairs_sequential", 0, cpu_time),
+            PairRangeTask(2, pid, 2, "meas_1_pair", 0, 2 * (pair_time + cb_time)),
+        ]
+    )
+    expected_block_graph.add_precedences([(0, 2), (2, 1)])
+    assert block_graph == expected_block_graph
+
+
 def test_deadlines():
     path = relative_path("test_deadlines.iqoala")
     with open(path) as file:
@@ -177,7 +245,42 @@ def test_deadlines():
     assert task_graph == expected_graph
 
 
+def test_block_builder_reuses_graphs():
+    network = setup_network()
+    alice = network.nodes["alice"]
+
+    path = relative_path("test_callbacks_2_pairs.iqoala")
+    with open(path) as file:
+        text = file.read()
+    program = QoalaParser(text).parse()
+    unit_module = UnitModule.from_full_ehi(alice.local_ehi)
+    instances = [
+        ProgramInstance(pid, program, ProgramInput.empty(), unit_module)
+        for pid in range(3)
+    ]
+
+    builder = TaskGraphFromBlockBuilder()
+    graph0 = builder.build(instances[0], 1, alice.network_ehi)
+    graph1 = builder.build(instances[1], 1, alice.network_ehi)
+    assert len(graph0.get_tasks()) == 6
+    # Second graph has the same shape, but new task IDs and shared pointers.
+    assert graph1 == graph0.relabeled(6, 1)
+    assert graph1.get_tinfo(6).task == PreCallTask(
+        6, 1, "blk_2_pairs_sequential", 6, alice.local_ehi.latencies.host_instr_time
+    )
+
+    # Partial graphs are the same as when computing them from the full graph.
+    cpu_graph, qpu_graph = builder.build_partial_graphs(
+        instances[2], 1, alice.network_ehi
+    )
+    graph2 = graph0.relabeled(12, 2)
+    assert cpu_graph == graph2.partial_graph(ProcessorType.CPU)
+    assert qpu_graph == graph2.partial_graph(ProcessorType.QPU)
+
+
 if __name__ == "__main__":
     test_qoala_tasks_1_pair_callback()
     test_qoala_tasks_2_pairs_callback()
+    test_qoala_tasks_2_pairs_pair_range()
     test_deadlines()
+    test_block_builder_reuses_graphs()
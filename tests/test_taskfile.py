@@ -0,0 +1,153 @@
+import os
+import struct
+import tempfile
+from typing import List
+
+import pytest
+
+from qoala.runtime.task import (
+    HostEventTask,
+    HostLocalTask,
+    LocalRoutineTask,
+    MultiPairCallbackTask,
+    MultiPairTask,
+    PairRangeTask,
+    PostCallTask,
+    PreCallTask,
+    ProcessorType,
+    QoalaTask,
+    SinglePairCallbackTask,
+    SinglePairTask,
+    TaskGraph,
+)
+from qoala.runtime.taskfile import (
+    _HEADER,
+    TaskFileError,
+    deserialize_task_graph,
+    read_task_graph,
+    serialize_task_graph,
+    write_task_graph,
+)
+
+
+def create_graph() -> TaskGraph:
+    pid = 3
+    graph = TaskGraph()
+    graph.add_tasks(
+        [
+            HostLocalTask(0, pid, "b0", 1000),
+            HostEventTask(1, pid, "b1", 2500.5),
+            PreCallTask(2, pid, "b2", 2, 1000),
+            LocalRoutineTask(3, pid, "b2", 2),
+            PostCallTask(4, pid, "b2", 2, 1000),
+            PreCallTask(5, pid, "b3", 5, 1000),
+            MultiPairTask(6, pid, 5, 40_000),
+            MultiPairCallbackTask(7, pid, "cb", 5, 2000),
+            PreCallTask(8, pid, "b4", 8, 1000),
+            SinglePairTask(9, pid, 0, 8, 20_000),
+            SinglePairCallbackTask(10, pid, "cb", 0, 8, 2000),
+            PairRangeTask(11, pid, 4, None, 8, 80_000),
+            PairRangeTask(12, pid, 2, "cb_é", 8),
+        ]
+    )
+    graph.add_precedences([(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7)])
+    graph.add_precedences([(8, 9), (9, 10), (8, 11), (8, 12)])
+    graph.add_ext_precedences([(100, 8)])
+    graph.add_deadlines([(0, 5000)])
+    graph.add_rel_deadlines([((0, 1), 100), ((4, 5), 200)])
+    graph.add_ext_rel_deadlines([((101, 8), 300)])
+    graph.get_tinfo(9).start_time = 12_345.5
+    return graph
+
+
+def test_round_trip():
+    graph = create_graph()
+    data = serialize_task_graph(graph)
+    assert len(data) % 8 == 0
+
+    loaded = deserialize_task_graph(data)
+    assert loaded == graph
+    assert loaded.get_tinfo(0).successors == {1}
+    assert loaded.get_tinfo(8).successors == {9, 11, 12}
+    assert loaded.get_tinfo(9).start_time == 12_345.5
+    assert loaded.get_tinfo(0).deadline == 5000
+    assert loaded.get_tinfo(8).ext_predecessors == {100}
+    assert loaded.get_tinfo(8).ext_rel_deadlines == {101: 300}
+    assert loaded.get_tinfo(11).task.callback_name is None
+    assert loaded.get_tinfo(12).task.callback_name == "cb_é"
+    assert loaded.get_tinfo(3).task.duration is None
+    assert loaded.get_roots() == graph.get_roots()
+
+    assert deserialize_task_graph(serialize_task_graph(TaskGraph())) == TaskGraph()
+
+
+def test_file():
+    graph = create_graph()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph.bin")
+        write_task_graph(graph, path)
+        assert read_task_graph(path) == graph
+
+        # Files that are too short (including empty ones) are not task graphs.
+        for data in [b"", b"QOALATG1"]:
+            with open(path, "wb") as f:
+                f.write(data)
+            with pytest.raises(TaskFileError):
+                read_task_graph(path)
+
+
+def test_invalid():
+    data = serialize_task_graph(create_graph())
+    with pytest.raises(TaskFileError):
+        deserialize_task_graph(b"not a task graph")
+    with pytest.raises(TaskFileError):
+        deserialize_task_graph(data[:-8])
+
+    class OtherTask(QoalaTask):
+        pass
+
+    graph = TaskGraph()
+    graph.add_tasks([OtherTask(0, ProcessorType.CPU, 0)])
+    with pytest.raises(TaskFileError):
+        serialize_task_graph(graph)
+
+
+def create_corrupted() -> List[bytes]:
+    # Serialized graphs with one corrupted field each, with the right length.
+    graph = create_graph()
+    data = serialize_task_graph(graph)
+    n = len(graph.get_tasks())
+
+    def corrupt(offset: int, value: int) -> bytes:
+        corrupted = bytearray(data)
+        struct.pack_into("<q", corrupted, offset, value)
+        return bytes(corrupted)
+
+    return [
+        b"QOALAXXX" + data[8:],
+        corrupt(_HEADER.size + 8 * n, 99),  # task type
+        corrupt(_HEADER.size + 8 * 4 * n, 99),  # name index
+        corrupt(_HEADER.size + 8 * 9 * n, 1),  # first predecessor offset
+        corrupt(_HEADER.size + 8 * 9 * n + 8, 999),  # second predecessor offset
+    ]
+
+
+def test_corrupted():
+    for data in create_corrupted():
+        with pytest.raises(TaskFileError):
+            deserialize_task_graph(data)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph.bin")
+        for data in create_corrupted():
+            with open(path, "wb") as f:
+                f.write(data)
+            with pytest.raises(TaskFileError):
+                read_task_graph(path)
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_file()
+    test_invalid()
+    test_corrupted()
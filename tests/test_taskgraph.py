@@ -3,6 +3,7 @@ from typing import List, Optional, Tuple
 import pytest
 
 from qoala.runtime.task import (
+    CompactTaskGraph,
     HostEventTask,
     HostLocalTask,
     LocalRoutineTask,
@@ -11,8 +12,10 @@ from qoala.runtime.task import (
     PreCallTask,
     ProcessorType,
     QoalaTask,
+    SinglePairTask,
     TaskGraph,
     TaskGraphBuilder,
+    TaskInfo,
 )
 
 
@@ -198,6 +201,65 @@ def test_get_partial_graph():
     assert qpu_graph == expected_qpu_graph
 
 
+def test_double_cross_predecessors_reduced():
+    pid = 0
+    c0 = HostLocalTask(0, pid, "c0")
+    c1 = HostLocalTask(1, pid, "c1")
+    q0 = LocalRoutineTask(2, pid, "q0", 0)
+    q1 = LocalRoutineTask(3, pid, "q1", 1)
+    c2 = HostLocalTask(4, pid, "c2")
+    graph = TaskGraph()
+    graph.add_tasks([c0, c1, q0, q1, c2])
+    graph.add_precedences([(0, 1), (0, 2), (1, 3), (2, 4), (3, 4)])
+
+    # c0 is an ancestor of c1, so c0 -> c2 is implied by c1 -> c2.
+    assert graph.cross_predecessors(4, immediate=False) == {2, 3}
+    assert graph.double_cross_predecessors(4) == {1}
+    assert graph.partial_graph(ProcessorType.CPU).get_tinfo(4).predecessors == {1}
+
+
+def test_deep_partial_graph():
+    # Long chains of same-type tasks, alternating between CPU and QPU.
+    pid = 0
+    chain_length = 2000
+    tasks: List[QoalaTask] = []
+    for i in range(4 * chain_length):
+        if (i // chain_length) % 2 == 0:
+            tasks.append(HostLocalTask(i, pid, f"b{i}"))
+        else:
+            tasks.append(LocalRoutineTask(i, pid, f"b{i}", i))
+    graph = TaskGraphBuilder.linear_tasks(tasks)
+
+    cpu_graph = graph.partial_graph(ProcessorType.CPU)
+    first = 2 * chain_length
+    assert cpu_graph.get_tinfo(first).predecessors == {chain_length - 1}
+    assert cpu_graph.get_tinfo(first).ext_predecessors == {first - 1}
+    assert graph.cross_predecessors(first - 1, immediate=False) == {chain_length - 1}
+
+
+def test_wide_partial_graph():
+    # A chain of CPU tasks that each have a QPU successor, and CPU tasks that each
+    # depend on one of the QPU tasks and on the last one. Their double-cross
+    # predecessor in the chain is implied by the last task of the chain. (Searching
+    # the chain for each of them separately takes quadratic time.)
+    pid = 0
+    width = 3000
+    chain = [HostLocalTask(i, pid, f"c{i}") for i in range(width)]
+    qpu = [LocalRoutineTask(width + i, pid, f"q{i}", i) for i in range(width)]
+    joins = [HostLocalTask(2 * width + i, pid, f"j{i}") for i in range(width)]
+    graph = TaskGraph()
+    graph.add_tasks(chain + qpu + joins)
+    graph.add_precedences([(i - 1, i) for i in range(1, width)])
+    graph.add_precedences([(i, width + i) for i in range(width)])
+    graph.add_precedences([(width + i, 2 * width + i) for i in range(width)])
+    graph.add_precedences([(2 * width - 1, 2 * width + i) for i in range(width)])
+
+    cpu_graph = graph.partial_graph(ProcessorType.CPU)
+    for join in joins:
+        assert cpu_graph.get_tinfo(join.task_id).predecessors == {width - 1}
+    assert graph.cross_predecessors(2 * width) == {width, 2 * width - 1}
+
+
 def test_dynamic_update():
     graph = TaskGraph()
     graph.add_tasks([SimpleTask(0), SimpleTask(1)])
@@ -316,10 +378,292 @@ def test_linearize_4():
     assert graph.linearize() == [1, 2, 0]
 
 
+def test_root_index():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(0), SimpleTask(1), SimpleTask(2), SimpleTask(3)])
+    graph.add_precedences([(0, 1), (1, 3)])
+
+    assert graph.get_roots() == [0, 2]
+    assert graph.task_exists_for_pid(0)
+    assert not graph.task_exists_for_pid(1)
+
+    # Roots are returned in task order, not in the order they became roots.
+    graph.remove_task(0)
+    assert graph.get_roots() == [1, 2]
+    graph.remove_task(2)
+    graph.remove_task(1)
+    assert graph.get_roots() == [3]
+
+    graph.add_tasks([SimpleTask(4)])
+    assert graph.get_roots() == [3, 4]
+
+    graph.remove_task(3)
+    graph.remove_task(4)
+    assert graph.get_roots() == []
+    assert not graph.task_exists_for_pid(0)
+
+
+def test_root_index_external():
+    pid = 1
+    he = HostEventTask(0, pid, "he")
+    sp = SinglePairTask(1, pid, 0, 0)
+    hl = HostLocalTask(2, pid, "hl")
+
+    graph = TaskGraph()
+    graph.add_tasks([he])
+    graph.add_tinfos({sp.task_id: TaskInfo.only_task(sp)})
+    graph.add_tasks([hl])
+    graph.add_ext_precedences([(3, 1), (4, 2)])
+
+    assert graph.get_roots() == [0]
+    assert graph.get_roots(ignore_external=True) == [0, 1, 2]
+    assert graph.get_tasks_blocked_only_on_external() == [1, 2]
+    assert graph.get_event_roots() == [0]
+    assert graph.get_epr_roots() == []
+    assert graph.get_epr_roots(ignore_external=True) == [1]
+
+    graph.remove_ext_predecessors(1, {3})
+    assert graph.get_roots() == [0, 1]
+    assert graph.get_epr_roots() == [1]
+    assert graph.get_tasks_blocked_only_on_external() == [2]
+
+    # Direct modifications of TaskInfo objects require invalidating the index.
+    graph.get_tinfo(2).ext_predecessors.clear()
+    graph.invalidate_index()
+    assert graph.get_roots() == [0, 1, 2]
+
+
+def test_resolve_ext_predecessor():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(i) for i in range(4)])
+    graph.add_precedences([(2, 3)])
+    graph.add_ext_precedences([(10, 0), (10, 1), (11, 1), (10, 3)])
+
+    assert graph.get_ext_dependents(10) == [0, 1, 3]
+    assert graph.get_ext_dependents(11) == [1]
+    assert graph.get_ext_dependents(12) == []
+
+    # Task 3 still has an internal predecessor.
+    assert graph.resolve_ext_predecessor(10) == [0]
+    assert graph.get_roots() == [0, 2]
+    assert graph.get_tasks_blocked_only_on_external() == [1]
+    assert graph.get_ext_dependents(10) == []
+    assert graph.get_tinfo(3).ext_predecessors == set()
+
+    # Removing external predecessors directly also updates the index.
+    graph.remove_ext_predecessors(1, {11})
+    assert graph.get_ext_dependents(11) == []
+    assert graph.get_roots() == [0, 1, 2]
+    assert graph.resolve_ext_predecessor(11) == []
+
+
+def test_ext_rel_deadlines():
+    pid = 0
+    prc = PreCallTask(0, pid, "prc", 0)
+    lr1 = LocalRoutineTask(1, pid, "lr1", 0)
+    lr2 = LocalRoutineTask(2, pid, "lr2", 0)
+    graph = TaskGraph()
+    graph.add_tasks([prc, lr1, lr2])
+    graph.add_precedences([(0, 1), (1, 2)])
+    graph.add_rel_deadlines([((0, 1), 100), ((1, 2), 50)])
+
+    # Relative deadlines to tasks of the other processor are kept.
+    qpu_graph = graph.partial_graph(ProcessorType.QPU)
+    assert qpu_graph.get_tinfo(1).rel_deadlines == {}
+    assert qpu_graph.get_tinfo(1).ext_rel_deadlines == {0: 100}
+    assert qpu_graph.get_tinfo(2).rel_deadlines == {1: 50}
+    assert qpu_graph.get_tinfo(2).ext_rel_deadlines == {}
+    assert qpu_graph.get_ext_rel_deadline_dependents(0) == [1]
+
+    # They become absolute deadlines when the other task has finished.
+    qpu_graph.resolve_ext_predecessor(0)
+    qpu_graph.resolve_ext_rel_deadline(0, elapsed=30)
+    assert qpu_graph.get_tinfo(1).deadline == 70
+    assert qpu_graph.get_tinfo(1).ext_rel_deadlines == {}
+    assert qpu_graph.get_ext_rel_deadline_dependents(0) == []
+    assert qpu_graph.get_earliest_deadline_root() == 1
+
+    # An earlier deadline is kept.
+    qpu_graph.add_ext_rel_deadlines([((5, 2), 100)])
+    qpu_graph.add_deadlines([(2, 20)])
+    qpu_graph.resolve_ext_rel_deadline(5)
+    assert qpu_graph.get_tinfo(2).deadline == 20
+
+
+def test_take_new_roots():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(i) for i in range(4)])
+    graph.add_precedences([(0, 2), (1, 3)])
+    graph.add_ext_precedences([(10, 1)])
+
+    # First call returns all roots.
+    assert graph.take_new_roots() == [0]
+    assert graph.take_new_roots() == []
+
+    graph.resolve_ext_predecessor(10)
+    graph.remove_task(0)
+    assert graph.take_new_roots() == [1, 2]
+
+    # Tasks that stopped being roots in the meantime are not returned.
+    graph.remove_task(1)
+    graph.remove_task(2)
+    assert graph.take_new_roots() == [3]
+    assert graph.get_roots() == [3]
+
+
+def test_earliest_deadline_root():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(i) for i in range(4)])
+    graph.add_precedences([(0, 3)])
+    graph.add_deadlines([(0, 300), (1, 100), (2, 200)])
+    graph.add_rel_deadlines([((0, 3), 50)])
+
+    assert graph.get_earliest_deadline_root() == 1
+    assert graph.get_earliest_deadline_root(skip={1}) == 2
+    assert graph.get_earliest_deadline_root(skip={1, 2}) == 0
+    assert graph.get_earliest_deadline_root(skip={0, 1, 2}) is None
+
+    # Mock execution of task 1 taking 80 time units.
+    graph.decrease_deadlines(80)
+    graph.remove_task(1)
+    assert graph.get_earliest_deadline_root() == 2
+
+    # Mock execution of task 0 taking 120 time units.
+    # Task 3 now has absolute deadline 50.
+    graph.decrease_deadlines(120)
+    graph.remove_task(0)
+    assert graph.get_tinfo(2).deadline == 0
+    assert graph.get_earliest_deadline_root() == 2
+    graph.add_deadlines([(2, 60)])
+    assert graph.get_earliest_deadline_root() == 3
+
+
+def test_first_root():
+    pid = 0
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(0), SinglePairTask(1, pid, 0, 0), SimpleTask(2)])
+    graph.add_tasks([SinglePairTask(3, pid, 1, 0), SimpleTask(4)])
+    graph.add_precedences([(0, 4)])
+
+    assert graph.get_first_root() == 0
+    assert graph.get_first_root(skip={0}) == 2
+    assert graph.get_first_root(skip={0, 2}) is None
+    assert graph.get_first_root(epr=True) == 1
+    assert graph.get_first_root(skip={1}, epr=True) == 3
+    assert graph.is_epr_root(3) and not graph.is_epr_root(2)
+
+    graph.remove_task(0)
+    graph.remove_task(1)
+    assert graph.get_first_root() == 2
+    assert graph.get_first_root(skip={2}) == 4
+    assert graph.get_first_root(epr=True) == 3
+
+
+def test_roots_with_future_start():
+    tasks = [SimpleTask(0), SimpleTask(1), SimpleTask(2)]
+    graph = TaskGraphBuilder.linear_tasks_with_start_times(
+        [(tasks[0], 1000), (tasks[1], 500), (tasks[2], None)]
+    )
+    graph.add_tasks([SimpleTask(3)])
+    graph.get_tinfo(3).start_time = 2000
+    graph.invalidate_index()
+
+    assert graph.get_roots_with_future_start(0) == {0, 3}
+    assert graph.get_next_start_time(0) == (0, 1000)
+    assert graph.get_roots_with_future_start(1000) == {3}
+    assert graph.get_next_start_time(1000) == (3, 2000)
+
+    # Task 1 becomes a root, but its start time has already passed.
+    graph.remove_task(0)
+    assert graph.get_roots_with_future_start(1500) == {3}
+    assert graph.get_next_start_time(1500) == (3, 2000)
+    assert graph.get_next_start_time(2000) is None
+
+
+def test_lazy_deadlines():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(i) for i in range(4)])
+    graph.add_precedences([(0, 2), (1, 3)])
+    graph.add_deadlines([(0, 300), (1, 100)])
+    graph.add_rel_deadlines([((0, 2), 50), ((1, 3), 70)])
+
+    graph.decrease_deadlines(40)
+    graph.decrease_deadlines(20)
+    assert graph.get_tinfo(0).deadline == 240
+    assert graph.get_tasks()[1].deadline == 40
+
+    # Only task 3 has a relative deadline w.r.t. task 1.
+    graph.remove_task(1)
+    assert graph.get_tinfo(2).deadline is None
+    assert graph.get_tinfo(2).rel_deadlines == {0: 50}
+    assert graph.get_tinfo(3).deadline == 70
+    assert graph.get_tinfo(3).rel_deadlines == {}
+
+    graph.decrease_deadlines(30)
+    graph.remove_task(0)
+    assert graph.get_tinfo(2).deadline == 50
+    assert graph.get_tinfo(3).deadline == 40
+
+    # Tasks added later have deadlines relative to the time at which they are added.
+    graph.add_tasks([SimpleTask(4)])
+    graph.add_deadlines([(4, 100)])
+    graph.decrease_deadlines(10)
+    assert graph.get_tinfo(4).deadline == 90
+    assert graph.get_earliest_deadline_root() == 3
+
+
+def test_relabeled():
+    graph = TaskGraph()
+    graph.add_tasks([SimpleTask(0), PreCallTask(1, 0, "blk", 1), SimpleTask(2)])
+    graph.add_precedences([(0, 1), (1, 2)])
+    graph.add_rel_deadlines([((0, 2), 100)])
+    graph.get_tinfo(0).ext_predecessors.add(5)
+
+    relabeled = graph.relabeled(10, 3)
+    assert relabeled.get_roots(ignore_external=True) == [10]
+    assert relabeled.get_tinfo(11).task == PreCallTask(11, 3, "blk", 11)
+    assert relabeled.get_tinfo(11).task.shared_ptr == 11
+    assert relabeled.get_tinfo(12).task.pid == 3
+    assert relabeled.get_tinfo(10).ext_predecessors == {15}
+    assert relabeled.get_tinfo(11).predecessors == {10}
+    assert relabeled.get_tinfo(11).successors == {12}
+    assert relabeled.get_tinfo(12).rel_deadlines == {10: 100}
+
+    # The original graph is not modified.
+    assert graph.get_tinfo(1).task.shared_ptr == 1
+    assert graph.get_tinfo(1).predecessors == {0}
+
+
+def test_compact_task_graph():
+    graph = TaskGraph()
+    graph.add_tasks(
+        [SimpleTask(0), PreCallTask(1, 0, "blk", 1), LocalRoutineTask(3, 0, "blk", 1)]
+    )
+    graph.add_precedences([(0, 1), (0, 3), (1, 3)])
+    graph.add_ext_precedences([(7, 1)])
+    graph.add_deadlines([(0, 300)])
+    graph.add_rel_deadlines([((0, 3), 100)])
+    graph.add_ext_rel_deadlines([((7, 3), 50)])
+    graph.get_tinfo(3).start_time = 20
+
+    compact = CompactTaskGraph(graph)
+    assert len(compact) == 3
+    assert compact.task_ids() == [0, 1, 3]
+    assert compact.to_graph() == graph
+    assert compact.relabeled(10, 2) == graph.relabeled(10, 2)
+    assert compact.relabeled(10, 2).get_tinfo(11).successors == {13}
+
+    # Tasks do not have a __dict__.
+    assert not hasattr(graph.get_tinfo(1).task, "__dict__")
+
+
 if __name__ == "__main__":
     linear()
     no_precedence()
     test_get_partial_graph()
+    test_double_cross_predecessors_reduced()
+    test_deep_partial_graph()
+    test_wide_partial_graph()
     test_dynamic_update()
     test_linear_tasks()
     test_linear_tasks_with_timestamps()
@@ -329,3 +673,14 @@ if __name__ == "__main__":
     test_linearize_2()
     test_linearize_3()
     test_linearize_4()
+    test_root_index()
+    test_root_index_external()
+    test_resolve_ext_predecessor()
+    test_ext_rel_deadlines()
+    test_take_new_roots()
+    test_earliest_deadline_root()
+    test_first_root()
+    test_roots_with_future_start()
+    test_lazy_deadlines()
+    test_relabeled()
+    test_compact_task_graph()